@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../../phase-3-recommendations/notebooks"))
+from llm_batch import LLMBatchClient
+from stub_llm_server import serve
+
+# Benchmark: throughput (events/minute) of the LLM advisor against the local
+# stub server, serial (one blocking call per event, as the original advisor)
+# vs the async batch client at several concurrency limits. The stub enforces
+# a requests-per-minute window and a concurrency cap, so the adaptive
+# limiter and the Retry-After handling are exercised.
+#   python phase-1-exploration/benchmarks/bench_advisor.py --events 120 --latency 1.0 --rpm 300
+
+PROMPT = """
+        INPUT DATA:
+        - Location: Sede_{i:02d}
+        - Problem Type: Consumo Fantasma (Duration: 3 hours)
+        - Energy Wasted: 1500 kWh
+""" + "Context line for a realistic prompt size. " * 50
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM advisor throughput benchmark (offline stub).")
+    parser.add_argument("--events", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--rpm", type=int, default=300)
+    parser.add_argument("--max-concurrent", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--port", type=int, default=8018)
+    args = parser.parse_args()
+
+    prompts = [PROMPT.format(i=i % 40) for i in range(args.events)]
+    print(f"{'concurrency':>11} {'events/min':>11} {'seconds':>8} {'429s':>6} {'failed':>7}")
+    for i, concurrency in enumerate(args.concurrency):
+        # A fresh stub per run so one run's rate window does not slow the next
+        server, _ = serve(args.port + i, args.latency, args.rpm, args.max_concurrent)
+        client = LLMBatchClient('openai', base_url=f"http://127.0.0.1:{args.port + i}/v1", api_key="stub",
+                                concurrency=concurrency, rpm=10_000, tpm=10_000_000)
+        client.generate(prompts)
+        s = client.stats
+        print(f"{concurrency:>11} {s['per_minute']:11.0f} {s['seconds']:8.1f} {s['rate_limited']:>6} {s['failed']:>7}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../../phase-4-interface/api"))
+from responses import frame_response
+
+# Benchmark: serialization of API payloads, bytes/s per endpoint and format.
+#   default  DataFrame.to_dict(orient="records") + FastAPI's encoder (before)
+#   records  same JSON, written column by column with orjson
+#   columns  {columns, data} by column
+#   ndjson   streamed lines, chunks of 5000 rows
+# Payloads are shaped like the endpoints' (one sede), on synthetic data.
+#   python phase-1-exploration/benchmarks/bench_api_json.py --years 1 5
+
+
+def make_payloads(years, events=400, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range("2020-01-01", periods=years * 365 * 24, freq='h')
+    n = len(ts)
+    anomalias = pd.DataFrame({
+        'timestamp': ts,
+        'energia_total_kwh': rng.uniform(20, 200, n).astype(np.float32),
+        'ocupacion_pct': rng.uniform(0, 100, n),
+        'anomaly_critical': (rng.random(n) < 0.01).astype(np.int64),
+        'sede': pd.Categorical(['Tunja'] * n),
+    })
+    daily = anomalias.groupby(pd.Grouper(key='timestamp', freq='D'))['energia_total_kwh'].sum().reset_index()
+    recomendaciones = pd.DataFrame({
+        'event_id': [f"Tunja_{i}" for i in range(events)],
+        'sede': 'Tunja',
+        'start_time': ts[:events].strftime('%Y-%m-%d %H:%M:%S'),
+        'total_kwh': rng.uniform(50, 5000, events),
+        'duration_hours': rng.integers(1, 12, events),
+        'avg_occupancy': rng.uniform(0, 10, events).round(1),
+        'ai_recommendation': ["### 🚨 Consumo fuera de horario\n" + "Texto de la tarjeta. " * 40] * events,
+    })
+    return {'anomalias': anomalias, 'consumo-diario': daily, 'recomendaciones': recomendaciones}
+
+
+def default_body(df):
+    """What the endpoints did before: strftime, to_dict, jsonable_encoder, JSONResponse."""
+    out = df.copy()
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = out[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return JSONResponse(jsonable_encoder({"data": out.to_dict(orient="records")})).body
+
+
+async def _drain(response):
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+def body(df, fmt):
+    if fmt == 'default':
+        return default_body(df)
+    response = frame_response(df, fmt)
+    return asyncio.run(_drain(response)) if fmt == 'ndjson' else response.body
+
+
+def timed(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON serialization benchmark.")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':>16} {'rows':>8} {'format':>8} {'ms':>9} {'MB':>7} {'MB/s':>8} {'speedup':>8}")
+    for years in args.years:
+        for endpoint, df in make_payloads(years).items():
+            baseline = None
+            for fmt in ['default', 'records', 'columns', 'ndjson']:
+                seconds, data = timed(lambda: body(df, fmt), args.repeat)
+                baseline = baseline or seconds
+                print(f"{endpoint:>16} {len(df):>8,} {fmt:>8} {seconds * 1e3:9.1f} {len(data) / 1e6:7.2f} "
+                      f"{len(data) / 1e6 / seconds:8.0f} {baseline / seconds:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../notebooks"))
+from forecasting import forecast
+
+# Benchmark: future forecast of the global model, per-sede loop with string
+# join keys and one predict per sede (previous train_model code) vs the
+# batched forecast engine.
+#   python phase-1-exploration/benchmarks/bench_forecast.py --sedes 4 40 --years 1 3
+
+FEATURES = [
+    'hour_sin', 'hour_cos', 'day_sin', 'day_cos', 'month_sin', 'month_cos',
+    'temperatura_exterior_c', 'ocupacion_pct',
+    'es_festivo', 'es_semana_parciales', 'es_semana_finales', 'es_dia_laboral',
+    'sede_id_encoded', 'periodo_academico_encoded',
+    'lag_1h', 'lag_24h', 'lag_168h',
+    'area_m2', 'num_estudiantes', 'altitud_msnm', 'tiene_laboratorios_pesados'
+]
+STATIC_COLS = ['area_m2', 'num_estudiantes', 'altitud_msnm', 'tiene_laboratorios_pesados']
+
+
+def make_history(n_sedes, year=2025, seed=0):
+    """One year of hourly readings per sede, sorted by sede and timestamp."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00:00", freq='h')
+    names = [f"Sede_{i:02d}" for i in range(n_sedes)]
+    n = len(dates) * n_sedes
+    return pd.DataFrame({
+        'timestamp': np.tile(dates.to_numpy(), n_sedes),
+        'sede': pd.Categorical(np.repeat(names, len(dates)), categories=names),
+        'sede_id': np.repeat([f"ID_{i:02d}" for i in range(n_sedes)], len(dates)),
+        'temperatura_exterior_c': rng.normal(14, 3, n),
+        'ocupacion_pct': rng.random(n),
+        'energia_total_kwh': rng.gamma(2, 30, n).astype(np.float32),
+        'sede_id_encoded': np.repeat(np.arange(n_sedes, dtype=np.int8), len(dates)),
+        'periodo_academico_encoded': rng.integers(0, 3, n).astype(np.int8),
+    })
+
+
+def make_model(seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.random((20_000, len(FEATURES))), columns=FEATURES)
+    model = xgb.XGBRegressor(n_estimators=100, max_depth=6, n_jobs=-1)
+    model.fit(X, rng.random(len(X)) * 100)
+    return model
+
+
+def baseline(model, df, year, source_year=2025):
+    """The per-sede loop train_model used before the forecast engine."""
+    future_preds = []
+    history = df[df['timestamp'].dt.year == source_year].copy()
+    for sede in df['sede'].unique():
+        sede_df = df[df['sede'] == sede]
+        future_dates = pd.date_range(start=f'{year}-01-01', end=f'{year}-12-31 23:00:00', freq='h')
+        future_df = pd.DataFrame({'timestamp': future_dates})
+        future_df['sede'] = sede
+        future_df['hour_sin'] = np.sin(2 * np.pi * future_df['timestamp'].dt.hour / 24)
+        future_df['hour_cos'] = np.cos(2 * np.pi * future_df['timestamp'].dt.hour / 24)
+        future_df['day_sin'] = np.sin(2 * np.pi * future_df['timestamp'].dt.dayofweek / 7)
+        future_df['day_cos'] = np.cos(2 * np.pi * future_df['timestamp'].dt.dayofweek / 7)
+        future_df['month_sin'] = np.sin(2 * np.pi * future_df['timestamp'].dt.month / 12)
+        future_df['month_cos'] = np.cos(2 * np.pi * future_df['timestamp'].dt.month / 12)
+        future_df['es_dia_laboral'] = future_df['timestamp'].dt.dayofweek.isin([0, 1, 2, 3, 4]).astype(int)
+        source = history[history['sede'] == sede].copy()
+        source['join_key'] = source['timestamp'].apply(lambda x: f"{x.month}-{x.day}-{x.hour}")
+        future_df['join_key'] = future_df['timestamp'].apply(lambda x: f"{x.month}-{x.day}-{x.hour}")
+        cols_to_map = ['temperatura_exterior_c', 'ocupacion_pct', 'energia_total_kwh']
+        future_df = future_df.merge(source[['join_key'] + cols_to_map], on='join_key', how='left')
+        future_df[cols_to_map] = future_df[cols_to_map].ffill().bfill()
+        # Synthetic sedes are not in sedes_uptc.csv: left join gives NaN / flag 0
+        for col in STATIC_COLS:
+            future_df[col] = 0 if col == 'tiene_laboratorios_pesados' else np.nan
+        for col in ['lag_1h', 'lag_24h', 'lag_168h']:
+            future_df[col] = future_df['energia_total_kwh']
+        for col in ['es_festivo', 'es_semana_parciales', 'es_semana_finales']:
+            future_df[col] = 0
+        future_df['sede_id_encoded'] = sede_df['sede_id_encoded'].iloc[0]
+        future_df['periodo_academico_encoded'] = sede_df['periodo_academico_encoded'].mode()[0]
+        future_df['pred_energy_kwh'] = model.predict(future_df[FEATURES])
+        future_preds.append(future_df.drop(columns=['join_key', 'energia_total_kwh']))
+    return pd.concat(future_preds)
+
+
+def engine(model, df, year):
+    parts = [forecast(model, df, FEATURES, f'{y}-01-01', f'{y}-12-31 23:00:00', source_year=2025)
+             for y in range(2026, year + 1)]
+    return pd.concat(parts)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - start, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast generation benchmark.")
+    parser.add_argument("--sedes", type=int, nargs="+", default=[4, 40])
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 3])
+    args = parser.parse_args()
+
+    model = make_model()
+    print(f"{'sedes':>6} {'years':>6} {'rows':>10} {'loop (s)':>10} {'engine (s)':>11} {'speedup':>9}")
+    for n_sedes in args.sedes:
+        df = make_history(n_sedes)
+        for years in args.years:
+            last_year = 2025 + years
+            t_engine, out = timed(lambda: engine(model, df, last_year))
+            # The loop handles one year per call
+            t_base, expected = timed(lambda: pd.concat([baseline(model, df, y)
+                                                         for y in range(2026, last_year + 1)]))
+            # Rows are year-major in the engine output and sede-major per year in the loop
+            out = out.sort_values(['sede', 'timestamp'], kind='stable')
+            expected = expected.sort_values(['sede', 'timestamp'], kind='stable')
+            assert np.array_equal(out['pred_energy_kwh'].to_numpy(), expected['pred_energy_kwh'].to_numpy())
+            print(f"{n_sedes:>6} {years:>6} {len(out):>10,} {t_base:10.2f} {t_engine:11.2f} "
+                  f"{t_base / t_engine:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../notebooks"))
+from interpolation import interpolate_groups
+
+# Benchmark: grouped interpolation of the 10 numeric columns of clean_data,
+# pandas groupby().transform(lambda ...) per column vs interpolate_groups.
+#   python phase-1-exploration/benchmarks/bench_interpolation.py --rows 275000 5000000 50000000
+
+NUMERIC_COLS = ['energia_total_kwh', 'energia_comedor_kwh', 'energia_salones_kwh',
+                'energia_laboratorios_kwh', 'energia_auditorios_kwh', 'energia_oficinas_kwh',
+                'temperatura_exterior_c', 'ocupacion_pct', 'co2_kg', 'agua_litros']
+
+
+def make_frame(n_rows, n_sedes, nan_frac, seed=0):
+    """Sorted synthetic readings (float32 to fit 50M rows in memory)."""
+    rng = np.random.default_rng(seed)
+    sedes = pd.Categorical.from_codes(np.sort(rng.integers(0, n_sedes, n_rows)),
+                                      [f"Sede_{i:02d}" for i in range(n_sedes)])
+    df = pd.DataFrame({'sede': sedes})
+    for col in NUMERIC_COLS:
+        values = rng.random(n_rows, dtype=np.float32) * 100
+        values[rng.random(n_rows, dtype=np.float32) < nan_frac] = np.nan
+        df[col] = values
+    return df
+
+
+def baseline(df):
+    for col in NUMERIC_COLS:
+        df[col] = df.groupby('sede', observed=True)[col].transform(
+            lambda x: x.interpolate(method='linear', limit_direction='both'))
+    return df
+
+
+def digest(df):
+    """Exact fingerprint of the filled columns (avoids keeping two 50M-row frames alive)."""
+    return [hashlib.sha1(df[col].to_numpy().tobytes()).hexdigest() for col in NUMERIC_COLS]
+
+
+def timed(fn, make, repeat):
+    """Best wall time of fn over fresh frames, plus the digest of its output."""
+    best = float('inf')
+    for _ in range(repeat):
+        frame = make()
+        start = time.perf_counter()
+        out = fn(frame)
+        best = min(best, time.perf_counter() - start)
+        result = digest(out)
+        del frame, out
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grouped interpolation benchmark.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[275_000, 5_000_000, 50_000_000])
+    parser.add_argument("--sedes", type=int, default=4)
+    parser.add_argument("--nan-frac", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline-max-rows", type=int, default=50_000_000,
+                        help="Skip the pandas baseline above this size.")
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'pandas (s)':>12} {'engine (s)':>12} {'speedup':>9}")
+    for n_rows in args.rows:
+        make = lambda: make_frame(n_rows, args.sedes, args.nan_frac)
+        repeat = args.repeat if n_rows <= 5_000_000 else 1
+        t_engine, out = timed(lambda f: interpolate_groups(f, NUMERIC_COLS), make, repeat)
+
+        if n_rows <= args.baseline_max_rows:
+            t_base, expected = timed(baseline, make, repeat)
+            # Both paths must produce bit-identical columns
+            assert out == expected, "interpolate_groups differs from pandas"
+            speedup = f"{t_base / t_engine:8.1f}x"
+            t_base = f"{t_base:12.3f}"
+        else:
+            t_base, speedup = f"{'skipped':>12}", f"{'-':>9}"
+        print(f"{n_rows:>12,} {t_base} {t_engine:12.3f} {speedup}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../notebooks"))
+sys.path.append(os.path.join(BASE_DIR, "../../phase-2-anomalies/notebooks"))
+from feature_store import cyclic_features
+from iso_detectors import ISO_FEATURES, fit_detectors, score_detectors
+from robust_baseline import Z_THRESHOLD, candidates
+from training_backend import frame_batches, quantile_dmatrix, train_regressor
+
+# Benchmark: anomaly scoring of a history with fitted models.
+#   two-model  residual model predict + per-sede Isolation Forest on every row
+#   two-stage  rolling median/MAD candidates first, Isolation Forest on candidates only
+#              (residuals are still predicted for every row, as 01_detect_anomalies does)
+# Recall is the share of the two-model critical flags (and of the injected
+# spikes) the two-stage pipeline keeps. Fitting is setup, not timed.
+#   python phase-1-exploration/benchmarks/bench_prefilter.py --sedes 4 40 --years 2
+
+RESIDUAL_FEATURES = ['hour_sin', 'hour_cos', 'day_sin', 'day_cos', 'month_sin', 'month_cos',
+                     'temperatura_exterior_c', 'ocupacion_pct']
+TARGET = 'energia_total_kwh'
+
+
+def make_readings(n_sedes, years, spike_frac=0.002, seed=0):
+    """Hourly readings with a weekly profile per sede and injected spikes."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=years * 365 * 24, freq='h')
+    n = len(dates) * n_sedes
+    names = [f"Sede_{i:02d}" for i in range(n_sedes)]
+    ts = np.tile(dates.to_numpy(), n_sedes)
+    hour, dow = np.tile(dates.hour, n_sedes), np.tile(dates.dayofweek, n_sedes)
+    occupancy = np.clip((dow < 5) * np.exp(-((hour - 13) / 4.0) ** 2) + rng.normal(0, 0.05, n), 0, 1)
+    scale = np.repeat(rng.uniform(20, 200, n_sedes), len(dates))
+    energy = scale * (0.3 + occupancy) * rng.normal(1, 0.08, n)
+    spikes = rng.random(n) < spike_frac
+    energy[spikes] *= rng.uniform(2, 4, spikes.sum())
+    df = pd.DataFrame({
+        'timestamp': ts,
+        'sede': pd.Categorical(np.repeat(names, len(dates)), categories=names),
+        TARGET: energy.astype(np.float32),
+        'temperatura_exterior_c': rng.normal(14, 3, n),
+        'ocupacion_pct': occupancy,
+        'hour': hour,
+        'dayofweek': dow,
+    })
+    for col, values in cyclic_features(df['timestamp']).items():
+        df[col] = values
+    return df, spikes
+
+
+def critical(df, model, detectors, std, rows=None):
+    """Critical flags of the residual + Isolation Forest pipeline (forests on `rows`)."""
+    rows = np.arange(len(df)) if rows is None else rows
+    residual = df[TARGET].to_numpy() - model.predict(df[RESIDUAL_FEATURES])
+    iso = np.full(len(df), np.nan)
+    iso[rows] = score_detectors(df.iloc[rows], detectors, ISO_FEATURES)
+    return (residual > 2 * std) & (iso < 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Robust-baseline prefilter benchmark.")
+    parser.add_argument("--sedes", type=int, nargs="+", default=[4, 40])
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--z", type=float, default=Z_THRESHOLD)
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'two-model (s)':>14} {'two-stage (s)':>14} {'speedup':>8} "
+          f"{'candidates':>11} {'recall':>7} {'spike recall':>13}")
+    for n_sedes in args.sedes:
+        df, spikes = make_readings(n_sedes, args.years)
+        dtrain = quantile_dmatrix(frame_batches(df, RESIDUAL_FEATURES, TARGET), RESIDUAL_FEATURES)
+        model, _ = train_regressor({'max_depth': 5, 'n_jobs': -1}, dtrain, n_estimators=100)
+        detectors, _ = fit_detectors(df, ISO_FEATURES)
+        std = float(np.std(df[TARGET].to_numpy() - model.predict(df[RESIDUAL_FEATURES]), ddof=1))
+
+        start = time.perf_counter()
+        reference = critical(df, model, detectors, std)
+        t_full = time.perf_counter() - start
+
+        start = time.perf_counter()
+        mask = candidates(df, z_threshold=args.z)
+        staged = critical(df, model, detectors, std, rows=np.flatnonzero(mask))
+        t_staged = time.perf_counter() - start
+
+        recall = staged[reference].mean() if reference.any() else np.nan
+        spike_recall = (staged[spikes].mean(), reference[spikes].mean())
+        print(f"{len(df):>12,} {t_full:14.2f} {t_staged:14.2f} {t_full / t_staged:7.1f}x "
+              f"{mask.mean():10.1%} {recall:7.1%} {spike_recall[0]:6.1%}/{spike_recall[1]:.1%}")
+    print("spike recall: two-stage / two-model")
+
+
+if __name__ == "__main__":
+    main()
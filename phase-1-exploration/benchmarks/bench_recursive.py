@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../notebooks"))
+from bench_forecast import FEATURES, make_history, make_model
+from forecasting import recursive_forecast
+
+# Benchmark: step throughput of the recursive forecaster (one batched
+# inplace_predict per hour for all sedes) and time of the direct mode. The
+# first steps are checked against a naive rollout that predicts one sede at
+# a time with model.predict and recomputes the lags from the full series.
+#   python phase-1-exploration/benchmarks/bench_recursive.py --sedes 4 40 400 --hours 8760
+
+LAGS = {'lag_1h': 1, 'lag_24h': 24, 'lag_168h': 168}
+
+
+def naive_rollout(model, df, future, steps):
+    """Reference: per sede, per step, lags read from history + predictions so far."""
+    preds = {}
+    for sede, rows in future.groupby('sede', sort=False):
+        series = list(df.loc[df['sede'] == sede, 'energia_total_kwh'].to_numpy(np.float32))
+        out = []
+        for t in range(steps):
+            row = rows.iloc[[t]][FEATURES].copy()
+            for name, k in LAGS.items():
+                row[name] = series[-k]
+            p = model.predict(row)[0]
+            series.append(p)
+            out.append(p)
+        preds[sede] = np.array(out, dtype=np.float32)
+    return preds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recursive forecaster benchmark.")
+    parser.add_argument("--sedes", type=int, nargs="+", default=[4, 40, 400])
+    parser.add_argument("--hours", type=int, default=8760)
+    parser.add_argument("--check-steps", type=int, default=48,
+                        help="Steps compared against the naive rollout (first sede count only).")
+    args = parser.parse_args()
+
+    model = make_model()
+    end = pd.Timestamp('2026-01-01') + pd.Timedelta(hours=args.hours - 1)
+    print(f"{'sedes':>6} {'hours':>6} {'recursive (s)':>14} {'steps/s':>9} {'rows/s':>10} {'direct (s)':>11}")
+    for i, n_sedes in enumerate(args.sedes):
+        df = make_history(n_sedes)
+
+        start = time.perf_counter()
+        out = recursive_forecast(model, df, FEATURES, '2026-01-01', end, source_year=2025)
+        t_rec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        recursive_forecast(model, df, FEATURES, '2026-01-01', end, source_year=2025, direct=True)
+        t_direct = time.perf_counter() - start
+
+        if i == 0 and args.check_steps:
+            expected = naive_rollout(model, df, out, args.check_steps)
+            for sede, values in expected.items():
+                got = out.loc[out['sede'] == sede, 'pred_energy_kwh'].to_numpy()[:args.check_steps]
+                assert np.allclose(got, values, rtol=1e-5), f"rollout differs for {sede}"
+
+        print(f"{n_sedes:>6} {args.hours:>6} {t_rec:14.2f} {args.hours / t_rec:9,.0f} "
+              f"{args.hours * n_sedes / t_rec:10,.0f} {t_direct:11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../notebooks"))
+from training_backend import RoundStats, peak_rss_mb, quantile_dmatrix, train_regressor
+
+# Benchmark: peak memory and time per boosting round of the global model fit.
+#   pandas    XGBRegressor.fit on float64 frames, training set passed again as eval set
+#   quantile  one QuantileDMatrix built from batches, reused as eval set
+#   external  ExtMemQuantileDMatrix over generated batches (the full matrix never exists)
+# Every mode runs in its own process so peak RSS is not shared.
+#   python phase-1-exploration/benchmarks/bench_training.py --rows 1000000 5000000
+
+N_FEATURES = 21
+BATCH_ROWS = 1 << 18
+PARAMS = {'max_depth': 8, 'learning_rate': 0.05, 'subsample': 0.8, 'colsample_bytree': 0.8}
+
+
+def make_batch(start, n_rows):
+    """Deterministic synthetic rows [start, start + n_rows)."""
+    rng = np.random.default_rng(start)
+    X = rng.random((n_rows, N_FEATURES), dtype=np.float32)
+    y = (X[:, :5] @ np.arange(1, 6, dtype=np.float32) + rng.random(n_rows, dtype=np.float32)).astype(np.float32)
+    return X, y
+
+
+def batch_source(n_rows):
+    def batches():
+        for start in range(0, n_rows, BATCH_ROWS):
+            yield make_batch(start, min(BATCH_ROWS, n_rows - start))
+    return batches
+
+
+def run(mode, n_rows, rounds):
+    features = [f"f{i}" for i in range(N_FEATURES)]
+    start = time.perf_counter()
+    if mode == 'pandas':
+        X, y = map(np.concatenate, zip(*batch_source(n_rows)()))
+        train = pd.DataFrame(X.astype(np.float64), columns=features)
+        train['target'] = y.astype(np.float64)
+        del X, y
+        stats = RoundStats()
+        model = xgb.XGBRegressor(**PARAMS, n_estimators=rounds, n_jobs=-1, callbacks=[stats])
+        model.fit(train[features], train['target'],
+                  eval_set=[(train[features], train['target'])], verbose=False)
+        summary = stats.summary()
+    else:
+        dtrain = quantile_dmatrix(batch_source(n_rows), features, external_memory=(mode == 'external'))
+        _, summary = train_regressor({**PARAMS, 'n_jobs': -1}, dtrain, rounds, evals=[(dtrain, 'train')])
+    summary['total_seconds'] = time.perf_counter() - start
+    summary['peak_rss_mb'] = peak_rss_mb()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XGBoost training backend benchmark.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--modes", nargs="+", default=['pandas', 'quantile', 'external'])
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.child[0], int(args.child[1]), args.rounds)))
+        return
+
+    print(f"{'rows':>12} {'mode':>9} {'peak RSS (MB)':>14} {'ms/round':>9} {'total (s)':>10}")
+    for n_rows in args.rows:
+        for mode in args.modes:
+            out = subprocess.run([sys.executable, __file__, "--rounds", str(args.rounds),
+                                  "--child", mode, str(n_rows)], capture_output=True, text=True)
+            if out.returncode != 0:
+                print(f"{n_rows:>12,} {mode:>9} {'failed':>14}")
+                continue
+            s = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{n_rows:>12,} {mode:>9} {s['peak_rss_mb']:14,.0f} {s['ms_per_round']:9.1f} "
+                  f"{s['total_seconds']:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
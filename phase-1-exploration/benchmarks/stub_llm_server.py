@@ -0,0 +1,135 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for an OpenAI-compatible chat-completions endpoint, to test
+# and benchmark the LLM advisor offline. Answers after a random latency and
+# enforces a requests-per-minute window and a concurrency cap with 429 +
+# Retry-After, like the hosted providers.
+#   python phase-1-exploration/benchmarks/stub_llm_server.py --port 8008 --latency 1.5 --rpm 120
+#   python phase-3-recommendations/notebooks/02_llm_advisor.py --batch --base-url http://127.0.0.1:8008/v1
+
+CARD = """### 🚨 Consumo fuera de horario en {sede}
+
+**📉 What happened?**
+La sede siguió consumiendo energía sin ocupación.
+
+**💸 The Cost**
+Respuesta simulada por el servidor stub.
+
+**🛠️ Immediate Fix (The "Quick Win")**
+1. Revisar equipos encendidos.
+2. Programar apagado automático.
+
+**🔮 Long-term Strategy**
+Instalar sensores de presencia."""
+
+
+class StubState:
+    def __init__(self, latency, rpm, max_concurrent):
+        self.latency = latency
+        self.rpm = rpm
+        self.max_concurrent = max_concurrent
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.in_flight = 0
+        self.served = 0
+        self.rejected = 0
+
+    def admit(self):
+        """None if the request may proceed, else the Retry-After seconds."""
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            if self.rpm and len(self.recent) >= self.rpm:
+                self.rejected += 1
+                return max(0.1, 60 - (now - self.recent[0]))
+            if self.max_concurrent and self.in_flight >= self.max_concurrent:
+                self.rejected += 1
+                return 0.5
+            self.recent.append(now)
+            self.in_flight += 1
+            return None
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.served += 1
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers=()):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in headers:
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                return self._send(404, {"error": {"message": "not found"}})
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            retry_after = state.admit()
+            if retry_after is not None:
+                return self._send(429, {"error": {"message": "rate limit exceeded"}},
+                                  [("Retry-After", f"{retry_after:.2f}")])
+            try:
+                time.sleep(random.uniform(0.5, 1.5) * state.latency)
+                prompt = request["messages"][-1]["content"]
+                sede = next((line.split(":", 1)[1].strip() for line in prompt.splitlines()
+                             if line.strip().startswith("- Location:")), "la sede")
+                content = CARD.format(sede=sede)
+                prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+                self._send(200, {
+                    "id": f"stub-{state.served}",
+                    "object": "chat.completion",
+                    "model": request.get("model", "stub"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+            finally:
+                state.release()
+
+    return Handler
+
+
+def serve(port=8008, latency=1.0, rpm=0, max_concurrent=0):
+    """Starts the stub in a background thread; returns (server, state)."""
+    state = StubState(latency, rpm, max_concurrent)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible LLM server.")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--latency", type=float, default=1.0, help="Mean seconds per answer.")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before 429 (0: no limit).")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="Concurrent requests before 429.")
+    args = parser.parse_args()
+    server, _ = serve(args.port, args.latency, args.rpm, args.max_concurrent)
+    print(f"Stub LLM listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import argparse
 import os
 
+from data_store import (RAW_CSV, chunk_rows_for_budget, count_duplicates, ensure_raw_store,
+                        iter_sede_chunks, load_raw, table_columns)
+
 # Create output directory for plots
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "../data")
@@ -12,39 +16,64 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 def load_data():
     print("Loading data...")
     try:
-        csv_path = os.path.join(DATA_DIR, "consumos_uptc.csv")
-        df = pd.read_csv(csv_path)
-        # Convert timestamp to datetime
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        # Columnar store, typed timestamps (converted from the raw CSV once)
+        df = load_raw()
         print(f"Data loaded: {df.shape}")
         return df
-    except FileNotFoundError:
-        print(f"Error: {csv_path} not found.")
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
         return None
 
 def check_quality(df):
+    report_quality(quality_stats([('all', df)]))
+
+def quality_stats(chunks):
+    """
+    Missing values, negative energy readings and duplicate rows accumulated
+    over (sede, chunk) pairs, so the check also runs on data larger than RAM.
+    """
+    missing, negatives, dupes = None, {}, 0
+    for _, chunk in chunks:
+        counts = chunk.isnull().sum()
+        missing = counts if missing is None else missing.add(counts, fill_value=0)
+        
+        cols_energy = [c for c in chunk.columns if 'energia' in c or 'kwh' in c]
+        for col in cols_energy:
+            negatives[col] = negatives.get(col, 0) + int((chunk[col] < 0).sum())
+        
+        dupes += count_duplicates(chunk)
+    return missing, negatives, dupes
+
+def report_quality(stats):
+    missing, negatives, dupes = stats
     print("\n--- Data Quality Check ---")
     
     # Missing Values
-    missing = df.isnull().sum()
-    missing = missing[missing > 0]
+    missing = missing[missing > 0] if missing is not None else missing
     print(f"Missing Values:\n{missing}")
     
     # Negative Consumption (Sanity Check)
-    cols_energy = [c for c in df.columns if 'energia' in c or 'kwh' in c]
-    for col in cols_energy:
-        neg_count = (df[col] < 0).sum()
+    for col, neg_count in negatives.items():
         if neg_count > 0:
             print(f"⚠️ Warning: {neg_count} negative values in {col}")
 
     # Duplicates
-    dupes = df.duplicated().sum()
     print(f"Duplicate Rows: {dupes}")
 
+def check_quality_streaming(max_memory_mb):
+    """Quality check over per-sede chunks of the raw store, never loading it whole."""
+    if os.path.exists(RAW_CSV):
+        n_columns = len(pd.read_csv(RAW_CSV, nrows=1).columns)
+    else:
+        n_columns = len(table_columns(ensure_raw_store()))
+    chunk_rows = chunk_rows_for_budget(max_memory_mb, n_columns)
+    path = ensure_raw_store(chunk_rows)
+    report_quality(quality_stats(iter_sede_chunks(path, chunk_rows)))
+
 def plot_total_consumption(df):
     print("\nPlotting Total Consumption per Sede...")
     # Resample to Daily for cleaner plot
-    df_daily = df.groupby(['sede', pd.Grouper(key='timestamp', freq='D')])['energia_total_kwh'].sum().reset_index()
+    df_daily = df.groupby(['sede', pd.Grouper(key='timestamp', freq='D')], observed=True)['energia_total_kwh'].sum().reset_index()
     
     fig = px.line(df_daily, x='timestamp', y='energia_total_kwh', color='sede', 
                   title='Daily Total Energy Consumption by Sede')
@@ -82,6 +111,19 @@ def analyze_correlations(df):
     print("Saved correlation_matrix.html")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exploratory analysis of the raw readings.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Only run the quality check, chunk by chunk (data larger than RAM).")
+    parser.add_argument("--max-memory-mb", type=int, default=512)
+    args = parser.parse_args()
+    
+    if args.streaming:
+        try:
+            check_quality_streaming(args.max_memory_mb)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+        raise SystemExit(0)
+    
     df = load_data()
     if df is not None:
         check_quality(df)
@@ -1,26 +1,33 @@
 import pandas as pd
 import numpy as np
+import argparse
+import json
 import os
+import resource
+
+from data_store import (CLEAN_STORE, RAW_CSV, RAW_STORE, append_table, chunk_rows_for_budget,
+                        count_duplicates, ensure_raw_store, iter_sede_chunks, load_raw, read_table,
+                        sede_row_counts, table_columns, table_exists, write_table)
+from feature_store import CYCLIC_COLS, cyclic_features
+from interpolation import interpolate_groups
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "../data")
-OUTPUT_FILE = os.path.join(DATA_DIR, "consumos_uptc_clean.csv")
-
-def feature_engineering(df):
-    print("Engineering features...")
-    # Cyclic Time Features
-    df['hour'] = df['timestamp'].dt.hour
-    df['dayofweek'] = df['timestamp'].dt.dayofweek
-    df['month'] = df['timestamp'].dt.month
-    
-    df['hour_sin'] = np.sin(2 * np.pi * df['hour'] / 24)
-    df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
-    
-    df['day_sin'] = np.sin(2 * np.pi * df['dayofweek'] / 7)
-    df['day_cos'] = np.cos(2 * np.pi * df['dayofweek'] / 7) # Correction: 7 days
-    
-    df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
-    df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
+OUTPUT_STORE = CLEAN_STORE
+# Per-sede high-water marks of the last run (underscore files are ignored by the dataset reader)
+WATERMARKS_PATH = os.path.join(OUTPUT_STORE, "_watermarks.json")
+
+NUMERIC_COLS = ['energia_total_kwh', 'energia_comedor_kwh', 'energia_salones_kwh', 
+                'energia_laboratorios_kwh', 'energia_auditorios_kwh', 'energia_oficinas_kwh',
+                'temperatura_exterior_c', 'ocupacion_pct', 'co2_kg', 'agua_litros']
+FEATURE_COLS = CYCLIC_COLS
+
+def feature_engineering(df, verbose=True):
+    if verbose:
+        print("Engineering features...")
+    # Cyclic Time Features (definitions shared with the feature store)
+    for col, values in cyclic_features(df['timestamp']).items():
+        df[col] = values
     
     return df
 
@@ -38,18 +45,12 @@ def clean_data(df):
     df = df.sort_values(by=['sede', 'timestamp'])
     
     # 3. Imputation (Interpolation for continuous vars)
-    # We interpolate within each 'sede' group to avoid jumping across sedes
-    # However, doing it strictly by group is safer.
-    
-    numeric_cols = ['energia_total_kwh', 'energia_comedor_kwh', 'energia_salones_kwh', 
-                    'energia_laboratorios_kwh', 'energia_auditorios_kwh', 'energia_oficinas_kwh',
-                    'temperatura_exterior_c', 'ocupacion_pct', 'co2_kg', 'agua_litros']
+    # We interpolate within each 'sede' group to avoid jumping across sedes.
+    # Linear interpolation for time series gaps, all columns in one pass over the sorted blocks
+    df = interpolate_groups(df, NUMERIC_COLS, group='sede')
     
-    for col in numeric_cols:
+    for col in NUMERIC_COLS:
         if col in df.columns:
-            # Linear interpolation for time series gaps
-            df[col] = df.groupby('sede')[col].transform(lambda x: x.interpolate(method='linear', limit_direction='both'))
-            
             # Fill remaining NaNs with 0 (if valid) or Group Mean
             if df[col].isnull().sum() > 0:
                 print(f"  Filling remaining NaNs in {col} with 0")
@@ -57,22 +58,229 @@ def clean_data(df):
                 
     return df
 
-def main():
+def compute_watermarks(df, previous=None):
+    """
+    Per sede: newest timestamp processed, raw rows seen, and the timestamp of
+    the last non-null raw reading of every interpolated column. Rows after
+    that reading were filled by interpolation and must be recomputed once a
+    newer reading arrives.
+    """
+    state = dict(previous or {})
+    for sede, group in df.groupby('sede', observed=True):
+        prev = state.get(sede, {})
+        last_valid = dict(prev.get('last_valid', {}))
+        for col in NUMERIC_COLS:
+            if col in group.columns:
+                valid = group.loc[group[col].notna(), 'timestamp']
+                if not valid.empty:
+                    last_valid[col] = str(valid.max())
+                else:
+                    last_valid.setdefault(col, None)
+        state[sede] = {
+            'watermark': str(group['timestamp'].max()),
+            'raw_rows': prev.get('raw_rows', 0) + len(group),
+            'last_valid': last_valid,
+        }
+    return state
+
+def load_watermarks():
+    if not os.path.exists(WATERMARKS_PATH):
+        return None
+    with open(WATERMARKS_PATH) as f:
+        return json.load(f)
+
+def save_watermarks(state):
+    with open(WATERMARKS_PATH, "w") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+
+def full_rebuild():
+    df = load_raw()
+    state = compute_watermarks(df)
+    
+    df = clean_data(df)
+    df = feature_engineering(df)
+    
+    # Save (Parquet, partitioned by sede/year)
+    write_table(df, OUTPUT_STORE)
+    save_watermarks(state)
+    print(f"Clean data saved to: {OUTPUT_STORE}")
+    print(f"Shape: {df.shape}")
+
+def incremental_update(state):
+    """
+    Processes only raw rows newer than each sede's watermark. The stored tail
+    from the earliest last-valid reading is reloaded as an overlap window
+    (with interpolated cells reset to NaN) so the linear interpolation sees
+    the same anchors as a full rebuild, then replaced in the store.
+    """
+    raw_counts = sede_row_counts(RAW_STORE)
+    clean_cols = [c for c in table_columns(OUTPUT_STORE) if c not in FEATURE_COLS]
+    batches, replace_from, new_rows = [], {}, []
+
+    for sede, total in raw_counts.items():
+        prev = state.get(sede)
+        if prev is not None:
+            watermark = pd.Timestamp(prev['watermark'])
+            new = load_raw(sedes=sede, start=watermark + pd.Timedelta(1, 'ns'))
+            if prev['raw_rows'] + len(new) != total:
+                # Readings were added or rewritten behind the watermark
+                print(f"  {sede}: raw history changed before the watermark, rebuilding sede")
+                prev = None
+            elif new.empty:
+                continue
+        if prev is None:
+            new = load_raw(sedes=sede)
+            state.pop(sede, None)
+            batches.append(new)
+            replace_from[sede] = pd.Timestamp.min
+            new_rows.append(new)
+            continue
+
+        last_valid = prev['last_valid']
+        if any(ts is None for ts in last_valid.values()):
+            start = None
+        else:
+            start = min(pd.Timestamp(ts) for ts in last_valid.values())
+        window = read_table(OUTPUT_STORE, columns=clean_cols, sedes=sede, start=start)
+        for col, ts in last_valid.items():
+            if col in window.columns:
+                filled = window['timestamp'] > pd.Timestamp(ts) if ts else np.ones(len(window), dtype=bool)
+                window.loc[filled, col] = np.nan
+
+        print(f"  {sede}: {len(new)} new rows, {len(window)} overlap rows")
+        batches.append(pd.concat([window, new[clean_cols]], ignore_index=True))
+        replace_from[sede] = window['timestamp'].min() if not window.empty else new['timestamp'].min()
+        new_rows.append(new)
+
+    if not batches:
+        print("Clean store is up to date.")
+        return
+
+    df = pd.concat(batches, ignore_index=True)
+    df = clean_data(df)
+    df = feature_engineering(df)
+
+    append_table(df, OUTPUT_STORE, replace_from=replace_from)
+    save_watermarks(compute_watermarks(pd.concat(new_rows, ignore_index=True), state))
+    print(f"Clean data updated in: {OUTPUT_STORE} ({len(df)} rows rewritten)")
+
+def clean_stream(chunks):
+    """
+    Streaming counterpart of clean_data for per-sede, time-ordered chunks.
+
+    Rows from the earliest last valid reading of any interpolated column
+    onwards are carried into the next chunk of the same sede (with their
+    interpolated cells reset to NaN), so every emitted row was interpolated
+    with the same anchors as in clean_data. Yields clean chunks.
+    """
+    carry, carry_sede = None, None
+
+    def finish(df):
+        df = interpolate_groups(df, NUMERIC_COLS, group='sede')
+        for col in NUMERIC_COLS:
+            if col in df.columns:
+                df[col] = df[col].fillna(0)
+        return df
+
+    for sede, chunk in chunks:
+        if carry is not None and sede != carry_sede:
+            yield finish(carry)
+            carry = None
+        df = chunk if carry is None else pd.concat([carry, chunk], ignore_index=True)
+        carry_sede = sede
+
+        cols_energy = [c for c in df.columns if 'energia' in c or 'kwh' in c]
+        for col in cols_energy:
+            df[col] = df[col].clip(lower=0)
+
+        cols = [c for c in NUMERIC_COLS if c in df.columns]
+        last_valid = {}
+        for col in cols:
+            valid = np.flatnonzero(df[col].notna().to_numpy())
+            last_valid[col] = valid[-1] if len(valid) else -1
+        cut = min(last_valid.values()) if cols else len(df)
+        cut = max(cut, 0)
+
+        df = interpolate_groups(df, cols, group='sede')
+        carry = df.iloc[cut:].copy()
+        for col in cols:
+            carry.iloc[max(last_valid[col] - cut + 1, 0):, carry.columns.get_loc(col)] = np.nan
+        if len(carry) > 4 * len(chunk):
+            print(f"  Warning: {sede} carries {len(carry)} rows waiting for a valid reading")
+        if cut:
+            yield df.iloc[:cut].copy()
+    if carry is not None:
+        yield finish(carry)
+
+def stream_rebuild(max_memory_mb):
+    """
+    Out-of-core full rebuild: the raw CSV is streamed into the raw store, then
+    per-sede time-ordered chunks go through clip -> interpolate -> features ->
+    write. Peak memory follows max_memory_mb instead of the dataset size.
+    """
+    if os.path.exists(RAW_CSV):
+        n_columns = len(pd.read_csv(RAW_CSV, nrows=1).columns)
+    else:
+        n_columns = len(table_columns(ensure_raw_store()))
+    n_columns += len(FEATURE_COLS)
+    chunk_rows = chunk_rows_for_budget(max_memory_mb, n_columns)
+    print(f"Streaming preprocessing ({max_memory_mb} MB budget, {chunk_rows:,} rows per chunk)...")
+
+    ensure_raw_store(chunk_rows)
+
+    state, stats = {}, {'rows': 0, 'duplicates': 0}
+
+    def raw_chunks():
+        for sede, chunk in iter_sede_chunks(RAW_STORE, chunk_rows):
+            # Identical rows share sede and timestamp, so they always land in the same chunk
+            stats['duplicates'] += count_duplicates(chunk)
+            stats['rows'] += len(chunk)
+            state.update(compute_watermarks(chunk, state))
+            yield sede, chunk
+
+    mode = 'overwrite'
+    for df in clean_stream(raw_chunks()):
+        df = feature_engineering(df, verbose=False)
+        write_table(df, OUTPUT_STORE, mode=mode)
+        mode = 'append'
+    save_watermarks(state)
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Clean data saved to: {OUTPUT_STORE}")
+    print(f"Rows: {stats['rows']:,} | Duplicate rows: {stats['duplicates']:,} | Peak RSS: {peak_mb:,.0f} MB")
+
+def main(incremental=False, new_readings=None, streaming=False, max_memory_mb=512):
     try:
-        csv_path = os.path.join(DATA_DIR, "consumos_uptc.csv")
-        df = pd.read_csv(csv_path)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        df = clean_data(df)
-        df = feature_engineering(df)
+        if streaming:
+            stream_rebuild(max_memory_mb)
+            return
+
+        if new_readings:
+            # Daily delivery: append the new raw readings to the columnar raw store
+            ensure_raw_store()
+            append_table(pd.read_csv(new_readings), RAW_STORE)
         
-        # Save
-        df.to_csv(OUTPUT_FILE, index=False)
-        print(f"Clean data saved to: {OUTPUT_FILE}")
-        print(f"Shape: {df.shape}")
+        state = load_watermarks() if incremental and table_exists(OUTPUT_STORE) else None
+        if state is None:
+            if incremental:
+                print("No previous watermarks found, running a full rebuild.")
+            full_rebuild()
+        else:
+            print("Incremental preprocessing...")
+            incremental_update(state)
         
     except FileNotFoundError as e:
         print(e)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Clean raw readings into the columnar store.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only process readings newer than the per-sede watermarks.")
+    parser.add_argument("--new-readings", help="CSV with new raw readings to append before processing.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Out-of-core full rebuild for datasets larger than RAM.")
+    parser.add_argument("--max-memory-mb", type=int, default=512,
+                        help="Memory budget of the streaming mode (sets the chunk size).")
+    args = parser.parse_args()
+    main(incremental=args.incremental, new_readings=args.new_readings,
+         streaming=args.streaming, max_memory_mb=args.max_memory_mb)
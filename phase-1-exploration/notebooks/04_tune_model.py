@@ -0,0 +1,55 @@
+import argparse
+import os
+
+from model_registry import data_fingerprint, save_params
+from training_data import FEATURES, TARGET, load_training_frame, split_train_test
+from tuning import EARLY_STOPPING_DAYS, SEARCH_SPACE, search
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PLOTS_DIR = os.path.join(BASE_DIR, "../docs/model_plots")
+os.makedirs(PLOTS_DIR, exist_ok=True)
+
+def tune_model(method='halving', n_configs=27, max_rounds=1500, n_folds=3, horizon_days=90,
+               stopping_days=EARLY_STOPPING_DAYS, workers=None):
+    df = load_training_frame()
+    # Only the training period is searched: the 2025 test year stays unseen
+    train, _ = split_train_test(df)
+
+    # Same rows (and hash) train_model fits on, sorted by time for the folds
+    data_hash = data_fingerprint(train, FEATURES + [TARGET])
+    train = train.sort_values(['timestamp', 'sede'], kind='stable')
+
+    print(f"\nTuning GLOBAL XGBoost Model on {len(train):,} rows...")
+    results = search(train[FEATURES].to_numpy(), train[TARGET].to_numpy(), train['timestamp'].to_numpy(),
+                     method=method, n_configs=n_configs, max_rounds=max_rounds,
+                     n_folds=n_folds, horizon_days=horizon_days, stopping_days=stopping_days,
+                     workers=workers)
+
+    results_path = os.path.join(PLOTS_DIR, "tuning_results.csv")
+    results.to_csv(results_path, index=False)
+    print(f"Search results saved to {results_path}")
+
+    # to_dict keeps the dtype of every column (ints stay ints)
+    best = results.head(1).to_dict(orient='records')[0]
+    params = {name: best[name] for name in SEARCH_SPACE}
+    # Folds train on less history than the final fit, so keep a margin over the best round
+    n_estimators = int((best['best_iteration'] + 1) * 1.1)
+    save_params('global_xgb', params, data_hash, cv_score=best['cv_rmse'], n_estimators=n_estimators)
+    print(f"Best config (CV RMSE {best['cv_rmse']:.3f}): {params}, n_estimators={n_estimators}")
+    print(f"Registered as tuned params of global_xgb ({data_hash})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hyperparameter search for the global model.")
+    parser.add_argument("--method", choices=["halving", "random"], default="halving")
+    parser.add_argument("--n-configs", type=int, default=27)
+    parser.add_argument("--max-rounds", type=int, default=1500)
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--horizon-days", type=int, default=90)
+    parser.add_argument("--stopping-days", type=int, default=EARLY_STOPPING_DAYS,
+                        help="Days before each validation block held out for early stopping.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: one per core).")
+    args = parser.parse_args()
+    tune_model(method=args.method, n_configs=args.n_configs, max_rounds=args.max_rounds,
+               n_folds=args.folds, horizon_days=args.horizon_days, stopping_days=args.stopping_days,
+               workers=args.workers)
@@ -0,0 +1,415 @@
+import math
+import os
+import shutil
+import uuid
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Shared columnar storage for the tables handed from one phase to the next.
+# Tables are Parquet datasets partitioned by sede and year (hive layout:
+# <table>/sede=Tunja/year=2025/part-*.parquet) so a reader can project
+# columns and prune whole partitions instead of re-parsing a CSV.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, "../.."))
+DATA_DIR = os.path.join(ROOT_DIR, "phase-1-exploration/data")
+PHASE2_RESULTS = os.path.join(ROOT_DIR, "phase-2-anomalies/results")
+
+RAW_STORE = os.path.join(DATA_DIR, "store/consumos_uptc")
+CLEAN_STORE = os.path.join(DATA_DIR, "store/consumos_uptc_clean")
+ANOMALIES_STORE = os.path.join(PHASE2_RESULTS, "store/anomalies_detected")
+INEFFICIENCIES_STORE = os.path.join(PHASE2_RESULTS, "store/detailed_inefficiencies")
+# Readings scored online as they arrive (phase 2 streaming scorer)
+STREAM_ANOMALIES_STORE = os.path.join(PHASE2_RESULTS, "store/anomalies_stream")
+
+# Legacy CSV hand-offs, still accepted as input when a store is missing
+RAW_CSV = os.path.join(DATA_DIR, "consumos_uptc.csv")
+CLEAN_CSV = os.path.join(DATA_DIR, "consumos_uptc_clean.csv")
+ANOMALIES_CSV = os.path.join(PHASE2_RESULTS, "anomalies_detected.csv")
+INEFFICIENCIES_CSV = os.path.join(PHASE2_RESULTS, "detailed_inefficiencies.csv")
+
+# --- Schema ---
+CATEGORICAL_COLS = ['sede', 'sede_id', 'periodo_academico', 'dia_nombre']
+FLOAT32_PREFIXES = ('energia_', 'potencia_')
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('sede', pa.string()), ('year', pa.int16())]), flavor='hive'
+)
+
+
+def is_float32_col(col):
+    return col.startswith(FLOAT32_PREFIXES) and col.endswith(('_kwh', '_kw'))
+
+
+def widen_float32(values):
+    """
+    float64 copy of a float32 array holding the shortest decimal that rounds
+    to each value, so a reading written as 285.9 reads back as 285.9 and not
+    as 285.8999938964844. Readings with up to 7 significant digits get back
+    exactly the float64 they were written from.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    x = values.astype(np.float64)
+    out = x.copy()
+    pending = np.flatnonzero(np.isfinite(x) & (x != 0))
+    exp10 = np.floor(np.log10(np.abs(x[pending])))
+    # 9 significant digits always round-trip a float32
+    for digits in range(1, 10):
+        if not len(pending):
+            break
+        v = x[pending]
+        k = digits - 1 - exp10
+        scale = 10.0 ** np.abs(k)
+        rounded = np.where(k >= 0, np.round(v * scale) / scale, np.round(v / scale) * scale)
+        ok = rounded.astype(np.float32) == values[pending]
+        out[pending[ok]] = rounded[ok]
+        pending, exp10 = pending[~ok], exp10[~ok]
+    return out
+
+
+def apply_schema(df, storage=False):
+    """
+    Casts a frame to the store dtypes: categoricals for the low-cardinality
+    labels and native timestamps. Energy columns are float32 on disk
+    (storage=True) and float64 in memory, widened back to their written
+    decimals, so sums over them (event totals, KPIs, waste totals) match
+    the ones over the CSV hand-offs.
+    """
+    if 'timestamp' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    for col in CATEGORICAL_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    for col in df.columns:
+        if not is_float32_col(col):
+            continue
+        if storage and df[col].dtype != np.float32:
+            df[col] = df[col].astype(np.float32)
+        elif not storage and df[col].dtype == np.float32:
+            df[col] = widen_float32(df[col].to_numpy())
+        elif not storage and df[col].dtype != np.float64:
+            df[col] = df[col].astype(np.float64)
+    return df
+
+
+def arrow_schema(df):
+    """Explicit Arrow schema for a frame already passed through apply_schema(storage=True)."""
+    fields = []
+    for col in df.columns:
+        if col in CATEGORICAL_COLS:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        elif col == 'timestamp':
+            fields.append(pa.field(col, pa.timestamp('ns')))
+        elif is_float32_col(col):
+            fields.append(pa.field(col, pa.float32()))
+        else:
+            fields.append(pa.field(col, pa.Schema.from_pandas(df[[col]], preserve_index=False).field(col).type))
+    return pa.schema(fields)
+
+
+def _to_arrow(df):
+    df = apply_schema(df.copy(), storage=True)
+    if 'year' in df.columns:
+        raise ValueError("'year' is reserved as a partition column")
+    return pa.Table.from_pandas(df, schema=arrow_schema(df), preserve_index=False)
+
+
+def _partition_dir(path, sede, year):
+    return os.path.join(path, f"sede={quote(str(sede), safe='')}", f"year={year}")
+
+
+# --- Write ---
+def write_table(df, path, mode='overwrite'):
+    """
+    Persists a frame as a Parquet dataset partitioned by sede and year.
+
+    mode='overwrite' replaces the whole table, mode='append' adds new files
+    next to the existing ones (used by incremental runs).
+    """
+    if mode not in ('overwrite', 'append'):
+        raise ValueError(f"Unknown write mode: {mode}")
+    if mode == 'overwrite' and os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path, exist_ok=True)
+
+    table = _to_arrow(df)
+    sede = pd.Categorical(df['sede'])
+    year = pd.DatetimeIndex(df['timestamp']).year.to_numpy()
+    # One file per (sede, year): group rows with a single stable sort
+    order = np.lexsort((year, sede.codes))
+    keys = np.stack([sede.codes[order], year[order]], axis=1)
+    bounds = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+    bounds = np.concatenate([[0], bounds, [len(order)]])
+    batch_id = uuid.uuid4().hex
+
+    data = table.remove_column(table.schema.get_field_index('sede'))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if lo == hi:
+            continue
+        part_dir = _partition_dir(path, sede.categories[keys[lo, 0]], int(keys[lo, 1]))
+        os.makedirs(part_dir, exist_ok=True)
+        pq.write_table(data.take(order[lo:hi]), os.path.join(part_dir, f"part-{batch_id}.parquet"),
+                       row_group_size=1 << 20)
+    return path
+
+
+def _truncate(path, sede, start):
+    """Drops the stored rows of one sede with timestamp >= start."""
+    sede_dir = os.path.dirname(_partition_dir(path, sede, 0))
+    if not os.path.isdir(sede_dir):
+        return
+    for entry in os.listdir(sede_dir):
+        year = int(entry.split('=', 1)[1])
+        year_dir = os.path.join(sede_dir, entry)
+        if year > start.year:
+            shutil.rmtree(year_dir)
+        elif year == start.year:
+            files = [os.path.join(year_dir, f) for f in os.listdir(year_dir)]
+            kept = pa.concat_tables([pq.ParquetFile(f).read() for f in files])
+            ts = pd.DatetimeIndex(kept['timestamp'].to_numpy())
+            kept = kept.filter(pa.array(ts < start))
+            for f in files:
+                os.remove(f)
+            if kept.num_rows:
+                pq.write_table(kept, os.path.join(year_dir, f"part-{uuid.uuid4().hex}.parquet"),
+                               row_group_size=1 << 20)
+            else:
+                os.rmdir(year_dir)
+
+
+def append_table(df, path, replace_from=None):
+    """
+    Appends rows to a table. replace_from maps sede -> timestamp; stored rows
+    of that sede at or after the timestamp are dropped first, so a recomputed
+    tail replaces the old one instead of duplicating it. Only the partitions
+    from that year on are rewritten.
+    """
+    for sede, start in (replace_from or {}).items():
+        _truncate(path, sede, pd.Timestamp(start))
+    if len(df):
+        write_table(df, path, mode='append')
+    return path
+
+
+# --- Read ---
+def table_exists(path):
+    return os.path.isdir(path) and any(files for _, _, files in os.walk(path))
+
+
+def _dataset(path):
+    return ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+
+
+def _build_filter(sedes=None, start=None, end=None):
+    expr = None
+
+    def _and(a, b):
+        return b if a is None else a & b
+
+    if sedes is not None:
+        if isinstance(sedes, str):
+            sedes = [sedes]
+        expr = _and(expr, ds.field('sede').isin(list(sedes)))
+    # Year bounds prune partitions, timestamp bounds prune row groups
+    if start is not None:
+        start = pd.Timestamp(start)
+        expr = _and(expr, ds.field('year') >= start.year)
+        expr = _and(expr, ds.field('timestamp') >= pa.scalar(start.as_unit('ns').value, pa.timestamp('ns')))
+    if end is not None:
+        end = pd.Timestamp(end)
+        expr = _and(expr, ds.field('year') <= end.year)
+        expr = _and(expr, ds.field('timestamp') < pa.scalar(end.as_unit('ns').value, pa.timestamp('ns')))
+    return expr
+
+
+def read_table(path, columns=None, sedes=None, start=None, end=None):
+    """
+    Reads a partitioned table with column projection and predicate pushdown.
+
+    columns: subset of columns to load (None loads everything).
+    sedes: one sede or a list of sedes to read.
+    start/end: half-open timestamp window [start, end).
+
+    Rows come back sorted by sede and timestamp.
+    """
+    dataset = _dataset(path)
+    expr = _build_filter(sedes, start, end)
+
+    names = dataset.schema.names
+    if columns is not None:
+        missing = [c for c in columns if c not in names]
+        if missing:
+            raise KeyError(f"Columns not in {path}: {missing}")
+        scan_cols = list(columns)
+        # Sort keys are read even when not projected
+        extra = [c for c in ('sede', 'timestamp') if c in names and c not in scan_cols]
+        scan_cols += extra
+    else:
+        scan_cols = [c for c in names if c != 'year']
+        extra = []
+
+    table = dataset.to_table(columns=scan_cols, filter=expr)
+    df = table.to_pandas()
+    df = _sort(df)
+    if extra:
+        df = df.drop(columns=extra)
+    return apply_schema(df)
+
+
+def _sort(df):
+    if 'sede' not in df.columns or 'timestamp' not in df.columns or df.empty:
+        return df.reset_index(drop=True)
+    sede = pd.Categorical(df['sede'])
+    order = np.lexsort((df['timestamp'].to_numpy(), sede.codes))
+    return df.iloc[order].reset_index(drop=True)
+
+
+def read_sedes(path):
+    """Lists the sedes stored in a table without reading any row data."""
+    dataset = _dataset(path)
+    sedes = set()
+    for fragment in dataset.get_fragments():
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        if 'sede' in keys:
+            sedes.add(keys['sede'])
+    return sorted(sedes)
+
+
+def table_columns(path):
+    return [c for c in _dataset(path).schema.names if c != 'year']
+
+
+def load_table(path, legacy_csv=None, columns=None, sedes=None, start=None, end=None):
+    """
+    Reads a table from the store, falling back to its legacy CSV when the
+    store has not been built yet. Unlike read_table, requested columns that
+    the table does not have are skipped. Raises FileNotFoundError if neither
+    the store nor the CSV exists.
+    """
+    if table_exists(path):
+        if columns is not None:
+            available = set(table_columns(path))
+            columns = [c for c in columns if c in available]
+        return read_table(path, columns=columns, sedes=sedes, start=start, end=end)
+    if legacy_csv is None or not os.path.exists(legacy_csv):
+        raise FileNotFoundError(f"{path} not found.")
+
+    usecols = None if columns is None else (lambda c: c in set(columns))
+    df = apply_schema(pd.read_csv(legacy_csv, usecols=usecols))
+    if sedes is not None:
+        sedes = [sedes] if isinstance(sedes, str) else list(sedes)
+        df = df[df['sede'].isin(sedes)]
+    if start is not None:
+        df = df[df['timestamp'] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df['timestamp'] < pd.Timestamp(end)]
+    return _sort(df)
+
+
+def sede_row_counts(path):
+    """Rows stored per sede, read from Parquet footers only."""
+    counts = {}
+    for fragment in _dataset(path).get_fragments():
+        sede = ds.get_partition_keys(fragment.partition_expression)['sede']
+        counts[sede] = counts.get(sede, 0) + fragment.metadata.num_rows
+    return counts
+
+
+def ingest_csv(csv_path, path, chunk_rows):
+    """
+    Streams a CSV into a partitioned table chunk by chunk, so the file is
+    never held in memory. Column dtypes are inferred from the first chunk and
+    pinned for the rest, so every partition file shares one schema.
+    """
+    head = pd.read_csv(csv_path, nrows=chunk_rows)
+    dtypes = {c: t for c, t in head.dtypes.items() if t != object}
+    mode = 'overwrite'
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=dtypes):
+        write_table(chunk, path, mode=mode)
+        mode = 'append'
+    return path
+
+
+def chunk_rows_for_budget(max_memory_mb, n_columns, bytes_per_cell=64):
+    """
+    Rows per chunk for a memory budget. bytes_per_cell covers the copies a
+    chunk goes through (pandas, interpolation, Arrow conversion).
+    """
+    return max(10_000, int(max_memory_mb * 2**20 / (bytes_per_cell * n_columns)))
+
+
+def count_duplicates(chunk):
+    """
+    Exact duplicate rows of a chunk, compared by 64-bit row hash. Identical
+    rows share sede and timestamp, so on iter_sede_chunks output the per-chunk
+    counts add up to the count over the whole table.
+    """
+    hashes = pd.util.hash_pandas_object(chunk, index=False)
+    return int(hashes.duplicated().sum())
+
+
+def iter_sede_chunks(path, chunk_rows, sedes=None, columns=None):
+    """
+    Yields (sede, frame) chunks of about chunk_rows rows, time-ordered within
+    each sede, sede after sede. Every (sede, year) partition is split into
+    equal time windows sized from the Parquet row counts; a window is
+    streamed out of the partition with a filter and sorted on its own, so
+    only one window is in memory at a time.
+    """
+    dataset = _dataset(path)
+    rows = {}
+    for fragment in dataset.get_fragments():
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        key = (keys['sede'], keys['year'])
+        rows[key] = rows.get(key, 0) + fragment.metadata.num_rows
+    if sedes is not None:
+        sedes = {sedes} if isinstance(sedes, str) else set(sedes)
+
+    scan_cols = None if columns is None else list(dict.fromkeys(['sede', 'timestamp'] + list(columns)))
+    for sede, year in sorted(rows):
+        if sedes is not None and sede not in sedes:
+            continue
+        n_windows = max(1, math.ceil(rows[(sede, year)] / chunk_rows))
+        edges = pd.date_range(f"{year}-01-01", f"{year + 1}-01-01", periods=n_windows + 1)
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            table = dataset.to_table(
+                columns=scan_cols,
+                filter=(ds.field('sede') == sede) & (ds.field('year') == year)
+                & _build_filter(start=lo, end=hi),
+            )
+            if table.num_rows == 0:
+                continue
+            df = table.to_pandas()
+            if 'year' in df.columns:
+                df = df.drop(columns='year')
+            df = df.iloc[np.argsort(df['timestamp'].to_numpy(), kind='stable')].reset_index(drop=True)
+            yield sede, apply_schema(df)
+
+
+def ensure_raw_store(chunk_rows=None):
+    """
+    The CSV delivered by the data owners is converted to the store once and
+    re-converted only when the CSV is newer than the store. With chunk_rows
+    the CSV is streamed instead of read whole.
+    """
+    if not table_exists(RAW_STORE) or (
+            os.path.exists(RAW_CSV) and os.path.getmtime(RAW_CSV) > os.path.getmtime(RAW_STORE)):
+        if not os.path.exists(RAW_CSV):
+            raise FileNotFoundError(f"{RAW_CSV} not found.")
+        print(f"Converting {RAW_CSV} to columnar store...")
+        if chunk_rows:
+            ingest_csv(RAW_CSV, RAW_STORE, chunk_rows)
+        else:
+            write_table(pd.read_csv(RAW_CSV), RAW_STORE)
+    return RAW_STORE
+
+
+def load_raw(columns=None, sedes=None, start=None, end=None):
+    """Raw readings, read from the columnar copy of the raw CSV."""
+    return read_table(ensure_raw_store(), columns=columns, sedes=sedes, start=start, end=end)
+
@@ -0,0 +1,246 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_store import DATA_DIR
+from interpolation import group_bounds
+
+# Feature store shared by training, anomaly detection, SHAP and forecasting.
+# Features are organised in groups; each group is computed once per input
+# dataset and cached in memory and on disk under
+#   FEATURE_STORE/<group>-v<version>-<input hash>.parquet
+# The input hash covers only the columns the group is derived from, so a new
+# model (or a phase reading a table with extra columns, like the anomalies
+# table) reuses the features already materialized. Bump the version of a
+# group when its definition changes.
+#
+# Rows are aligned with the input frame, which must be sorted by sede and
+# timestamp (as read_table returns it).
+
+FEATURE_STORE = os.path.join(DATA_DIR, "store", "features")
+SEDES_CSV = os.path.join(DATA_DIR, "sedes_uptc.csv")
+
+CYCLIC_COLS = ['hour', 'dayofweek', 'month', 'hour_sin', 'hour_cos',
+               'day_sin', 'day_cos', 'month_sin', 'month_cos']
+CALENDAR_COLS = ['es_dia_laboral', 'sede_id_encoded', 'periodo_academico_encoded']
+LAGS = {'lag_1h': 1, 'lag_24h': 24, 'lag_168h': 168}
+STATIC_COLS = ['area_m2', 'num_estudiantes', 'altitud_msnm',
+               'tiene_residencias', 'tiene_laboratorios_pesados']
+STATIC_BOOL_COLS = ['tiene_residencias', 'tiene_laboratorios_pesados']
+LAG_TARGET = 'energia_total_kwh'
+
+FEATURE_GROUPS = {
+    'cyclic': CYCLIC_COLS,
+    'calendar': CALENDAR_COLS,
+    'lags': list(LAGS),
+    'static': STATIC_COLS,
+}
+FEATURE_VERSIONS = {'cyclic': 1, 'calendar': 1, 'lags': 1, 'static': 1}
+# Input columns each group is derived from (order and sede blocks always count)
+GROUP_INPUTS = {
+    'cyclic': ['timestamp'],
+    'calendar': ['sede', 'timestamp', 'periodo_academico'],
+    'lags': ['sede', 'timestamp', LAG_TARGET],
+    'static': ['sede_id'],
+}
+FEATURE_COLUMNS = {col: group for group, cols in FEATURE_GROUPS.items() for col in cols}
+
+# In-process cache: (group, version, input hash) -> {column: ndarray}
+_CACHE = {}
+
+
+def cyclic_features(timestamps):
+    """Calendar parts and their sin/cos encodings for a series of timestamps."""
+    ts = pd.Series(timestamps)
+    hour = ts.dt.hour.to_numpy()
+    dayofweek = ts.dt.dayofweek.to_numpy()
+    month = ts.dt.month.to_numpy()
+    return {
+        'hour': hour,
+        'dayofweek': dayofweek,
+        'month': month,
+        'hour_sin': np.sin(2 * np.pi * hour / 24),
+        'hour_cos': np.cos(2 * np.pi * hour / 24),
+        'day_sin': np.sin(2 * np.pi * dayofweek / 7),
+        'day_cos': np.cos(2 * np.pi * dayofweek / 7),
+        'month_sin': np.sin(2 * np.pi * month / 12),
+        'month_cos': np.cos(2 * np.pi * month / 12),
+    }
+
+
+def load_sedes():
+    """Static sede attributes (sedes_uptc.csv) with the boolean flags as 0/1."""
+    df_sedes = pd.read_csv(SEDES_CSV)
+    for col in STATIC_BOOL_COLS:
+        if col in df_sedes.columns:
+            df_sedes[col] = df_sedes[col].fillna(0).astype(int)
+    return df_sedes
+
+
+def static_features(sede_ids):
+    """Static sede attributes for every entry of sede_ids (left join on sede_id)."""
+    df_sedes = load_sedes()
+    sede_ids = pd.Series(sede_ids).astype('category')
+    # Map each category once, then broadcast through the codes
+    rows = pd.Index(df_sedes['sede_id']).get_indexer(sede_ids.cat.categories)
+    rows = np.append(rows, -1)[sede_ids.cat.codes.to_numpy()]
+    missing = rows < 0
+
+    features = {}
+    for col in STATIC_COLS:
+        if col not in df_sedes.columns:
+            continue
+        values = df_sedes[col].to_numpy()[np.where(missing, 0, rows)]
+        if col in STATIC_BOOL_COLS:
+            values[missing] = 0
+        elif missing.any():
+            values = values.astype(np.float64)
+            values[missing] = np.nan
+        features[col] = values
+    return features
+
+
+def _codes(values):
+    """Integer codes of the sorted distinct values (-1 for missing)."""
+    values = pd.Series(values)
+    categories = np.sort(values.dropna().astype(str).unique())
+    return pd.Categorical(values.astype(str).where(values.notna()), categories=categories).codes
+
+
+def _sede_blocks(df):
+    """Row blocks of every sede; checks the frame is sorted by sede and timestamp."""
+    keys = df['sede']
+    keys = keys.cat.codes if isinstance(keys.dtype, pd.CategoricalDtype) else _codes(keys)
+    starts, ends = group_bounds(np.asarray(keys))
+    ts = df['timestamp'].to_numpy()
+    backwards = np.flatnonzero(ts[1:] < ts[:-1]) + 1
+    if len(starts) != pd.Series(keys).nunique() or not np.isin(backwards, starts).all():
+        raise ValueError("Feature store input must be sorted by sede and timestamp")
+    return starts, ends
+
+
+def _compute_group(group, df):
+    if group == 'cyclic':
+        return cyclic_features(df['timestamp'])
+
+    if group == 'calendar':
+        dayofweek = df['timestamp'].dt.dayofweek.to_numpy()
+        return {
+            'es_dia_laboral': np.isin(dayofweek, [0, 1, 2, 3, 4]).astype(int),
+            'sede_id_encoded': _codes(df['sede']),
+            'periodo_academico_encoded': _codes(df['periodo_academico']),
+        }
+
+    if group == 'lags':
+        starts, ends = _sede_blocks(df)
+        target = df[LAG_TARGET].to_numpy()
+        if target.dtype.kind != 'f':
+            target = target.astype(np.float64)
+        # Position of every row inside its sede block
+        position = np.arange(len(df)) - np.repeat(starts, ends - starts)
+        features = {}
+        for name, k in LAGS.items():
+            lag = np.full(len(target), np.nan, dtype=target.dtype)
+            lag[k:] = target[:-k]
+            lag[position < k] = np.nan
+            features[name] = lag
+        return features
+
+    if group == 'static':
+        return static_features(df['sede_id'])
+
+    raise KeyError(f"Unknown feature group: {group}")
+
+
+def _input_hash(df, group, column_hashes):
+    digest = hashlib.sha1()
+    for col in GROUP_INPUTS[group]:
+        if col not in column_hashes:
+            h = hashlib.sha1(f"{col}:{df[col].dtype}".encode())
+            h.update(pd.util.hash_pandas_object(df[col], index=False).to_numpy().tobytes())
+            column_hashes[col] = h.digest()
+        digest.update(column_hashes[col])
+    if group == 'static':
+        with open(SEDES_CSV, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _group_path(group, version, data_hash):
+    return os.path.join(FEATURE_STORE, f"{group}-v{version}-{data_hash}.parquet")
+
+
+def _save_group(path, group, features):
+    os.makedirs(FEATURE_STORE, exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(pa.table({col: features[col] for col in features}), tmp_path)
+    os.replace(tmp_path, path)
+    # Files of older definitions of the group are stale
+    prefix = f"{group}-v"
+    current = f"{group}-v{FEATURE_VERSIONS[group]}-"
+    for name in os.listdir(FEATURE_STORE):
+        if name.startswith(prefix) and not name.startswith(current):
+            os.remove(os.path.join(FEATURE_STORE, name))
+
+
+def _load_group(path):
+    table = pq.read_table(path, memory_map=True)
+    # Single-chunk primitive columns without nulls convert without copying
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def materialize(df, groups=None, verbose=True):
+    """
+    Returns {column: array} with the features of the requested groups (all
+    by default) for the rows of df. Each group is computed only on a cache
+    miss; hits come from memory or from the on-disk store.
+    """
+    groups = groups or list(FEATURE_GROUPS)
+    features, column_hashes = {}, {}
+    for group in groups:
+        version = FEATURE_VERSIONS[group]
+        data_hash = _input_hash(df, group, column_hashes)
+        key = (group, version, data_hash)
+        if key not in _CACHE:
+            path = _group_path(group, version, data_hash)
+            if os.path.exists(path):
+                _CACHE[key] = _load_group(path)
+            else:
+                if verbose:
+                    print(f"  Materializing feature group '{group}' ({data_hash})...")
+                _CACHE[key] = _compute_group(group, df)
+                _save_group(path, group, _CACHE[key])
+        features.update(_CACHE[key])
+    return features
+
+
+def get_features(df, columns, verbose=True):
+    """
+    Frame with the requested columns, aligned with df. Columns already present
+    in df are served from df, the rest from the feature store; both without
+    copying (store columns may be read-only).
+    """
+    groups = []
+    for col in columns:
+        if col in df.columns:
+            continue
+        if col not in FEATURE_COLUMNS:
+            raise KeyError(f"Unknown feature: {col}")
+        if FEATURE_COLUMNS[col] not in groups:
+            groups.append(FEATURE_COLUMNS[col])
+    features = materialize(df, groups, verbose=verbose) if groups else {}
+    data = {col: df[col].to_numpy() if col in df.columns else features[col] for col in columns}
+    return pd.DataFrame(data, index=df.index, columns=list(columns), copy=False)
+
+
+def add_features(df, columns, verbose=True):
+    """Adds the requested store features to df (as regular, writable columns)."""
+    missing = [col for col in columns if col not in df.columns]
+    features = get_features(df, missing, verbose=verbose)
+    for col in missing:
+        df[col] = features[col].to_numpy()
+    return df
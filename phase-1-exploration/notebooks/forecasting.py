@@ -0,0 +1,248 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from feature_store import LAG_TARGET, LAGS, cyclic_features, get_features, static_features
+
+# Forecast engine for the global model.
+# The feature matrix for every sede and every future hour is built in one
+# go (sede-major blocks of the same horizon), exogenous variables are mapped
+# from a reference year through integer calendar keys, and the model is
+# called once for the whole matrix. recursive_forecast rolls the lag
+# features forward with the model's own predictions instead, starting from
+# the hour after the last reading (hours between the end of the history and
+# the requested start are predicted and dropped, so the lags stay in phase).
+
+# Columns taken from the reference year at the same (month, day, hour)
+MAPPED_COLS = ['temperatura_exterior_c', 'ocupacion_pct', 'energia_total_kwh']
+STATIC_COLS = ['area_m2', 'num_estudiantes', 'altitud_msnm', 'tiene_laboratorios_pesados']
+EVENT_COLS = ['es_festivo', 'es_semana_parciales', 'es_semana_finales']
+LAG_COLS = ['lag_1h', 'lag_24h', 'lag_168h']
+N_CALENDAR_KEYS = 13 * 32 * 24
+
+
+def calendar_key(timestamps):
+    """Integer (month, day, hour) key: same hour of the same date in any year."""
+    ts = pd.DatetimeIndex(timestamps)
+    return (ts.month.to_numpy() * 32 + ts.day.to_numpy()) * 24 + ts.hour.to_numpy()
+
+
+def _fill_blocks(values, n_blocks):
+    """ffill then bfill of a float vector, independently in n_blocks equal blocks."""
+    v = values.reshape(n_blocks, -1)
+    valid = ~np.isnan(v)
+    if valid.all():
+        return values
+    positions = np.arange(v.shape[1])
+    last = np.maximum.accumulate(np.where(valid, positions, -1), axis=1)
+    first = valid.argmax(axis=1)[:, None]
+    rows = np.arange(n_blocks)[:, None]
+    filled = v[rows, np.where(last >= 0, last, first)]
+    return filled.reshape(-1)
+
+
+def map_reference_year(df, sedes, timestamps, source_year, columns=MAPPED_COLS):
+    """
+    Values of `columns` for every (sede, future timestamp), taken from the
+    same calendar hour of source_year; hours without a match (e.g. Feb 29)
+    are forward/back filled within the sede. Result is sede-major.
+    """
+    source = df[df['timestamp'].dt.year == source_year]
+    sede_pos = pd.Index(sedes).get_indexer(source['sede'].astype(str))
+    keys = calendar_key(source['timestamp'])
+    keep = sede_pos >= 0
+
+    # Row of the reference reading for each (sede, key); the first reading wins
+    lut = np.full((len(sedes), N_CALENDAR_KEYS), -1, dtype=np.int64)
+    rows = np.flatnonzero(keep)[::-1]
+    lut[sede_pos[rows], keys[rows]] = rows
+
+    future_keys = calendar_key(timestamps)
+    idx = lut[:, future_keys].reshape(-1)
+    missing = idx < 0
+
+    mapped = {}
+    for col in columns:
+        values = source[col].to_numpy()
+        if values.dtype.kind != 'f':
+            values = values.astype(np.float64)
+        out = values[np.where(missing, 0, idx)] if len(values) else np.full(len(idx), np.nan)
+        out[missing] = np.nan
+        mapped[col] = _fill_blocks(out, len(sedes))
+    return mapped
+
+
+def build_future_frame(df, start, end, source_year, freq='h'):
+    """
+    Feature frame of the global model for every sede of df over [start, end].
+    Exogenous variables and the lag proxies come from source_year.
+    """
+    sedes = np.asarray(df['sede'].unique(), dtype=object).astype(str)
+    dates = pd.date_range(start=start, end=end, freq=freq)
+    n_sedes, horizon = len(sedes), len(dates)
+
+    future = pd.DataFrame({
+        'timestamp': np.tile(dates.to_numpy(), n_sedes),
+        'sede': np.repeat(sedes.astype(object), horizon),
+    })
+
+    # Calendar features are computed once for the horizon and tiled per sede
+    cyclic = cyclic_features(dates)
+    for col in ['hour_sin', 'hour_cos', 'day_sin', 'day_cos', 'month_sin', 'month_cos']:
+        future[col] = np.tile(cyclic[col], n_sedes)
+    future['es_dia_laboral'] = np.tile(np.isin(cyclic['dayofweek'], [0, 1, 2, 3, 4]).astype(int), n_sedes)
+
+    mapped = map_reference_year(df, sedes, dates, source_year)
+    future['temperatura_exterior_c'] = mapped['temperatura_exterior_c']
+    future['ocupacion_pct'] = mapped['ocupacion_pct']
+
+    # Static sede attributes, one lookup per sede
+    per_sede = df.groupby('sede', observed=True, sort=False)
+    sede_ids = per_sede['sede_id'].first().reindex(sedes).to_numpy()
+    static = static_features(sede_ids)
+    for col in STATIC_COLS:
+        future[col] = np.repeat(static[col], horizon) if col in static else 0
+
+    # Using the reference year as proxy for the lags
+    for col in LAG_COLS:
+        future[col] = mapped['energia_total_kwh']
+
+    for col in EVENT_COLS:
+        future[col] = 0
+
+    # Sede code and most frequent academic period of each sede's history
+    codes = get_features(df, ['sede_id_encoded', 'periodo_academico_encoded'], verbose=False)
+    codes.insert(0, 'sede', df['sede'].astype(str).to_numpy())
+    sede_code = codes.groupby('sede', sort=False)['sede_id_encoded'].first().reindex(sedes)
+    counts = codes.groupby(['sede', 'periodo_academico_encoded']).size()
+    # idxmax keeps the first (lowest) code among ties, like Series.mode()[0]
+    periodo = counts.groupby(level='sede').idxmax().map(lambda key: key[1]).reindex(sedes)
+    future['sede_id_encoded'] = np.repeat(sede_code.to_numpy(), horizon)
+    future['periodo_academico_encoded'] = np.repeat(periodo.to_numpy(), horizon)
+    return future
+
+
+def forecast(model, df, features, start, end, source_year, label=None):
+    """Predictions of the global model for every sede over [start, end], in one predict call."""
+    future = build_future_frame(df, start, end, source_year)
+    future['pred_energy_kwh'] = model.predict(future[features])
+    future['type'] = label or f"Pronostico {pd.Timestamp(start).year}"
+    return future
+
+
+def _iteration_range(model):
+    """Trees model.predict would use (up to the best iteration with early stopping)."""
+    try:
+        return (0, model.best_iteration + 1)
+    except AttributeError:
+        return (0, 0)
+
+
+def rollout_origin(df, start):
+    """
+    First hour of the recursive rollout: the hour after the last reading
+    before start (start itself when the history reaches start - 1h).
+    """
+    start = pd.Timestamp(start)
+    last = df.loc[df['timestamp'] < start, 'timestamp'].max()
+    if pd.isna(last):
+        return start
+    return min(start, last.floor('h') + pd.Timedelta(hours=1))
+
+
+def _seed_buffer(df, sedes, origin, window):
+    """
+    Ring buffer (n_sedes, window) with the observed consumptions of every
+    sede in the `window` hours before origin, on an hourly grid; slot
+    s % window holds step s (history steps are negative). Missing hours are
+    filled with the previous reading of the sede (the next one at the start
+    of the window), sedes without readings in the window repeat their last
+    earlier reading.
+    """
+    one_hour = pd.Timedelta(hours=1)
+    grid_start = origin - window * one_hour
+    history = df[df['timestamp'] < origin]
+    sede_pos = pd.Index(sedes).get_indexer(history['sede'].astype(str))
+    values = history[LAG_TARGET].to_numpy(dtype=np.float32)
+    hour_pos = ((history['timestamp'] - grid_start) // one_hour).to_numpy()
+
+    # Hourly grid; a later reading in the same hour wins
+    grid = np.full((len(sedes), window), np.nan, dtype=np.float32)
+    inside = (sede_pos >= 0) & (hour_pos >= 0)
+    grid[sede_pos[inside], hour_pos[inside]] = values[inside]
+
+    missing = np.isnan(grid).sum(axis=1)
+    for i in np.flatnonzero(missing == window):
+        before = values[(sede_pos == i) & ~inside]
+        if len(before):
+            grid[i] = before[-1]
+    filled = int(np.count_nonzero(missing))
+    if filled:
+        warnings.warn(f"{filled} sedes miss readings in the {window} hours before {origin} "
+                      f"({int(missing.sum())} hours); lags filled with the nearest reading")
+    grid = _fill_blocks(grid.reshape(-1), len(sedes)).reshape(len(sedes), window)
+
+    buffer = np.empty_like(grid)
+    buffer[:, np.arange(-window, 0) % window] = grid
+    return buffer
+
+
+def recursive_forecast(model, df, features, start, end, source_year, direct=False, label=None):
+    """
+    Forecast with real lag features. In the recursive mode the model rolls
+    forward hour by hour: every step predicts all sedes in one batched
+    inplace_predict and its predictions feed the lags of the next steps
+    through a ring buffer of the last 168 values per sede.
+
+    With direct=True no prediction is fed back: the lags of every horizon
+    come from the last observed week (same hour of the week, same hour of
+    the day, last reading) and all horizons are predicted in one call.
+
+    Exogenous variables come from source_year as in forecast(). When the
+    history ends before start - 1h, the rollout starts at the hour after the
+    last reading and the rows before start are dropped.
+    """
+    start = pd.Timestamp(start)
+    origin = rollout_origin(df, start)
+    if origin < start:
+        warnings.warn(f"History ends at {origin - pd.Timedelta(hours=1)}: rolling forward "
+                      f"{(start - origin) // pd.Timedelta(hours=1)} hours before {start}")
+    future = build_future_frame(df, origin, end, source_year)
+    sedes = future['sede'].unique()
+    n_sedes = len(sedes)
+    horizon = len(future) // n_sedes if n_sedes else 0
+    lags = [(features.index(name), k) for name, k in LAGS.items() if name in features]
+    window = max(LAGS.values())
+    buffer = _seed_buffer(df, sedes, origin, window)
+    steps = np.arange(horizon)
+
+    if direct:
+        for name, k in LAGS.items():
+            # Latest observed step at the same phase: t - k * (t // k + 1) < 0
+            source = (steps - k * (steps // k + 1)) % window
+            future[name] = buffer[:, source].reshape(-1)
+        future['pred_energy_kwh'] = model.predict(future[features])
+    else:
+        # Step-major feature tensor: X[t] holds the rows of all sedes at step t
+        X = future[features].to_numpy(dtype=np.float32).reshape(n_sedes, horizon, -1)
+        X = np.ascontiguousarray(X.transpose(1, 0, 2))
+        booster = model.get_booster()
+        iteration_range = _iteration_range(model)
+        preds = np.empty((horizon, n_sedes), dtype=np.float32)
+        for t in range(horizon):
+            x = X[t]
+            for j, k in lags:
+                x[:, j] = buffer[:, (t - k) % window]
+            pred = booster.inplace_predict(x, iteration_range=iteration_range)
+            buffer[:, t % window] = pred
+            preds[t] = pred
+
+        for j, k in lags:
+            future[features[j]] = X[:, :, j].T.reshape(-1)
+        future['pred_energy_kwh'] = preds.T.reshape(-1)
+
+    if origin < start:
+        future = future[future['timestamp'] >= start].reset_index(drop=True)
+    future['type'] = label or f"Pronostico {start.year}"
+    return future
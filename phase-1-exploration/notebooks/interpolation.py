@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+# Grouped linear interpolation over a frame sorted by group (e.g. sede).
+# Equivalent to
+#   df.groupby(group)[col].transform(lambda x: x.interpolate(method='linear', limit_direction='both'))
+# for every column, but the group blocks are computed once from the sorted keys
+# and every column is filled for all groups in one vectorized pass: no
+# regrouping per column and no Python call per group.
+
+
+def group_bounds(keys):
+    """
+    Start and end (exclusive) row of every contiguous block of equal keys.
+    Keys must already be sorted/grouped.
+    """
+    keys = np.asarray(keys)
+    n = len(keys)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], n]
+    return starts, ends
+
+
+def _interpolate_column(y, starts, ends):
+    """
+    In-place fill of one float column, independently per row block
+    [starts[i], ends[i]); work is proportional to its NaNs. Rows are equally
+    spaced (position based, like pandas' method='linear'); NaNs before the
+    first / after the last valid value of a block take that value and blocks
+    without any valid value stay NaN. Fill values are computed in float64 (the
+    expression np.interp evaluates) and cast to the column dtype, as pandas does.
+    """
+    missing = np.flatnonzero(np.isnan(y))
+    if len(missing) == 0:
+        return y
+
+    # Runs of consecutive NaNs: the valid neighbours of a run are the rows
+    # just before and just after it
+    run_break = np.flatnonzero(np.diff(missing) != 1) + 1
+    run_first = np.r_[0, run_break]
+    run_len = np.diff(np.r_[run_first, len(missing)])
+    prev = np.repeat(missing[run_first] - 1, run_len)
+    nxt = np.repeat(missing[run_first + run_len - 1] + 1, run_len)
+
+    # A neighbour only counts if it lies in the same block as the missing row
+    block = np.searchsorted(starts, missing, side='right') - 1
+    has_prev = prev >= starts[block]
+    has_next = nxt < ends[block]
+
+    # Inside: slope * (x - x0) + y0, the same expression np.interp evaluates
+    inner = has_prev & has_next
+    x, x0, x1 = missing[inner], prev[inner], nxt[inner]
+    y0, y1 = y[x0].astype(np.float64), y[x1].astype(np.float64)
+    slope = (y1 - y0) / (x1 - x0).astype(np.float64)
+    fill_inner = slope * (x - x0).astype(np.float64) + y0
+
+    # Edges: carry the nearest valid value of the block
+    lead = ~has_prev & has_next
+    trail = has_prev & ~has_next
+    fill_lead = y[nxt[lead]]
+    fill_trail = y[prev[trail]]
+
+    y[x] = fill_inner
+    y[missing[lead]] = fill_lead
+    y[missing[trail]] = fill_trail
+    return y
+
+
+def interpolate_groups(df, columns, group='sede'):
+    """
+    Fills the NaNs of `columns` by linear interpolation within each `group`.
+    df must be sorted by group (and time inside each group). Columns keep
+    their dtype; missing columns are skipped.
+    """
+    columns = [c for c in columns if c in df.columns]
+    if not columns or df.empty:
+        return df
+    keys = df[group]
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        keys = keys.cat.codes
+    starts, ends = group_bounds(keys.to_numpy())
+
+    # Column by column keeps peak memory at one extra column; columns
+    # without NaNs are left untouched
+    for col in columns:
+        if not df[col].isna().any():
+            continue
+        if df[col].dtype.kind == 'f':
+            values = df[col].to_numpy(copy=True)
+        else:
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        df[col] = _interpolate_column(values, starts, ends)
+    return df
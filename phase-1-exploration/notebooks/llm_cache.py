@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import contextmanager
+
+from data_store import DATA_DIR
+
+# Persistent cache of LLM answers shared by the advisor, the API chat and
+# the dashboard. Entries are content-addressed:
+#   key = sha256(namespace, model, temperature, prompt, data snapshot)
+# where prompt is the rendered prompt (advisor) or sede + normalized question
+# (chat), and the snapshot is a version of the files the answer was computed
+# from. When the data changes the snapshot changes, old keys stop matching
+# and prune() drops their entries. Eviction is LRU (max_entries) plus TTL.
+# Hits and misses are counted per namespace in the same database.
+
+LLM_CACHE_PATH = os.path.join(DATA_DIR, "store", "llm_cache.sqlite")
+MAX_ENTRIES = 20_000
+TTL_SECONDS = 30 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    model TEXT,
+    snapshot TEXT,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_namespace ON entries (namespace, snapshot);
+CREATE TABLE IF NOT EXISTS metrics (
+    namespace TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def normalize_question(question):
+    """Lowercase, no accents, single spaces, no surrounding punctuation."""
+    text = unicodedata.normalize('NFKD', question)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" ¿?¡!.,;:")
+
+
+def snapshot_version(*paths):
+    """Version of files/directories from their names, sizes and mtimes (no reads)."""
+    digest = hashlib.sha1()
+    for path in paths:
+        files = [path] if os.path.isfile(path) else sorted(
+            os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        for file in files:
+            stat = os.stat(file)
+            digest.update(f"{os.path.relpath(file, path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(namespace, model, temperature, prompt, snapshot=None):
+    payload = json.dumps([namespace, model, temperature, prompt, snapshot], ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed LLM response cache (one short connection per operation)."""
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, conn, namespace, hit):
+        column = 'hits' if hit else 'misses'
+        conn.execute(f"INSERT INTO metrics (namespace, {column}) VALUES (?, 1) "
+                     f"ON CONFLICT(namespace) DO UPDATE SET {column} = {column} + 1", (namespace,))
+
+    def get(self, namespace, model, temperature, prompt, snapshot=None):
+        """Cached response or None (expired entries count as misses)."""
+        key = cache_key(namespace, model, temperature, prompt, snapshot)
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE entries SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._count(conn, namespace, row is not None)
+        return None if row is None else row[0]
+
+    def put(self, namespace, model, temperature, prompt, response, snapshot=None):
+        key = cache_key(namespace, model, temperature, prompt, snapshot)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO entries (key, namespace, model, snapshot, response, "
+                         "created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, namespace, model, snapshot, response, now, now))
+            count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                self._evict_lru(conn, count - self.max_entries)
+
+    def _evict_lru(self, conn, n):
+        conn.execute("DELETE FROM entries WHERE key IN "
+                     "(SELECT key FROM entries ORDER BY accessed_at LIMIT ?)", (n,))
+
+    def get_or_compute(self, namespace, model, temperature, prompt, compute, snapshot=None):
+        """Cached response, or compute() stored for next time. Returns (response, hit)."""
+        cached = self.get(namespace, model, temperature, prompt, snapshot)
+        if cached is not None:
+            return cached, True
+        response = compute()
+        self.put(namespace, model, temperature, prompt, response, snapshot)
+        return response, False
+
+    def prune(self, namespace=None, snapshot=None):
+        """
+        Drops expired entries, entries of `namespace` computed on another
+        snapshot than `snapshot`, and the least recently used overflow.
+        Returns the number of entries removed.
+        """
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            if namespace is not None and snapshot is not None:
+                conn.execute("DELETE FROM entries WHERE namespace = ? AND snapshot IS NOT ?",
+                             (namespace, snapshot))
+            count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                self._evict_lru(conn, count - self.max_entries)
+            return conn.total_changes - before
+
+    def stats(self):
+        """{namespace: {'entries', 'hits', 'misses', 'hit_rate'}}."""
+        with self._connect() as conn:
+            entries = dict(conn.execute("SELECT namespace, COUNT(*) FROM entries GROUP BY namespace"))
+            metrics = {ns: (h, m) for ns, h, m in conn.execute("SELECT namespace, hits, misses FROM metrics")}
+        out = {}
+        for ns in sorted(set(entries) | set(metrics)):
+            hits, misses = metrics.get(ns, (0, 0))
+            out[ns] = {'entries': entries.get(ns, 0), 'hits': hits, 'misses': misses,
+                       'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
+        return out
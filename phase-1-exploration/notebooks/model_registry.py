@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import pandas as pd
+import xgboost as xgb
+
+# Registry of trained XGBoost models shared by the phases.
+# Each entry is stored as <REGISTRY_DIR>/<name>/<data_hash>/ with the booster
+# (XGBoost's own JSON format) and a meta.json holding the feature list, the
+# hash of the training data, metrics and hyperparameters. A phase that needs a
+# model looks it up by name and training-data hash and only fits on a miss.
+# Tuned hyperparameters are stored next to the entries as
+# <name>/params-<data_hash>.json. Sets of scikit-learn detectors (one per
+# sede) use the same layout with one joblib file per detector.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.path.join(BASE_DIR, "../models")
+
+# In-process memo: (name, data_hash) -> (model, meta)
+_LOADED = {}
+
+
+def data_fingerprint(df, columns):
+    """Content hash of the given columns (values and dtypes, not the index)."""
+    digest = hashlib.sha1()
+    for col in columns:
+        digest.update(f"{col}:{df[col].dtype}".encode())
+        digest.update(pd.util.hash_pandas_object(df[col], index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _entry_dir(name, data_hash):
+    return os.path.join(REGISTRY_DIR, name, data_hash)
+
+
+def save_model(name, model, features, data_hash, metrics=None, params=None):
+    """Persists a fitted XGBRegressor with its metadata and memoizes it."""
+    entry = _entry_dir(name, data_hash)
+    os.makedirs(entry, exist_ok=True)
+    model.save_model(os.path.join(entry, "model.json"))
+
+    meta = {
+        'name': name,
+        'data_hash': data_hash,
+        'features': list(features),
+        'metrics': metrics or {},
+        'params': {k: v for k, v in (params or model.get_params()).items()
+                   if isinstance(v, (int, float, str, bool, type(None)))},
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(entry, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2, default=float)
+
+    _LOADED[(name, data_hash)] = (model, meta)
+    return meta
+
+
+def list_models(name):
+    """Metadata of every registered version of a model, newest first."""
+    root = os.path.join(REGISTRY_DIR, name)
+    if not os.path.isdir(root):
+        return []
+    metas = []
+    for data_hash in os.listdir(root):
+        meta_path = os.path.join(root, data_hash, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                metas.append(json.load(f))
+    return sorted(metas, key=lambda m: m['created_at'], reverse=True)
+
+
+def load_model(name, data_hash=None, features=None):
+    """
+    Returns (model, meta) for the entry trained on data_hash, or the newest
+    entry when data_hash is None. If features is given the entry must have
+    been trained on exactly those features. Returns None when nothing matches.
+    """
+    if data_hash is None:
+        versions = list_models(name)
+        if not versions:
+            return None
+        data_hash = versions[0]['data_hash']
+
+    key = (name, data_hash)
+    if key not in _LOADED:
+        entry = _entry_dir(name, data_hash)
+        if not os.path.exists(os.path.join(entry, "model.json")):
+            return None
+        with open(os.path.join(entry, "meta.json")) as f:
+            meta = json.load(f)
+        model = xgb.XGBRegressor()
+        model.load_model(os.path.join(entry, "model.json"))
+        _LOADED[key] = (model, meta)
+
+    model, meta = _LOADED[key]
+    if features is not None and list(features) != meta['features']:
+        return None
+    return model, meta
+
+
+def _params_path(name, data_hash):
+    return os.path.join(REGISTRY_DIR, name, f"params-{data_hash}.json")
+
+
+def save_params(name, params, data_hash, cv_score=None, n_estimators=None):
+    """Stores tuned hyperparameters for a model trained on data_hash."""
+    entry = {
+        'name': name,
+        'data_hash': data_hash,
+        'params': params,
+        'n_estimators': n_estimators,
+        'cv_score': cv_score,
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    path = _params_path(name, data_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(entry, f, indent=2, default=float)
+    return entry
+
+
+def load_params(name, data_hash):
+    """Tuned hyperparameters for name on data_hash, or None if never tuned."""
+    path = _params_path(name, data_hash)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_detectors(name, detectors, features, data_hash, metrics=None):
+    """
+    Persists a set of scikit-learn detectors keyed by sede (one joblib file
+    each) with their metadata, and memoizes them.
+    """
+    entry = _entry_dir(name, data_hash)
+    os.makedirs(entry, exist_ok=True)
+    files = {}
+    for i, (sede, detector) in enumerate(sorted(detectors.items())):
+        files[sede] = f"detector_{i:03d}.joblib"
+        joblib.dump(detector, os.path.join(entry, files[sede]))
+
+    meta = {
+        'name': name,
+        'data_hash': data_hash,
+        'features': list(features),
+        'detectors': files,
+        'metrics': metrics or {},
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(entry, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False, default=float)
+
+    _LOADED[(name, data_hash)] = (dict(detectors), meta)
+    return meta
+
+
+def load_detectors(name, data_hash=None, features=None):
+    """
+    Returns ({sede: detector}, meta) for the entry fitted on data_hash, or the
+    newest entry when data_hash is None. None when nothing matches.
+    """
+    if data_hash is None:
+        versions = list_models(name)
+        if not versions:
+            return None
+        data_hash = versions[0]['data_hash']
+
+    key = (name, data_hash)
+    if key not in _LOADED:
+        entry = _entry_dir(name, data_hash)
+        meta_path = os.path.join(entry, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        detectors = {sede: joblib.load(os.path.join(entry, file))
+                     for sede, file in meta['detectors'].items()}
+        _LOADED[key] = (detectors, meta)
+
+    detectors, meta = _LOADED[key]
+    if features is not None and list(features) != meta['features']:
+        return None
+    return detectors, meta
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+# Mergeable quantile sketches (t-digest).
+# A digest keeps a few hundred weighted centroids instead of every value:
+# small clusters near the tails (p1, p99 stay accurate), large ones around
+# the median. Digests built on different chunks or in different processes
+# merge into the digest of the union, so thresholds can be kept up to date
+# as readings arrive instead of re-sorting the full history.
+#
+# SketchSet holds one digest per key, e.g. (column, sede) or
+# (column, sede, hour_of_week), and answers per-row threshold lookups.
+
+COMPRESSION = 200
+_BUFFER_FACTOR = 5
+
+
+class QuantileDigest:
+    """Merging t-digest with the arcsine scale function (k1)."""
+
+    def __init__(self, compression=COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._curve = None  # (positions, values) for interpolation, built lazily
+
+    @property
+    def count(self):
+        self._flush()
+        return float(self.weights.sum())
+
+    def update(self, values):
+        """Adds a batch of values (NaN are ignored)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self._buffer.append(values)
+            self._curve = None
+            if sum(len(b) for b in self._buffer) > _BUFFER_FACTOR * self.compression:
+                self._flush()
+        return self
+
+    def merge(self, other):
+        """Folds another digest into this one."""
+        other._flush()
+        if len(other.weights):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._flush()
+            self._compress(np.concatenate([self.means, other.means]),
+                           np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _flush(self):
+        if self._buffer:
+            points = np.concatenate(self._buffer)
+            self._buffer = []
+            self._compress(np.concatenate([self.means, points]),
+                           np.concatenate([self.weights, np.ones(len(points))]))
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # Clusters span at most one unit of k(q) = delta / (2 pi) * asin(2q - 1)
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        group = np.floor(k - k[0]).astype(np.int64)
+        _, group = np.unique(group, return_inverse=True)
+        w = np.bincount(group, weights=weights)
+        self.means = np.bincount(group, weights=means * weights) / w
+        self.weights = w
+        self._curve = None
+
+    def quantile(self, q):
+        """Approximate quantile(s) q in [0, 1]; NaN for an empty digest."""
+        self._flush()
+        q = np.asarray(q, dtype=np.float64)
+        if not len(self.weights):
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        if self._curve is None:
+            # Centroid i sits at the middle of its weight; min/max pin the ends
+            cumulative = np.cumsum(self.weights)
+            self._curve = (np.concatenate([[0.0], cumulative - self.weights / 2, cumulative[-1:]]),
+                           np.concatenate([[self.min], self.means, [self.max]]))
+        position, values = self._curve
+        result = np.interp(q * position[-1], position, values)
+        return result if q.ndim else float(result)
+
+    def to_dict(self):
+        self._flush()
+        return {'compression': self.compression, 'min': self.min, 'max': self.max,
+                'means': self.means.tolist(), 'weights': self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        digest = cls(state['compression'])
+        digest.min, digest.max = state['min'], state['max']
+        digest.means = np.asarray(state['means'], dtype=np.float64)
+        digest.weights = np.asarray(state['weights'], dtype=np.float64)
+        return digest
+
+
+def hour_of_week(timestamps):
+    ts = pd.Series(timestamps)
+    return (ts.dt.dayofweek * 24 + ts.dt.hour).to_numpy()
+
+
+def _plain(key):
+    """Group key tuple with plain Python scalars (JSON round-trips it)."""
+    return tuple(k.item() if isinstance(k, np.generic) else k for k in key)
+
+
+def _key_columns(df, by):
+    """Group key arrays; 'hour_of_week' is derived from the timestamp."""
+    return [hour_of_week(df['timestamp']) if col == 'hour_of_week' else df[col].astype(str).to_numpy()
+            for col in by]
+
+
+class SketchSet:
+    """
+    One digest per (column, *group key). Keys are tuples such as
+    ('energia_total_kwh', 'Tunja') or ('energia_total_kwh', 'Tunja', 37).
+    """
+
+    def __init__(self, compression=COMPRESSION):
+        self.compression = compression
+        self.digests = {}
+
+    def update(self, df, columns, by=('sede',)):
+        """Adds the rows of df, grouped by the `by` columns, for every column."""
+        if df.empty:
+            return self
+        keys = pd.MultiIndex.from_arrays(_key_columns(df, by))
+        codes, uniques = pd.factorize(keys)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        for col in columns:
+            values = df[col].to_numpy(dtype=np.float64)[order]
+            for i, key in enumerate(uniques):
+                key = (col,) + _plain(key)
+                digest = self.digests.get(key)
+                if digest is None:
+                    digest = self.digests[key] = QuantileDigest(self.compression)
+                digest.update(values[bounds[i]:bounds[i + 1]])
+        return self
+
+    def merge(self, other):
+        for key, digest in other.digests.items():
+            if key in self.digests:
+                self.digests[key].merge(digest)
+            else:
+                self.digests[key] = QuantileDigest.from_dict(digest.to_dict())
+        return self
+
+    def quantile(self, key, q):
+        digest = self.digests.get(tuple(key))
+        return np.nan if digest is None else digest.quantile(q)
+
+    def row_quantiles(self, df, column, q, by=('sede',)):
+        """Per-row quantile q of `column` for the group of each row of df."""
+        keys = pd.MultiIndex.from_arrays(_key_columns(df, by))
+        codes, uniques = pd.factorize(keys)
+        table = np.array([self.quantile((column,) + _plain(key), q)
+                          for key in uniques], dtype=np.float64)
+        return table[codes] if len(table) else np.full(len(df), np.nan)
+
+    def to_dict(self):
+        return {'compression': self.compression,
+                'digests': [[list(key), digest.to_dict()] for key, digest in self.digests.items()]}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketches = cls(state['compression'])
+        sketches.digests = {tuple(key): QuantileDigest.from_dict(d) for key, d in state['digests']}
+        return sketches
@@ -0,0 +1,137 @@
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import xgboost as xgb
+
+# Training backend for the XGBoost models of the project.
+# Data reaches XGBoost as a QuantileDMatrix built from batches: only the
+# quantized (histogram bin) representation is kept, the float matrix of a
+# batch is released once it has been sketched and binned. The same matrix is
+# reused for training and as evaluation set (no second copy of the training
+# data), evaluation sets share the training cuts (ref=) and trees are grown
+# with tree_method='hist'. With external_memory=True the bins are paged to a
+# disk cache (ExtMemQuantileDMatrix) that is deleted with the matrix, so the
+# fit itself only keeps one page of the training matrix in RAM
+# (--external-memory in 03_model_training and 01_detect_anomalies).
+#
+# Every fit reports the time per boosting round and the peak RSS.
+
+BATCH_ROWS = 1 << 18
+MAX_BIN = 256
+
+
+def frame_batches(df, features, target, batch_rows=BATCH_ROWS):
+    """Batch source over an in-memory frame: float32 copies of one batch at a time."""
+    def batches():
+        for start in range(0, len(df), batch_rows):
+            part = df.iloc[start:start + batch_rows]
+            yield part[features].to_numpy(dtype=np.float32), part[target].to_numpy(dtype=np.float32)
+    return batches
+
+
+class BatchIterator(xgb.DataIter):
+    """XGBoost data iterator over a restartable batch source (a callable returning (X, y) pairs)."""
+
+    def __init__(self, batches, features, cache_prefix=None):
+        self._batches = batches
+        self._features = list(features)
+        self._it = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._it is None:
+            self._it = iter(self._batches())
+        batch = next(self._it, None)
+        if batch is None:
+            return False
+        X, y = batch
+        input_data(data=X, label=y, feature_names=self._features)
+        return True
+
+    def reset(self):
+        self._it = None
+
+
+def quantile_dmatrix(batches, features, ref=None, external_memory=False, cache_dir=None, max_bin=MAX_BIN):
+    """
+    QuantileDMatrix over a batch source; ref shares the bins of a training
+    matrix. The disk cache of an external-memory matrix goes to cache_dir, or
+    to a temporary directory removed when the matrix is freed.
+    """
+    if external_memory:
+        tmp = None
+        if cache_dir is None:
+            tmp = tempfile.TemporaryDirectory(prefix="xgb_cache_")
+            cache_dir = tmp.name
+        it = BatchIterator(batches, features, cache_prefix=os.path.join(cache_dir, "cache"))
+        matrix = xgb.ExtMemQuantileDMatrix(it, max_bin=max_bin, ref=ref)
+        # The directory lives (and is cleaned up) with the matrix
+        matrix.cache_dir = tmp
+        return matrix
+    return xgb.QuantileDMatrix(BatchIterator(batches, features), max_bin=max_bin, ref=ref)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RoundStats(xgb.callback.TrainingCallback):
+    """Wall time and peak RSS after every boosting round."""
+
+    def __init__(self):
+        self.seconds, self.peak_mb = [], []
+        self._last = None
+        super().__init__()
+
+    def before_training(self, model):
+        self._last = time.perf_counter()
+        return model
+
+    def after_iteration(self, model, epoch, evals_log):
+        now = time.perf_counter()
+        self.seconds.append(now - self._last)
+        self.peak_mb.append(peak_rss_mb())
+        self._last = now
+        return False
+
+    def summary(self):
+        seconds = np.asarray(self.seconds)
+        return {
+            'rounds': len(seconds),
+            'train_seconds': float(seconds.sum()),
+            'ms_per_round': float(seconds.mean() * 1000) if len(seconds) else 0.0,
+            'ms_per_round_max': float(seconds.max() * 1000) if len(seconds) else 0.0,
+            'peak_rss_mb': float(max(self.peak_mb)) if self.peak_mb else peak_rss_mb(),
+        }
+
+
+def train_regressor(params, dtrain, n_estimators, evals=(), early_stopping_rounds=None, verbose=False):
+    """
+    Trains a squared-error booster with tree_method='hist' on prebuilt
+    matrices and returns (XGBRegressor, stats). evals is a list of
+    (DMatrix, name); pass dtrain itself to monitor the training error
+    without a second copy. With early stopping the last eval set decides, as
+    in XGBRegressor.fit.
+    """
+    sk_params = {k: v for k, v in params.items() if k not in ('n_estimators', 'early_stopping_rounds', 'n_jobs')}
+    model = xgb.XGBRegressor(**sk_params, n_estimators=n_estimators, tree_method='hist',
+                             n_jobs=params.get('n_jobs'))
+    booster_params = model.get_xgb_params()
+    booster_params['tree_method'] = 'hist'
+
+    stats = RoundStats()
+    booster = xgb.train(booster_params, dtrain, num_boost_round=n_estimators, evals=list(evals),
+                        early_stopping_rounds=early_stopping_rounds, verbose_eval=verbose,
+                        callbacks=[stats])
+    # Wrap the booster in the sklearn API the registry and the phases use
+    # (predict then honours best_iteration like a fitted XGBRegressor)
+    model.load_model(bytearray(booster.save_raw(raw_format='json')))
+
+    summary = stats.summary()
+    print(f"  {summary['rounds']} rounds in {summary['train_seconds']:.1f}s "
+          f"({summary['ms_per_round']:.1f} ms/round, slowest {summary['ms_per_round_max']:.1f} ms), "
+          f"peak RSS {summary['peak_rss_mb']:,.0f} MB")
+    return model, summary
@@ -0,0 +1,55 @@
+from data_store import CLEAN_CSV, CLEAN_STORE, load_table
+from feature_store import add_features
+from interpolation import interpolate_groups
+from quantile_sketch import SketchSet
+
+# Training set of the global model, shared by 03_model_training and the
+# hyperparameter search so both see exactly the same rows and features.
+
+TARGET = 'energia_total_kwh'
+FEATURES = [
+    'hour_sin', 'hour_cos', 'day_sin', 'day_cos', 'month_sin', 'month_cos',
+    'temperatura_exterior_c', 'ocupacion_pct',
+    'es_festivo', 'es_semana_parciales', 'es_semana_finales', 'es_dia_laboral',
+    'sede_id_encoded', 'periodo_academico_encoded',
+    'lag_1h', 'lag_24h', 'lag_168h', # Lags completos
+    'area_m2', 'num_estudiantes', 'altitud_msnm', 'tiene_laboratorios_pesados'
+]
+SPLIT_DATE = '2025-01-01'
+
+
+def load_training_frame():
+    """Clean readings with every model feature, rows without lag history dropped."""
+    print("Loading clean data...")
+    df = load_table(CLEAN_STORE, CLEAN_CSV)
+
+    # --- 1. MEJORA DE DATOS (Interpolación y Lags) ---
+    print("Generating Advanced Features (Lags & Interpolation)...")
+    df = df.sort_values(['sede', 'timestamp'])
+
+    # Rellenar huecos en temperatura y ocupación
+    df = interpolate_groups(df, ['temperatura_exterior_c', 'ocupacion_pct'], group='sede')
+
+    # Calendario, lags (1h, 24h, 168h) y atributos estáticos de sedes_uptc.csv
+    # vienen del feature store (se calculan una sola vez por versión de los datos)
+    df = add_features(df, FEATURES)
+
+    # Borrar filas sin historia
+    return df.dropna(subset=['lag_1h', 'lag_24h', 'lag_168h']).reset_index(drop=True)
+
+
+def split_train_test(df, split_date=SPLIT_DATE):
+    """Time-based split; the training part loses its 1% top/bottom per sede."""
+    train = df[df['timestamp'] < split_date].copy()
+    test = df[df['timestamp'] >= split_date].copy()
+
+    # --- OUTLIER REMOVAL (Clean Training Data) ---
+    # p1/p99 per sede from t-digest sketches (tails are where they are most
+    # accurate) instead of sorting every sede's history
+    print("Removing Outliers from Training Data (1% top/bottom per Sede)...")
+    sketches = SketchSet().update(train, [TARGET])
+    q_low = sketches.row_quantiles(train, TARGET, 0.01)
+    q_high = sketches.row_quantiles(train, TARGET, 0.99)
+    train = train[(train[TARGET] >= q_low) & (train[TARGET] <= q_high)]
+    print(f"Cleaned Train size: {train.shape}, Test size: {test.shape}")
+    return train, test
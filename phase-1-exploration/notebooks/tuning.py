@@ -0,0 +1,206 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+# Rolling-origin cross-validation and hyperparameter search for the global
+# model. The feature matrix is sorted by time and copied once into shared
+# memory; every worker of the process pool maps it read-only, so a fold is
+# just row ranges: training prefix, early-stopping tail (the last days before
+# the validation block, held out of training) and validation block. The
+# validation block is only scored, never used to pick the round. Each worker
+# runs XGBoost with cpu_count // workers threads so the pool never
+# oversubscribes the cores.
+
+# Values are a list (choice), (low, high) for uniform or (low, high, 'log')
+SEARCH_SPACE = {
+    'max_depth': [4, 6, 8, 10],
+    'learning_rate': (0.01, 0.2, 'log'),
+    'subsample': (0.6, 1.0),
+    'colsample_bytree': (0.6, 1.0),
+    'min_child_weight': [1, 3, 5, 10],
+    'reg_alpha': (0.0, 1.0),
+}
+EARLY_STOPPING_ROUNDS = 50
+EARLY_STOPPING_DAYS = 30
+
+# Worker state: shared memory handles and the arrays mapped on them
+_WORKER = {}
+
+
+def rolling_origin_folds(timestamps, n_folds=3, horizon_days=90, stopping_days=EARLY_STOPPING_DAYS):
+    """
+    Row bounds (train_end, valid_start, valid_end) of rolling-origin folds over
+    time-sorted timestamps: the last n_folds blocks of horizon_days each are
+    validated, each one trained on everything before it except the last
+    stopping_days, rows [train_end, valid_start), used for early stopping.
+    """
+    ts = np.asarray(timestamps, dtype='datetime64[ns]')
+    horizon = np.timedelta64(horizon_days, 'D')
+    last = ts[-1] + np.timedelta64(1, 'ns')
+    folds = []
+    for i in range(n_folds, 0, -1):
+        origin = last - i * horizon
+        train_end = np.searchsorted(ts, origin - np.timedelta64(stopping_days, 'D'), side='left')
+        start = np.searchsorted(ts, origin, side='left')
+        end = np.searchsorted(ts, origin + horizon, side='left')
+        if train_end == 0 or start <= train_end or end <= start:
+            continue
+        folds.append((int(train_end), int(start), int(end)))
+    if not folds:
+        raise ValueError("Not enough history for the requested folds")
+    return folds
+
+
+def sample_params(space, n, seed=0):
+    """n random configurations from the search space."""
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n):
+        config = {}
+        for name, values in space.items():
+            if isinstance(values, list):
+                config[name] = values[rng.integers(len(values))]
+            elif len(values) == 3 and values[2] == 'log':
+                config[name] = float(np.exp(rng.uniform(np.log(values[0]), np.log(values[1]))))
+            else:
+                config[name] = float(rng.uniform(values[0], values[1]))
+        configs.append({k: v.item() if hasattr(v, 'item') else v for k, v in config.items()})
+    return configs
+
+
+def _share(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[:] = array
+    return shm, {'name': shm.name, 'shape': array.shape, 'dtype': array.dtype.str}
+
+
+def _attach(spec):
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    array = np.ndarray(spec['shape'], dtype=np.dtype(spec['dtype']), buffer=shm.buf)
+    array.flags.writeable = False
+    return shm, array
+
+
+def _init_worker(x_spec, y_spec, n_threads):
+    _WORKER['x_shm'], _WORKER['X'] = _attach(x_spec)
+    _WORKER['y_shm'], _WORKER['y'] = _attach(y_spec)
+    _WORKER['n_threads'] = n_threads
+
+
+def _run_fold(trial, params, rounds, fold):
+    """
+    Fits one configuration on one fold, early-stopped on the tail before the
+    validation block; returns the validation RMSE and the best round.
+    """
+    X, y = _WORKER['X'], _WORKER['y']
+    train_end, valid_start, valid_end = fold
+    start = time.perf_counter()
+    model = xgb.XGBRegressor(**params, n_estimators=rounds, tree_method='hist',
+                             early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                             n_jobs=_WORKER['n_threads'])
+    X_stop, y_stop = X[train_end:valid_start], y[train_end:valid_start]
+    X_valid, y_valid = X[valid_start:valid_end], y[valid_start:valid_end]
+    model.fit(X[:train_end], y[:train_end], eval_set=[(X_stop, y_stop)], verbose=False)
+    pred = model.predict(X_valid, iteration_range=(0, model.best_iteration + 1))
+    rmse = float(np.sqrt(np.mean((pred - y_valid) ** 2)))
+    return {'trial': trial, 'fold': fold, 'rounds': rounds, 'rmse': rmse,
+            'best_iteration': int(model.best_iteration), 'seconds': time.perf_counter() - start}
+
+
+class _Pool:
+    """Process pool over one shared, read-only copy of X and y."""
+
+    def __init__(self, X, y, workers):
+        cores = os.cpu_count() or 1
+        self.workers = max(1, min(workers or cores, cores))
+        n_threads = max(1, cores // self.workers)
+        self.x_shm, x_spec = _share(np.ascontiguousarray(X, dtype=np.float32))
+        self.y_shm, y_spec = _share(np.ascontiguousarray(y, dtype=np.float32))
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                            initargs=(x_spec, y_spec, n_threads))
+        print(f"  Pool: {self.workers} workers x {n_threads} XGBoost threads, "
+              f"shared matrix {X.shape[0]:,} x {X.shape[1]} ({self.x_shm.size / 1e6:,.0f} MB)")
+
+    def evaluate(self, configs, rounds, folds):
+        """Mean validation RMSE of every (trial, params) over all folds."""
+        futures = [self.executor.submit(_run_fold, trial, params, rounds, fold)
+                   for trial, params in configs for fold in folds]
+        results = {}
+        for future in as_completed(futures):
+            r = future.result()
+            results.setdefault(r['trial'], []).append(r)
+        rows = []
+        for trial, params in configs:
+            runs = results[trial]
+            rows.append({
+                'trial': trial, 'rounds': rounds,
+                'cv_rmse': float(np.mean([r['rmse'] for r in runs])),
+                'cv_rmse_std': float(np.std([r['rmse'] for r in runs])),
+                'best_iteration': int(np.mean([r['best_iteration'] for r in runs])),
+                'fit_seconds': float(np.sum([r['seconds'] for r in runs])),
+                **params,
+            })
+        return rows
+
+    def close(self):
+        self.executor.shutdown()
+        for shm in (self.x_shm, self.y_shm):
+            shm.close()
+            shm.unlink()
+
+
+def search(X, y, timestamps, method='halving', n_configs=27, max_rounds=1500, min_rounds=100,
+           eta=3, n_folds=3, horizon_days=90, stopping_days=EARLY_STOPPING_DAYS, workers=None,
+           space=None, seed=42):
+    """
+    Hyperparameter search with rolling-origin CV, all fits in a process pool.
+
+    method='random' evaluates n_configs configurations with max_rounds each.
+    method='halving' (successive halving) starts them at min_rounds and keeps
+    the best 1/eta at every rung while multiplying the rounds by eta.
+
+    Rows must be sorted by timestamp. Returns a DataFrame with one row per
+    evaluated (configuration, rung), best first.
+    """
+    folds = rolling_origin_folds(timestamps, n_folds, horizon_days, stopping_days)
+    configs = list(enumerate(sample_params(space or SEARCH_SPACE, n_configs, seed)))
+    print(f"Search: {method}, {len(configs)} configs, {len(folds)} folds")
+
+    pool = _Pool(X, y, workers)
+    history = []
+    try:
+        if method == 'random':
+            rungs = [max_rounds]
+        elif method == 'halving':
+            rungs = []
+            rounds = min_rounds
+            while rounds < max_rounds:
+                rungs.append(rounds)
+                rounds *= eta
+            rungs.append(max_rounds)
+        else:
+            raise ValueError(f"Unknown search method: {method}")
+
+        for level, rounds in enumerate(rungs):
+            start = time.perf_counter()
+            rows = pool.evaluate(configs, rounds, folds)
+            for row in rows:
+                row['rung'] = level
+            history.extend(rows)
+            rows.sort(key=lambda r: r['cv_rmse'])
+            print(f"  Rung {level}: {len(configs)} configs x {rounds} rounds "
+                  f"-> best CV RMSE {rows[0]['cv_rmse']:.3f} ({time.perf_counter() - start:.1f}s)")
+            if method == 'halving' and level < len(rungs) - 1:
+                keep = {r['trial'] for r in rows[:max(1, len(rows) // eta)]}
+                configs = [(trial, params) for trial, params in configs if trial in keep]
+    finally:
+        pool.close()
+
+    results = pd.DataFrame(history)
+    return results.sort_values(['rung', 'cv_rmse'], ascending=[False, True]).reset_index(drop=True)
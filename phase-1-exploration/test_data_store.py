@@ -0,0 +1,66 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+from data_store import iter_sede_chunks, load_table, read_table, widen_float32, write_table
+
+# Energy columns are float32 on disk only: every reader hands them out as
+# float64 holding the written decimals, and the legacy CSV path keeps its
+# values untouched.
+#   python -m pytest phase-1-exploration/test_data_store.py
+
+
+def make_frame(hours=500):
+    rng = np.random.default_rng(0)
+    ts = pd.date_range('2024-12-20', periods=hours, freq='h')
+    return pd.DataFrame({
+        'timestamp': np.tile(ts, 2),
+        'sede': np.repeat(['Tunja', 'Duitama'], hours),
+        'energia_total_kwh': np.round(rng.random(2 * hours) * 300, 1),
+        'ocupacion_pct': rng.random(2 * hours) * 100,
+    })
+
+
+def test_energy_columns_stored_float32_read_float64(tmp_path):
+    df = make_frame()
+    path = str(tmp_path / "table")
+    write_table(df, path)
+
+    files = [os.path.join(root, f) for root, _, names in os.walk(path) for f in names]
+    assert str(pq.read_schema(files[0]).field('energia_total_kwh').type) == 'float'
+
+    stored = read_table(path)
+    assert stored['energia_total_kwh'].dtype == np.float64
+    assert load_table(path)['energia_total_kwh'].dtype == np.float64
+    assert all(chunk['energia_total_kwh'].dtype == np.float64 for _, chunk in iter_sede_chunks(path, 200))
+    # Readings come back as written, so sums match the ones over the CSV
+    values = df.sort_values(['sede', 'timestamp'], kind='stable')['energia_total_kwh'].to_numpy()
+    np.testing.assert_array_equal(stored['energia_total_kwh'].to_numpy(), values)
+    assert stored['energia_total_kwh'].sum() == values.sum()
+
+
+def test_widen_float32_shortest_decimal():
+    rng = np.random.default_rng(1)
+    values = np.concatenate([rng.random(2000) * 300, -rng.random(100) * 1e6,
+                             [0.0, np.nan, np.inf, 1e-8, 123456789.0, 0.1]]).astype(np.float32)
+    widened = widen_float32(values)
+    assert widened.dtype == np.float64
+    np.testing.assert_array_equal(widened.astype(np.float32), values)
+    finite = np.isfinite(values)
+    # Same digits numpy prints for the float32
+    assert all(widened[i] == float(str(values[i])) for i in np.flatnonzero(finite))
+    assert np.isnan(widened[~finite & np.isnan(values)]).all()
+
+
+def test_csv_fallback_keeps_float64_values(tmp_path):
+    df = make_frame()
+    csv = str(tmp_path / "table.csv")
+    df.to_csv(csv, index=False)
+    loaded = load_table(str(tmp_path / "missing"), csv)
+    expected = df.sort_values(['sede', 'timestamp'], kind='stable')['energia_total_kwh'].to_numpy()
+    np.testing.assert_array_equal(loaded['energia_total_kwh'].to_numpy(), expected)
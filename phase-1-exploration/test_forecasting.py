@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+sys.path.append(os.path.join(BASE_DIR, "benchmarks"))
+from bench_forecast import FEATURES, make_history, make_model
+from forecasting import _seed_buffer, recursive_forecast, rollout_origin
+
+# Lag seeding of the recursive forecaster: the buffer must hold the hours
+# right before the rollout, whatever gaps the history has.
+#   python -m pytest phase-1-exploration/test_forecasting.py
+
+WINDOW = 168
+
+
+def ordered(buffer):
+    """Buffer slots in time order (oldest first)."""
+    return buffer[:, np.arange(-WINDOW, 0) % WINDOW]
+
+
+def test_seed_buffer_contiguous_history():
+    df = make_history(2)
+    origin = rollout_origin(df, '2026-01-01')
+    assert origin == pd.Timestamp('2026-01-01')
+    buffer = _seed_buffer(df, ['Sede_00', 'Sede_01'], origin, WINDOW)
+    for i, sede in enumerate(['Sede_00', 'Sede_01']):
+        expected = df.loc[df['sede'] == sede, 'energia_total_kwh'].to_numpy()[-WINDOW:]
+        np.testing.assert_array_equal(ordered(buffer)[i], expected)
+
+
+def test_seed_buffer_fills_missing_hours():
+    df = make_history(1)
+    gap = (df['timestamp'] >= '2025-12-30 10:00') & (df['timestamp'] < '2025-12-30 13:00')
+    with pytest.warns(UserWarning, match="miss readings"):
+        buffer = _seed_buffer(df[~gap], ['Sede_00'], pd.Timestamp('2026-01-01'), WINDOW)
+    series = df.set_index('timestamp')['energia_total_kwh']
+    grid = pd.date_range(end='2025-12-31 23:00', periods=WINDOW, freq='h')
+    expected = series.where(~gap.to_numpy()).reindex(grid).ffill().to_numpy()
+    np.testing.assert_array_equal(ordered(buffer)[0], expected)
+
+
+def test_recursive_forecast_rolls_forward_from_last_reading():
+    df = make_history(2)
+    df = df[df['timestamp'] < '2025-12-20'].reset_index(drop=True)
+    model = make_model()
+    end = '2026-01-03 23:00'
+
+    # Same rollout whether it is asked from the end of the history or later
+    full = recursive_forecast(model, df, FEATURES, '2025-12-20', end, source_year=2025)
+    with pytest.warns(UserWarning, match="rolling forward"):
+        late = recursive_forecast(model, df, FEATURES, '2026-01-01', end, source_year=2025)
+    assert late['timestamp'].min() == pd.Timestamp('2026-01-01')
+    expected = full[full['timestamp'] >= '2026-01-01'].reset_index(drop=True)
+    pd.testing.assert_frame_equal(late.drop(columns='type'), expected.drop(columns='type'))
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+from interpolation import interpolate_groups
+
+# interpolate_groups must fill exactly as the pandas groupby/interpolate it replaced.
+#   python -m pytest phase-1-exploration/test_interpolation.py
+
+
+def pandas_fill(df, columns):
+    out = df.copy()
+    for col in columns:
+        out[col] = out.groupby('sede', observed=True)[col].transform(
+            lambda x: x.interpolate(method='linear', limit_direction='both'))
+    return out
+
+
+def test_interpolate_groups_matches_pandas():
+    rng = np.random.default_rng(0)
+    n = 5000
+    df = pd.DataFrame({
+        'sede': pd.Categorical(np.sort(rng.choice(['Chiquinquira', 'Duitama', 'Sogamoso', 'Tunja'], n))),
+        'energia_total_kwh': rng.random(n) * 100,
+        'ocupacion_pct': (rng.random(n) * 100).astype(np.float32),
+    })
+    for col in ['energia_total_kwh', 'ocupacion_pct']:
+        df.loc[rng.random(n) < 0.2, col] = np.nan
+    # Leading/trailing gaps and a sede without any valid value
+    df.loc[:3, 'energia_total_kwh'] = np.nan
+    df.loc[n - 4:, 'energia_total_kwh'] = np.nan
+    df.loc[df['sede'] == 'Sogamoso', 'ocupacion_pct'] = np.nan
+
+    columns = ['energia_total_kwh', 'ocupacion_pct']
+    expected = pandas_fill(df, columns)
+    out = interpolate_groups(df.copy(), columns)
+    pd.testing.assert_frame_equal(out, expected)
+
+
+def test_interpolate_groups_skips_missing_and_empty():
+    df = pd.DataFrame({'sede': ['Tunja', 'Tunja', 'Tunja'], 'agua_litros': [1.0, np.nan, 3.0]})
+    out = interpolate_groups(df.copy(), ['agua_litros', 'co2_kg'])
+    assert out['agua_litros'].tolist() == [1.0, 2.0, 3.0]
+    assert interpolate_groups(df.iloc[:0], ['agua_litros']).empty
@@ -0,0 +1,121 @@
+import os
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+import llm_cache
+from llm_cache import LLMCache, normalize_question, snapshot_version
+
+# LLM answer cache: TTL expiry, LRU eviction, pruning of entries computed on
+# an older data snapshot, and the hit/miss counters.
+#   python -m pytest phase-1-exploration/test_llm_cache.py
+
+MODEL = 'llama3.2'
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache, 'time', clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    return LLMCache(path=str(tmp_path / "cache" / "llm_cache.sqlite"), **kwargs)
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.put('chat', MODEL, 0, 'prompt', 'answer')
+    clock.now += 60
+    assert cache.get('chat', MODEL, 0, 'prompt') == 'answer'
+    clock.now += 1
+    assert cache.get('chat', MODEL, 0, 'prompt') is None
+    # The expired entry is gone, not only hidden
+    assert cache.stats()['chat']['entries'] == 0
+
+    cache.put('chat', MODEL, 0, 'old', 'answer')
+    clock.now += 30
+    cache.put('chat', MODEL, 0, 'new', 'answer')
+    clock.now += 31
+    assert cache.prune() == 1
+    assert cache.get('chat', MODEL, 0, 'new') == 'answer'
+
+
+def test_lru_eviction_keeps_recently_read(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=3)
+    for prompt in ['a', 'b', 'c']:
+        cache.put('advisor', MODEL, 0.2, prompt, prompt.upper())
+        clock.now += 1
+    # Reading 'a' makes 'b' the least recently used
+    assert cache.get('advisor', MODEL, 0.2, 'a') == 'A'
+    clock.now += 1
+    cache.put('advisor', MODEL, 0.2, 'd', 'D')
+    assert cache.get('advisor', MODEL, 0.2, 'b') is None
+    assert [cache.get('advisor', MODEL, 0.2, p) for p in 'acd'] == ['A', 'C', 'D']
+
+    cache.max_entries = 1
+    clock.now += 1
+    assert cache.get('advisor', MODEL, 0.2, 'c') == 'C'
+    assert cache.prune() == 2
+    assert cache.get('advisor', MODEL, 0.2, 'c') == 'C'
+
+
+def test_prune_by_snapshot(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.put('chat', MODEL, 0, 'q1', 'old', snapshot='v1')
+    cache.put('chat', MODEL, 0, 'q2', 'no snapshot')
+    cache.put('chat', MODEL, 0, 'q1', 'new', snapshot='v2')
+    cache.put('advisor', MODEL, 0.2, 'p', 'other namespace', snapshot='v1')
+
+    # A new snapshot never matches keys of the old one
+    assert cache.get('chat', MODEL, 0, 'q1', snapshot='v2') == 'new'
+    assert cache.get('chat', MODEL, 0, 'q1', snapshot='v3') is None
+
+    assert cache.prune('chat', 'v2') == 2
+    assert cache.get('chat', MODEL, 0, 'q1', snapshot='v1') is None
+    assert cache.get('chat', MODEL, 0, 'q1', snapshot='v2') == 'new'
+    assert cache.get('advisor', MODEL, 0.2, 'p', snapshot='v1') == 'other namespace'
+
+
+def test_hit_miss_metrics(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 'computed'
+
+    assert cache.get_or_compute('chat', MODEL, 0, 'q', compute) == ('computed', False)
+    assert cache.get_or_compute('chat', MODEL, 0, 'q', compute) == ('computed', True)
+    assert cache.get_or_compute('chat', MODEL, 0, 'q', compute) == ('computed', True)
+    assert cache.get('advisor', MODEL, 0.2, 'p') is None
+    assert len(calls) == 1
+
+    stats = cache.stats()
+    assert stats['chat'] == {'entries': 1, 'hits': 2, 'misses': 1, 'hit_rate': 2 / 3}
+    assert stats['advisor'] == {'entries': 0, 'hits': 0, 'misses': 1, 'hit_rate': 0.0}
+    # Counters live in the database, shared by every process using it
+    assert make_cache(tmp_path).stats() == stats
+
+
+def test_question_and_snapshot_keys(tmp_path):
+    assert normalize_question("  ¿Cuánto   CONSUMIÓ la sede?  ") == normalize_question("cuanto consumio la sede")
+
+    data = tmp_path / "store"
+    data.mkdir()
+    (data / "part.parquet").write_bytes(b"1234")
+    version = snapshot_version(str(data))
+    assert snapshot_version(str(data)) == version
+    (data / "part.parquet").write_bytes(b"123456")
+    assert snapshot_version(str(data)) != version
@@ -0,0 +1,42 @@
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+from training_data import FEATURES, TARGET
+
+# Untuned training: early stopping is decided on a tail of the training
+# period, never on the test set.
+#   python -m pytest phase-1-exploration/test_model_training.py
+
+spec = importlib.util.spec_from_file_location("model_training",
+                                              os.path.join(BASE_DIR, "notebooks/03_model_training.py"))
+model_training = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(model_training)
+
+
+def make_frame(start, days, seed):
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(start, periods=days * 24, freq='h')
+    df = pd.DataFrame(rng.random((len(ts), len(FEATURES))), columns=FEATURES)
+    df['timestamp'] = ts
+    df[TARGET] = df[FEATURES[:4]].to_numpy() @ np.array([30, -20, 10, 5]) + rng.normal(0, 1, len(ts))
+    return df
+
+
+def test_early_stopping_ignores_test_targets():
+    train = make_frame('2024-01-01', 200, seed=0)
+    test = make_frame('2025-01-01', 30, seed=1)
+    params = {'max_depth': 4, 'learning_rate': 0.1}
+
+    rounds = []
+    for scale in (1.0, 100.0):
+        test_scaled = test.assign(**{TARGET: test[TARGET] * scale})
+        model, _ = model_training.fit_global(train, test_scaled, params, 300, early_stopping=10)
+        rounds.append(model.best_iteration)
+    # Same stopping round whatever the test targets are
+    assert rounds[0] == rounds[1] < 299
@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+from quantile_sketch import QuantileDigest, SketchSet
+
+# t-digest sketches: quantiles close to np.quantile, merges equivalent to one
+# digest over the union, and a lossless JSON round trip.
+#   python -m pytest phase-1-exploration/test_quantile_sketch.py
+
+QS = np.array([0.01, 0.25, 0.5, 0.75, 0.99])
+
+
+def rank_error(values, estimates, qs=QS):
+    """Distance, in quantile rank, between the estimates and the requested quantiles."""
+    return np.abs(np.searchsorted(np.sort(values), estimates) / len(values) - qs)
+
+
+def test_digest_accuracy_against_np_quantile():
+    rng = np.random.default_rng(0)
+    for values in (rng.lognormal(3, 0.5, 200_000), rng.gamma(2, 30, 50_000), rng.normal(0, 1, 5_000)):
+        digest = QuantileDigest()
+        for chunk in np.array_split(values, 20):
+            digest.update(chunk)
+        assert digest.count == len(values)
+        assert rank_error(values, digest.quantile(QS)).max() < 2e-3
+        assert digest.quantile(0.0) == values.min() and digest.quantile(1.0) == values.max()
+    assert np.isnan(QuantileDigest().quantile(0.5))
+
+
+def test_merged_digests_match_single_digest():
+    rng = np.random.default_rng(1)
+    values = rng.gamma(2, 30, 100_000)
+    single = QuantileDigest().update(values)
+    merged = QuantileDigest()
+    for chunk in np.array_split(values, 7):
+        merged.merge(QuantileDigest().update(chunk))
+    assert merged.count == single.count
+    assert (merged.min, merged.max) == (single.min, single.max)
+    np.testing.assert_allclose(merged.quantile(QS), single.quantile(QS), rtol=5e-3)
+    assert rank_error(values, merged.quantile(QS)).max() < 2e-3
+
+
+def test_sketch_set_round_trip_and_merge():
+    rng = np.random.default_rng(2)
+    ts = pd.date_range('2025-01-01', periods=24 * 7 * 20, freq='h')
+    df = pd.DataFrame({
+        'timestamp': np.tile(ts, 2),
+        'sede': np.repeat(['Tunja', 'Duitama'], len(ts)),
+        'energia_total_kwh': rng.gamma(2, 30, 2 * len(ts)),
+    })
+    by = ('sede', 'hour_of_week')
+    whole = SketchSet().update(df, ['energia_total_kwh'], by=by)
+    halves = SketchSet().update(df.iloc[::2], ['energia_total_kwh'], by=by)
+    halves.merge(SketchSet().update(df.iloc[1::2], ['energia_total_kwh'], by=by))
+    assert set(halves.digests) == set(whole.digests)
+    assert len(whole.digests) == 2 * 168
+
+    restored = SketchSet.from_dict(json.loads(json.dumps(halves.to_dict())))
+    for q in (0.01, 0.75, 0.99):
+        expected = halves.row_quantiles(df, 'energia_total_kwh', q, by=by)
+        np.testing.assert_array_equal(restored.row_quantiles(df, 'energia_total_kwh', q, by=by), expected)
+        np.testing.assert_allclose(expected, whole.row_quantiles(df, 'energia_total_kwh', q, by=by), rtol=0.05)
+    # Unknown groups have no threshold
+    assert np.isnan(restored.quantile(('energia_total_kwh', 'Sogamoso', 0), 0.5))
@@ -0,0 +1,41 @@
+import gc
+import os
+import sys
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+from training_backend import quantile_dmatrix, train_regressor
+
+# External-memory matrices: same fit as in memory, disk cache removed with the matrix.
+#   python -m pytest phase-1-exploration/test_training_backend.py
+
+FEATURES = ['f0', 'f1', 'f2']
+
+
+def batches():
+    rng = np.random.default_rng(0)
+    for _ in range(4):
+        X = rng.random((2000, len(FEATURES)), dtype=np.float32)
+        yield X, (X @ np.array([3, -2, 1], dtype=np.float32)).astype(np.float32)
+
+
+def test_external_memory_matches_in_memory_fit():
+    X = np.concatenate([x for x, _ in batches()])
+    models = []
+    for external_memory in (False, True):
+        dtrain = quantile_dmatrix(batches, FEATURES, external_memory=external_memory)
+        model, _ = train_regressor({'max_depth': 4, 'n_jobs': 1}, dtrain, n_estimators=20)
+        models.append(model)
+    np.testing.assert_allclose(models[0].predict(X), models[1].predict(X), rtol=1e-4, atol=1e-4)
+
+
+def test_external_memory_cache_removed_with_matrix():
+    dtrain = quantile_dmatrix(batches, FEATURES, external_memory=True)
+    cache_dir = dtrain.cache_dir.name
+    assert os.listdir(cache_dir)
+    train_regressor({'n_jobs': 1}, dtrain, n_estimators=2)
+    del dtrain
+    gc.collect()
+    assert not os.path.exists(cache_dir)
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+import tuning
+from tuning import rolling_origin_folds
+
+# Rolling-origin CV: the validation block must not take part in training or
+# in early stopping.
+#   python -m pytest phase-1-exploration/test_tuning.py
+
+
+def hourly(days):
+    return pd.date_range('2023-01-01', periods=days * 24, freq='h').to_numpy()
+
+
+def test_folds_hold_out_stopping_tail():
+    ts = hourly(400)
+    folds = rolling_origin_folds(ts, n_folds=3, horizon_days=90, stopping_days=30)
+    assert len(folds) == 3
+    for train_end, valid_start, valid_end in folds:
+        assert 0 < train_end < valid_start < valid_end
+        assert ts[valid_start] - ts[train_end] == np.timedelta64(30, 'D')
+        assert valid_end - valid_start == 90 * 24
+
+
+def test_run_fold_ignores_validation_targets():
+    rng = np.random.default_rng(0)
+    ts = hourly(200)
+    X = rng.random((len(ts), 4)).astype(np.float32)
+    y = (X @ np.array([3, -2, 1, 0.5]) + rng.normal(0, 0.1, len(ts))).astype(np.float32)
+    fold = rolling_origin_folds(ts, n_folds=1, horizon_days=30, stopping_days=15)[0]
+    params = {'max_depth': 4, 'learning_rate': 0.1}
+
+    runs = []
+    for scale in (1.0, 100.0):
+        y_fold = y.copy()
+        y_fold[fold[1]:fold[2]] *= scale
+        tuning._WORKER.update({'X': X, 'y': y_fold, 'n_threads': 1})
+        runs.append(tuning._run_fold(0, params, 200, fold))
+    # Same model (same round) whatever the validation targets are; only the score changes
+    assert runs[0]['best_iteration'] == runs[1]['best_iteration']
+    assert runs[0]['rmse'] < runs[1]['rmse']
@@ -1,8 +1,7 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import IsolationForest
-import xgboost as xgb
 import plotly.express as px
+import argparse
 import os
 import sys
 
@@ -13,73 +12,115 @@ PHASE1_NOTEBOOKS = os.path.join(BASE_DIR, "../../phase-1-exploration/notebooks")
 RESULTS_DIR = os.path.join(BASE_DIR, "../results")
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
+sys.path.append(PHASE1_NOTEBOOKS)
+from data_store import ANOMALIES_STORE, CLEAN_CSV, CLEAN_STORE, load_table, write_table
+from feature_store import get_features
+from training_backend import frame_batches, quantile_dmatrix, train_regressor
+from model_registry import data_fingerprint, load_detectors, load_model, save_detectors, save_model
+from iso_detectors import ISO_FEATURES, fit_detectors, score_detectors
+from robust_baseline import candidates as robust_candidates
+
+RESIDUAL_MODEL = 'residual_baseline'
+ISO_MODEL = 'iso_forest'
+
 # Add Phase 1 to path to import training logic if needed, 
 # but for robustnes we'll implement a lightweight predictor here or load the CSV if we saved preds.
 # Phase 1 script didn't save the FULL predictions to CSV, just the metrics and plots for a subset.
 # So we will retrain a quick model here to get residuals for the whole dataset.
 
-def get_residuals(df):
-    print("Training reference model for Residual Analysis...")
+def get_residuals(df, external_memory=False):
     target = 'energia_total_kwh'
     features = ['hour_sin', 'hour_cos', 'day_sin', 'day_cos', 'month_sin', 'month_cos', 
                 'temperatura_exterior_c', 'ocupacion_pct']
     
-    # Simple model to get expected baseline
-    model = xgb.XGBRegressor(n_estimators=100, max_depth=5, n_jobs=-1)
+    X = get_features(df, features)
     
-    # Train on all data (Unsupervised context: we want deviations from the "pattern", even if pattern learns some noise)
-    # Ideally we train on "clean" data, but we use all here to find deviations from the *learned trend*.
-    model.fit(df[features], df[target])
+    # Reuse the registered baseline if it was trained on exactly this data
+    data_hash = data_fingerprint(df, features + [target])
+    entry = load_model(RESIDUAL_MODEL, data_hash=data_hash, features=features)
+    if entry is not None:
+        print(f"Loading reference model for Residual Analysis ({RESIDUAL_MODEL} {data_hash})...")
+        model, meta = entry
+        residual_std = meta.get('metrics', {}).get('residual_std')
+    else:
+        print("Training reference model for Residual Analysis...")
+        # Simple model to get expected baseline
+        # Train on all data (Unsupervised context: we want deviations from the "pattern", even if pattern learns some noise)
+        # Ideally we train on "clean" data, but we use all here to find deviations from the *learned trend*.
+        dtrain = quantile_dmatrix(frame_batches(df, features, target), features, external_memory=external_memory)
+        model, stats = train_regressor({'max_depth': 5, 'n_jobs': -1}, dtrain, n_estimators=100)
+        meta, residual_std = {'metrics': {'training': stats}}, None
     
-    df['predicted_consumption'] = model.predict(df[features])
+    # Every row gets its residual (one batched predict): the stored table and
+    # the streaming scorer seeded from it see the same residual statistics
+    df['predicted_consumption'] = model.predict(X)
     df['residual'] = df[target] - df['predicted_consumption']
     
     # Anomaly: Residual > 2 Std Dev (Unexplained High Consumption)
-    std_resid = df['residual'].std()
+    std_resid = df['residual'].std() if residual_std is None else residual_std
     df['anomaly_residual'] = df['residual'] > (2 * std_resid)
+    if residual_std is None:
+        save_model(RESIDUAL_MODEL, model, features, data_hash,
+                   metrics={**meta.get('metrics', {}), 'residual_std': float(std_resid)},
+                   params=meta.get('params'))
     
     return df
 
-def get_isolation_forest(df):
+def get_isolation_forest(df, candidates=None):
     print("Running Isolation Forest...")
     # Features for anomaly detection
-    features = ['energia_total_kwh', 'ocupacion_pct', 'hour', 'dayofweek']
-    
-    # 2% contamination assumption
-    iso = IsolationForest(contamination=0.02, random_state=42)
+    features = ISO_FEATURES
     
-    # We fit per Sede to handle different scales
-    df['anomaly_iso'] = 0
+    # We fit per Sede to handle different scales: one independent detector per
+    # sede, fitted in parallel and persisted, so unchanged data is only scored
+    data_hash = data_fingerprint(df, ['sede'] + features)
+    entry = load_detectors(ISO_MODEL, data_hash=data_hash, features=features)
+    if entry is not None:
+        print(f"  Scoring with persisted detectors ({ISO_MODEL} {data_hash})")
+        if candidates is None:
+            scores = score_detectors(df, entry[0], features)
+        else:
+            scores = np.full(len(df), np.nan)
+            scores[candidates] = score_detectors(df[candidates], entry[0], features)
+    else:
+        # Detectors are fitted on every row (the same ones a full run
+        # persists); with a prefilter only the candidates keep their score
+        detectors, scores = fit_detectors(df, features)
+        save_detectors(ISO_MODEL, detectors, features, data_hash)
+        if candidates is not None:
+            scores[~np.asarray(candidates)] = np.nan
     
-    for sede in df['sede'].unique():
-        idx = df['sede'] == sede
-        subset = df.loc[idx, features].fillna(0)
-        
-        # -1 is anomaly, 1 is normal. We convert -1 to True (1)
-        preds = iso.fit_predict(subset)
-        df.loc[idx, 'anomaly_iso'] = (preds == -1).astype(int)
+    # decision_function < 0 is what fit_predict reports as -1 (anomaly)
+    df['anomaly_iso'] = (scores < 0).astype(int)
         
     return df
 
-def main():
+def main(prefilter=False, external_memory=False):
     try:
         print("Loading data...")
-        df = pd.read_csv(os.path.join(DATA_DIR, "consumos_uptc_clean.csv"))
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df = load_table(CLEAN_STORE, CLEAN_CSV)
+        
+        # 0. Optional cheap first stage: rolling per-sede, hour-of-week median/MAD.
+        # Only candidates are scored by the Isolation Forests, so rows below
+        # their robust baseline are never anomaly_iso / anomaly_critical
+        # (anomaly_residual and the residuals are the same as a full run).
+        candidates = None
+        if prefilter:
+            candidates = robust_candidates(df)
+            print(f"Robust baseline: {candidates.sum():,} candidates ({candidates.mean():.1%} of rows)")
         
         # 1. Residual Analysis
-        df = get_residuals(df)
+        df = get_residuals(df, external_memory=external_memory)
         
         # 2. Isolation Forest
-        df = get_isolation_forest(df)
+        df = get_isolation_forest(df, candidates)
         
         # 3. Combine: Strong Anomaly if BOTH trigger
         df['anomaly_critical'] = ((df['anomaly_residual'] == True) & (df['anomaly_iso'] == 1)).astype(int)
         
         # Save
-        output_path = os.path.join(RESULTS_DIR, "anomalies_detected.csv")
-        df.to_csv(output_path, index=False)
-        print(f"Anomalies saved to {output_path}")
+        write_table(df, ANOMALIES_STORE)
+        print(f"Anomalies saved to {ANOMALIES_STORE}")
         
         # Summary
         print("\n--- Anomaly Summary ---")
@@ -99,4 +140,10 @@ def main():
         print("Clean data not found. Run Phase 1 preprocessing first.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Residual + Isolation Forest anomaly detection.")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Only send rolling median/MAD candidates to the Isolation Forests")
+    parser.add_argument("--external-memory", action="store_true",
+                        help="Page the quantized training matrix to a disk cache during the fit")
+    args = parser.parse_args()
+    main(prefilter=args.prefilter, external_memory=args.external_memory)
@@ -1,62 +1,47 @@
+import argparse
 import pandas as pd
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 RESULTS_DIR = os.path.join(BASE_DIR, "../results")
-DATA_PATH = os.path.join(RESULTS_DIR, "anomalies_detected.csv")
+PHASE1_NOTEBOOKS = os.path.join(BASE_DIR, "../../phase-1-exploration/notebooks")
 
-def analyze_inefficiencies():
+sys.path.append(PHASE1_NOTEBOOKS)
+from data_store import ANOMALIES_CSV, ANOMALIES_STORE, INEFFICIENCIES_STORE, load_table, write_table
+from waste_rules import WASTE_RULES, build_sketches, evaluate_rules
+
+def analyze_inefficiencies(exact_quantiles=False):
     print("Loading anomaly data...")
     try:
-        df = pd.read_csv(DATA_PATH)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # 1. Phantom Consumption (High Usage vs Low Occupancy)
-        # Definition: Top 25% of consumption while occupancy < 5%
-        print("Detecting Phantom Consumption...")
-        low_occ_threshold = 5 
-        high_energy_threshold = df.groupby('sede')['energia_total_kwh'].transform(lambda x: x.quantile(0.75))
-        
-        df['phantom_waste'] = (df['ocupacion_pct'] < low_occ_threshold) & (df['energia_total_kwh'] > high_energy_threshold)
-        
-        phantom_kwh = df.loc[df['phantom_waste'], 'energia_total_kwh'].sum()
-        print(f"Total Phantom Waste Detected: {phantom_kwh:,.2f} kWh")
-        
-        # 2. Nighttime Inefficiency (Academic areas active at night)
-        # Definition: Salones/Auditorios > 0 kWh between 23:00 and 05:00
-        print("Detecting Nighttime Waste...")
-        night_hours = [23, 0, 1, 2, 3, 4]
-        
-        # We need sector columns. They are in the clean csv.
-        # Check if high consumption in Salones/Auditorios at night
-        # We assume baseline "standby" is low. If it exceeds breakdown, it's waste.
-        # Let's say > 10% of daytime peak.
-        
-        # For simplicity in this hackathon scope: simple threshold > 0 is too strict (always some standby).
-        # Let's use > 50 kWh as a heuristic for "Lights Left On".
-        
-        cols_academic = ['energia_salones_kwh', 'energia_auditorios_kwh']
-        df['night_waste'] = (df['hour'].isin(night_hours)) & (df[cols_academic].sum(axis=1) > 50)
-        
-        night_kwh = df.loc[df['night_waste'], cols_academic].sum(axis=1).sum()
-        print(f"Total Nighttime Waste Detected: {night_kwh:,.2f} kWh")
-        
-        # Save Report
-        waste_summary = pd.DataFrame({
-            'Category': ['Phantom Consumption (Low Occ, High Energy)', 'Nighttime Waste (Academic Areas)'],
-            'Total_kWh_Wasted': [phantom_kwh, night_kwh],
-            'Cost_Est_COP': [phantom_kwh * 800, night_kwh * 800] # Approx 800 COP/kWh
-        })
+        df = load_table(ANOMALIES_STORE, ANOMALIES_CSV)
+        
+        # Waste rules (phantom consumption, nighttime waste, ...) are declared
+        # in waste_rules.WASTE_RULES and evaluated together
+        # Per-sede thresholds (phantom p75) from t-digest sketches built in
+        # parallel chunks, or exact quantiles over the whole table
+        sketches = None if exact_quantiles else build_sketches(df, WASTE_RULES)
+        print(f"Evaluating {len(WASTE_RULES)} waste rules "
+              f"({'exact quantiles' if exact_quantiles else 'sketched quantiles'})...")
+        flags, waste_summary = evaluate_rules(df, WASTE_RULES, sketches=sketches)
+        for name, mask in flags.items():
+            df[name] = mask
+        for _, row in waste_summary.iterrows():
+            print(f"  {row['Category']}: {row['Total_kWh_Wasted']:,.2f} kWh")
         
         print("\n--- Inefficiency Summary ---")
         print(waste_summary)
         waste_summary.to_csv(os.path.join(RESULTS_DIR, "waste_summary.csv"), index=False)
         
         # Save detailed flags
-        df.to_csv(os.path.join(RESULTS_DIR, "detailed_inefficiencies.csv"), index=False)
+        write_table(df, INEFFICIENCIES_STORE)
         
     except FileNotFoundError:
-        print("anomalies_detected.csv not found.")
+        print("Anomaly store not found. Run 01_detect_anomalies.py first.")
 
 if __name__ == "__main__":
-    analyze_inefficiencies()
+    parser = argparse.ArgumentParser(description="Evaluate the waste rules on the anomalies table.")
+    parser.add_argument("--exact-quantiles", action="store_true",
+                        help="Sort every value for the per-sede thresholds instead of using sketches")
+    args = parser.parse_args()
+    analyze_inefficiencies(exact_quantiles=args.exact_quantiles)
@@ -0,0 +1,78 @@
+import pandas as pd
+import argparse
+import os
+import sys
+import time
+
+# Setup Paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PHASE1_NOTEBOOKS = os.path.join(BASE_DIR, "../../phase-1-exploration/notebooks")
+
+sys.path.append(PHASE1_NOTEBOOKS)
+from data_store import ANOMALIES_CSV, ANOMALIES_STORE, STREAM_ANOMALIES_STORE, append_table, load_table
+from model_registry import load_detectors, load_model
+from stream_scorer import FILL_COLS, StreamScorer
+from waste_rules import WASTE_RULES
+
+# Models registered by 01_detect_anomalies.py
+RESIDUAL_MODEL = 'residual_baseline'
+ISO_MODEL = 'iso_forest'
+STATE_PATH = os.path.join(STREAM_ANOMALIES_STORE, "_state.json")
+
+def build_scorer(method, alpha, reset=False):
+    model_entry = load_model(RESIDUAL_MODEL)
+    detector_entry = load_detectors(ISO_MODEL)
+    if model_entry is None or detector_entry is None:
+        raise FileNotFoundError("No persisted detectors found. Run 01_detect_anomalies.py first.")
+    model, detectors = model_entry[0], detector_entry[0]
+
+    if os.path.exists(STATE_PATH) and not reset:
+        return StreamScorer.load(STATE_PATH, model, detectors)
+
+    # First run: residual statistics and quantile sketches seeded from the batch anomalies table
+    print("Seeding residual statistics from the anomalies table...")
+    history = load_table(ANOMALIES_STORE, ANOMALIES_CSV,
+                         columns=['sede', 'timestamp', 'residual', 'energia_total_kwh'] + FILL_COLS)
+    return StreamScorer(model, detectors, method=method, alpha=alpha).init_from_history(history)
+
+def main(readings_path, method='welford', alpha=0.01, reset=False):
+    try:
+        scorer = build_scorer(method, alpha, reset)
+        readings = pd.read_csv(readings_path)
+
+        start = time.perf_counter()
+        scored = scorer.score(readings)
+        elapsed = time.perf_counter() - start
+
+        # Re-seeded statistics restart after the batch table: the stream rows
+        # from there on are rewritten instead of duplicated
+        replace_from = scored.groupby('sede')['timestamp'].min().to_dict() if reset else None
+        append_table(scored, STREAM_ANOMALIES_STORE, replace_from=replace_from)
+        os.makedirs(STREAM_ANOMALIES_STORE, exist_ok=True)
+        scorer.save(STATE_PATH)
+
+        skipped = len(readings) - len(scored)
+        if skipped:
+            print(f"Skipped {skipped} readings already scored")
+        print(f"Scored {len(scored)} readings in {elapsed * 1000:.1f} ms "
+              f"({elapsed / max(len(scored), 1) * 1e6:.0f} us/reading), saved to {STREAM_ANOMALIES_STORE}")
+        print(scored[['anomaly_residual', 'anomaly_iso', 'anomaly_critical']
+                     + [rule['name'] for rule in WASTE_RULES]].sum())
+
+        alerts = scored[scored['anomaly_critical'] == 1]
+        for _, row in alerts.iterrows():
+            print(f"  ALERTA {row['sede']} {row['timestamp']}: {row['energia_total_kwh']:.1f} kWh "
+                  f"(esperado {row['predicted_consumption']:.1f}, umbral {row['residual_threshold']:.1f})")
+
+    except FileNotFoundError as e:
+        print(e)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score newly arrived readings against the persisted detectors.")
+    parser.add_argument("--readings", required=True, help="CSV with the new hourly readings.")
+    parser.add_argument("--method", choices=["welford", "ewma"], default="welford",
+                        help="Running residual statistics (only used when the state is created).")
+    parser.add_argument("--alpha", type=float, default=0.01, help="EWMA weight of the newest reading.")
+    parser.add_argument("--reset", action="store_true", help="Re-seed the statistics from the anomalies table.")
+    args = parser.parse_args()
+    main(args.readings, method=args.method, alpha=args.alpha, reset=args.reset)
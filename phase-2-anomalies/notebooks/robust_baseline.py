@@ -0,0 +1,66 @@
+import warnings
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from iso_detectors import sede_positions
+
+# Rolling robust baseline: cheap first-stage anomaly filter.
+# For every sede and hour-of-week slot (dayofweek * 24 + hour) the baseline is
+# the median of the same slot over the previous WINDOW_WEEKS weeks and the
+# spread is its MAD. Readings of a sede are laid out on a (weeks, 168) grid,
+# so every window is a strided view of that grid and one nanmedian computes
+# all the baselines of the sede. Readings well above their baseline are the
+# candidates sent to the Isolation Forest stage.
+
+WINDOW_WEEKS = 8
+MIN_WEEKS = 3
+Z_THRESHOLD = 2.0
+HOURS_PER_WEEK = 168
+MAD_SCALE = 1.4826      # MAD -> standard deviation for normal data
+MIN_SCALE_FRAC = 0.05   # scale floor (fraction of the baseline) for flat slots
+_EPOCH = np.datetime64('1970-01-05T00', 'h')  # a Monday: slot 0 is Monday 00:00
+
+
+def robust_scores(df, target='energia_total_kwh', window=WINDOW_WEEKS, min_weeks=MIN_WEEKS):
+    """
+    (baseline, scale, z) for every row of df. Only past weeks enter a window;
+    slots with fewer than min_weeks past readings have NaN baseline and z.
+    """
+    values = df[target].to_numpy(dtype=np.float64)
+    hours = (df['timestamp'].to_numpy().astype('datetime64[h]') - _EPOCH).astype(np.int64)
+    baseline = np.full(len(df), np.nan)
+    scale = np.full(len(df), np.nan)
+
+    for rows in sede_positions(df).values():
+        h = hours[rows]
+        week, slot = np.divmod(h - (h.min() - h.min() % HOURS_PER_WEEK), HOURS_PER_WEEK)
+        n_weeks = week.max() + 1
+        # `window` empty weeks on top: windows[w] covers weeks w - window .. w - 1
+        grid = np.full((n_weeks + window, HOURS_PER_WEEK), np.nan)
+        grid[week + window, slot] = values[rows]
+        windows = sliding_window_view(grid, window, axis=0)[:n_weeks]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN windows
+            med = np.nanmedian(windows, axis=-1)
+            mad = np.nanmedian(np.abs(windows - med[..., None]), axis=-1)
+        med[(~np.isnan(windows)).sum(axis=-1) < min_weeks] = np.nan
+
+        baseline[rows] = med[week, slot]
+        scale[rows] = np.maximum(MAD_SCALE * mad, MIN_SCALE_FRAC * np.abs(med))[week, slot]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (values - baseline) / scale
+    return baseline, scale, z
+
+
+def candidates(df, target='energia_total_kwh', z_threshold=Z_THRESHOLD, window=WINDOW_WEEKS,
+               min_weeks=MIN_WEEKS):
+    """
+    Boolean mask of the rows worth the expensive stage: consumption above
+    baseline + z_threshold * scale (one-sided, like the residual flag), plus
+    rows without enough history to have a baseline.
+    """
+    baseline, _, z = robust_scores(df, target, window, min_weeks)
+    return np.isnan(baseline) | (z > z_threshold)
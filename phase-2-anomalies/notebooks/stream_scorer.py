@@ -0,0 +1,185 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_store import cyclic_features, load_sedes
+from iso_detectors import ISO_FEATURES, score_detectors
+from quantile_sketch import SketchSet
+from waste_rules import WASTE_RULES, build_sketches, evaluate_rules, update_sketches
+
+# Online anomaly scorer for readings as they arrive.
+# Readings are scored against the persisted residual baseline and the
+# persisted per-sede Isolation Forests; the residual threshold comes from
+# running per-sede statistics of the residual (Welford mean/variance over all
+# readings, or an exponentially weighted mean/variance that follows drift).
+# Each reading is compared with the statistics *before* it is folded in, so a
+# spike cannot raise its own threshold. State is a handful of numbers per
+# sede: the cost of a reading does not depend on the history length.
+# Readings at or before the last timestamp scored for their sede were
+# already folded in and are skipped, so replaying a file neither counts them
+# twice in the statistics nor duplicates them in the stream table.
+# The waste rules run on the same readings; their per-sede quantile
+# thresholds (phantom consumption p75) come from t-digest sketches that
+# absorb every scored batch.
+
+RESIDUAL_FEATURES = ['hour_sin', 'hour_cos', 'day_sin', 'day_cos', 'month_sin', 'month_cos',
+                     'temperatura_exterior_c', 'ocupacion_pct']
+FILL_COLS = ['temperatura_exterior_c', 'ocupacion_pct']
+TARGET = 'energia_total_kwh'
+OUTPUT_COLS = ['timestamp', 'sede', 'sede_id', TARGET, 'predicted_consumption', 'residual',
+               'residual_threshold', 'iso_score', 'anomaly_residual', 'anomaly_iso', 'anomaly_critical'
+               ] + [rule['name'] for rule in WASTE_RULES]
+
+
+class StreamScorer:
+    """
+    Per-sede running residual statistics plus the scoring of new readings.
+
+    method='welford' keeps the exact mean/variance of every residual seen;
+    method='ewma' weights the last readings with factor alpha. A reading is a
+    residual anomaly when residual > mean + k * std (after min_count readings).
+    """
+
+    def __init__(self, model, detectors, method='welford', alpha=0.01, k=2.0, min_count=24):
+        if method not in ('welford', 'ewma'):
+            raise ValueError(f"Unknown method: {method}")
+        self.model = model
+        self.detectors = detectors
+        self.method = method
+        self.alpha = alpha
+        self.k = k
+        self.min_count = min_count
+        # sede -> {'count', 'mean', 'm2' (welford) or 'var' (ewma), 'last': {col: value},
+        #          'last_timestamp': newest reading folded in}
+        self.stats = {}
+        # (column, sede) -> quantile digest for the waste rule thresholds
+        self.sketches = SketchSet()
+
+    # --- State ---
+    def init_from_history(self, df):
+        """Seeds the statistics and sketches with the batch anomalies table."""
+        grouped = df.groupby('sede', observed=True)['residual']
+        summary = pd.DataFrame({'count': grouped.count(), 'mean': grouped.mean(),
+                                'var': grouped.var(ddof=0)}).fillna(0)
+        last = df.groupby('sede', observed=True)[FILL_COLS].last()
+        newest = df.groupby('sede', observed=True)['timestamp'].max()
+        for sede, row in summary.iterrows():
+            self.stats[str(sede)] = {
+                'count': int(row['count']),
+                'mean': float(row['mean']),
+                'm2': float(row['var'] * row['count']),
+                'var': float(row['var']),
+                'last': {col: float(last.loc[sede, col]) for col in FILL_COLS if pd.notna(last.loc[sede, col])},
+                'last_timestamp': str(newest.loc[sede]),
+            }
+        # History sketched in parallel chunks, merged into the running sketches
+        self.sketches.merge(build_sketches(df, WASTE_RULES))
+        return self
+
+    def state(self):
+        return {'method': self.method, 'alpha': self.alpha, 'k': self.k,
+                'min_count': self.min_count, 'stats': self.stats, 'sketches': self.sketches.to_dict()}
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, model, detectors):
+        with open(path) as f:
+            state = json.load(f)
+        scorer = cls(model, detectors, method=state['method'], alpha=state['alpha'],
+                     k=state['k'], min_count=state['min_count'])
+        scorer.stats = state['stats']
+        if 'sketches' in state:
+            scorer.sketches = SketchSet.from_dict(state['sketches'])
+        return scorer
+
+    # --- Scoring ---
+    def new_readings(self, readings):
+        """Readings newer than the last one scored for their sede (last copy of duplicates)."""
+        df = readings.copy()
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df['sede'] = df['sede'].astype(str)
+        df = df.drop_duplicates(['sede', 'timestamp'], keep='last')
+        seen = df['sede'].map(lambda s: self.stats.get(s, {}).get('last_timestamp'))
+        seen = pd.to_datetime(seen).fillna(pd.Timestamp.min)
+        return df[df['timestamp'] > seen]
+
+    def _prepare(self, readings):
+        df = self.new_readings(readings)
+        df = df.sort_values(['timestamp', 'sede'], kind='stable').reset_index(drop=True)
+        df[TARGET] = df[TARGET].astype(np.float32).clip(lower=0)
+
+        for col, values in cyclic_features(df['timestamp']).items():
+            df[col] = values
+
+        # No future readings to interpolate with: carry the last value of the sede
+        for col in FILL_COLS:
+            if col not in df.columns:
+                df[col] = np.nan
+            seeds = df['sede'].map(lambda s: self.stats.get(s, {}).get('last', {}).get(col, np.nan))
+            df[col] = df.groupby('sede')[col].ffill().fillna(seeds)
+        return df
+
+    def _update(self, sedes, residuals):
+        """Thresholds before, then running statistics after, each reading (in order)."""
+        thresholds = np.full(len(residuals), np.nan)
+        for i, (sede, r) in enumerate(zip(sedes, residuals)):
+            s = self.stats.setdefault(sede, {'count': 0, 'mean': 0.0, 'm2': 0.0, 'var': 0.0, 'last': {}})
+            if s['count'] >= self.min_count:
+                std = np.sqrt(s['m2'] / s['count']) if self.method == 'welford' else np.sqrt(s['var'])
+                thresholds[i] = s['mean'] + self.k * std
+            if np.isnan(r):
+                continue  # missing reading: nothing to learn from
+
+            s['count'] += 1
+            if self.method == 'welford':
+                delta = r - s['mean']
+                s['mean'] += delta / s['count']
+                s['m2'] += delta * (r - s['mean'])
+            else:
+                delta = r - s['mean']
+                s['mean'] += self.alpha * delta
+                s['var'] = (1 - self.alpha) * (s['var'] + self.alpha * delta * delta)
+        return thresholds
+
+    def score(self, readings):
+        """
+        Scores new hourly readings (any columns of the raw table) and updates the
+        per-sede statistics. Returns one row per reading with the flags;
+        readings already scored are left out.
+        """
+        df = self._prepare(readings)
+        if df.empty:
+            return pd.DataFrame(columns=OUTPUT_COLS)
+
+        # One batched inference for the model and per sede for the forests
+        df['predicted_consumption'] = self.model.predict(df[RESIDUAL_FEATURES])
+        df['residual'] = df[TARGET] - df['predicted_consumption']
+        df['iso_score'] = score_detectors(df, self.detectors, ISO_FEATURES)
+
+        thresholds = self._update(df['sede'].tolist(), df['residual'].astype(float).tolist())
+        df['residual_threshold'] = thresholds
+        df['anomaly_residual'] = df['residual'].to_numpy() > np.nan_to_num(thresholds, nan=np.inf)
+        df['anomaly_iso'] = (df['iso_score'] < 0).astype(int)
+        df['anomaly_critical'] = (df['anomaly_residual'] & (df['anomaly_iso'] == 1)).astype(int)
+
+        # Waste rules with the quantiles known before this batch, then the batch joins the sketches
+        flags, _ = evaluate_rules(df, WASTE_RULES, sketches=self.sketches)
+        for name, mask in flags.items():
+            df[name] = mask
+        update_sketches(self.sketches, df, WASTE_RULES)
+
+        for sede, last in df.groupby('sede')[FILL_COLS].last().iterrows():
+            self.stats[sede]['last'].update({col: float(v) for col, v in last.items() if pd.notna(v)})
+        for sede, newest in df.groupby('sede')['timestamp'].max().items():
+            self.stats[sede]['last_timestamp'] = str(newest)
+
+        if 'sede_id' not in df.columns:
+            df['sede_id'] = df['sede'].map(load_sedes().set_index('sede')['sede_id'])
+        return df[OUTPUT_COLS]
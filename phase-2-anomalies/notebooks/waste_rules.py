@@ -0,0 +1,178 @@
+import operator
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import SketchSet
+
+# Declarative waste rules.
+# A rule flags the rows where all its conditions hold (and, optionally, the
+# hour is in its window) and counts the kWh of its `waste` columns on them.
+#   conditions: (columns, op, threshold); columns is one column or a list
+#               that is summed per row; threshold is a number or
+#               {'sede_quantile': q} (quantile of those columns per sede)
+#   hours:      hours of the day the rule applies to
+# Rules are compiled together: every distinct column sum, per-sede quantile,
+# hour window and comparison is computed once and shared, so a new rule over
+# existing columns only adds a few boolean ANDs.
+# Per-sede quantiles are read from quantile sketches (quantile_sketch.SketchSet
+# keyed by (term label, sede)): built over a table in chunks across a process
+# pool and merged, and kept up to date as readings stream in. Without
+# sketches they are exact over df.
+
+COST_COP_KWH = 800  # Approx 800 COP/kWh
+SKETCH_CHUNK_ROWS = 100_000
+NIGHT_HOURS = [23, 0, 1, 2, 3, 4]
+ACADEMIC_COLS = ['energia_salones_kwh', 'energia_auditorios_kwh']
+
+WASTE_RULES = [
+    # Top 25% of consumption (per sede) while occupancy < 5%
+    {
+        'name': 'phantom_waste',
+        'category': 'Phantom Consumption (Low Occ, High Energy)',
+        'conditions': [('ocupacion_pct', '<', 5),
+                       ('energia_total_kwh', '>', {'sede_quantile': 0.75})],
+        'waste': 'energia_total_kwh',
+    },
+    # Salones/Auditorios > 50 kWh between 23:00 and 05:00 ("Lights Left On";
+    # > 0 is too strict, there is always some standby)
+    {
+        'name': 'night_waste',
+        'category': 'Nighttime Waste (Academic Areas)',
+        'hours': NIGHT_HOURS,
+        'conditions': [(ACADEMIC_COLS, '>', 50)],
+        'waste': ACADEMIC_COLS,
+    },
+]
+
+OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+       '==': operator.eq, '!=': operator.ne}
+
+
+def _term(columns):
+    """Hashable key of a column or a per-row sum of columns."""
+    return (columns,) if isinstance(columns, str) else tuple(columns)
+
+
+def term_label(columns):
+    """Sketch column name of a term: the column, or the columns joined by '+'."""
+    return '+'.join(_term(columns))
+
+
+def _threshold(threshold):
+    if isinstance(threshold, dict):
+        return ('sede_quantile', float(threshold['sede_quantile']))
+    return ('value', float(threshold))
+
+
+def compile_rules(rules=WASTE_RULES):
+    """
+    Plan shared by all rules: distinct terms, per-sede quantiles per term,
+    hour windows and predicates. Each rule becomes indices into the plan.
+    """
+    plan = {'terms': [], 'quantiles': {}, 'hours': [], 'predicates': [], 'rules': []}
+
+    def index(items, item):
+        if item not in items:
+            items.append(item)
+        return items.index(item)
+
+    for rule in rules:
+        predicates = []
+        for columns, op, threshold in rule['conditions']:
+            if op not in OPS:
+                raise ValueError(f"Unknown operator {op!r} in rule {rule['name']}")
+            term = index(plan['terms'], _term(columns))
+            kind, value = _threshold(threshold)
+            if kind == 'sede_quantile':
+                index(plan['quantiles'].setdefault(term, []), value)
+            predicates.append(index(plan['predicates'], (term, op, kind, value)))
+        hours = index(plan['hours'], tuple(sorted(rule['hours']))) if rule.get('hours') else None
+        plan['rules'].append({
+            'name': rule['name'],
+            'category': rule['category'],
+            'predicates': predicates,
+            'hours': hours,
+            'waste': index(plan['terms'], _term(rule['waste'])),
+        })
+    return plan
+
+
+def _term_values(df, cols):
+    return df[cols[0]].to_numpy() if len(cols) == 1 else df[list(cols)].sum(axis=1).to_numpy()
+
+
+def update_sketches(sketches, df, rules=WASTE_RULES):
+    """Adds the rows of df to the per-sede sketches the rules' quantiles need."""
+    plan = compile_rules(rules)
+    frame = pd.DataFrame({term_label(plan['terms'][t]): _term_values(df, plan['terms'][t])
+                          for t in plan['quantiles']})
+    frame['sede'] = df['sede'].to_numpy()
+    return sketches.update(frame, [c for c in frame.columns if c != 'sede'])
+
+
+def _sketch_chunk(df, rules):
+    return update_sketches(SketchSet(), df, rules)
+
+
+def build_sketches(df, rules=WASTE_RULES, chunk_rows=SKETCH_CHUNK_ROWS, workers=None):
+    """
+    Sketches the rules' quantiles need over df: every chunk of rows is
+    sketched in a worker process and the chunk sketches are merged.
+    """
+    chunks = [df.iloc[i:i + chunk_rows] for i in range(0, len(df), chunk_rows)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chunks)))
+    if workers == 1:
+        parts = [_sketch_chunk(chunk, rules) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_sketch_chunk, chunks, [rules] * len(chunks)))
+    sketches = SketchSet()
+    for part in parts:
+        sketches.merge(part)
+    return sketches
+
+
+def evaluate_rules(df, rules=WASTE_RULES, sketches=None):
+    """
+    Evaluates every rule on df. Returns ({rule name: bool mask}, summary) with
+    one summary row per rule (Category, Total_kWh_Wasted, Cost_Est_COP).
+    With sketches, per-sede quantiles come from them instead of df.
+    """
+    plan = compile_rules(rules)
+
+    # Shared intermediates, one array each
+    terms = [_term_values(df, cols) for cols in plan['terms']]
+    quantiles = {}
+    if plan['quantiles'] and sketches is not None:
+        for term, qs in plan['quantiles'].items():
+            for q in qs:
+                quantiles[(term, q)] = sketches.row_quantiles(df, term_label(plan['terms'][term]), q)
+    elif plan['quantiles']:
+        sede_codes, _ = pd.factorize(df['sede'], sort=True)
+        for term, qs in plan['quantiles'].items():
+            table = pd.Series(terms[term]).groupby(sede_codes).quantile(qs).unstack()
+            for q in qs:
+                quantiles[(term, q)] = table[q].to_numpy()[sede_codes]
+    hour = df['hour'].to_numpy() if plan['hours'] else None
+    windows = []
+    for hours in plan['hours']:
+        lookup = np.zeros(24, dtype=bool)
+        lookup[list(hours)] = True
+        windows.append(lookup[hour])
+    masks = [OPS[op](terms[term], quantiles[(term, value)] if kind == 'sede_quantile' else value)
+             for term, op, kind, value in plan['predicates']]
+
+    flags, summary = {}, []
+    for rule in plan['rules']:
+        parts = [masks[p] for p in rule['predicates']]
+        if rule['hours'] is not None:
+            parts.append(windows[rule['hours']])
+        mask = np.logical_and.reduce(parts) if parts else np.ones(len(df), dtype=bool)
+        waste_kwh = pd.Series(terms[rule['waste']][mask]).sum()
+        flags[rule['name']] = mask
+        summary.append({'Category': rule['category'], 'Total_kWh_Wasted': waste_kwh,
+                        'Cost_Est_COP': waste_kwh * COST_COP_KWH})
+    return flags, pd.DataFrame(summary)
@@ -0,0 +1,76 @@
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../phase-1-exploration/notebooks"))
+sys.path.append(os.path.join(BASE_DIR, "../phase-1-exploration/benchmarks"))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+import feature_store
+import model_registry
+from bench_prefilter import make_readings
+from data_store import read_table, write_table
+from stream_scorer import StreamScorer
+
+# Batch detection with --prefilter: the stored residuals (and the streaming
+# scorer seeded from them) must match a full run.
+#   python -m pytest phase-2-anomalies/test_detect_anomalies.py
+
+spec = importlib.util.spec_from_file_location("detect_anomalies",
+                                              os.path.join(BASE_DIR, "notebooks/01_detect_anomalies.py"))
+detect = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(detect)
+
+
+def run(tmp_path, monkeypatch, prefilter, name=""):
+    out = tmp_path / f"anomalies_{prefilter}{name}"
+    monkeypatch.setattr(detect, 'ANOMALIES_STORE', str(out))
+    detect.main(prefilter=prefilter)
+    return read_table(str(out))
+
+
+def setup_store(tmp_path, monkeypatch):
+    # Empty registry, on disk and in the in-process cache
+    monkeypatch.setattr(model_registry, 'REGISTRY_DIR', str(tmp_path / "models"))
+    monkeypatch.setattr(model_registry, '_LOADED', {})
+    monkeypatch.setattr(feature_store, 'FEATURE_STORE', str(tmp_path / "features"))
+    monkeypatch.setattr(detect, 'RESULTS_DIR', str(tmp_path))
+    df, _ = make_readings(2, 1)
+    clean = str(tmp_path / "clean")
+    write_table(df, clean)
+    monkeypatch.setattr(detect, 'CLEAN_STORE', clean)
+
+
+def test_prefilter_keeps_full_residuals(tmp_path, monkeypatch):
+    setup_store(tmp_path, monkeypatch)
+    full = run(tmp_path, monkeypatch, prefilter=False)
+    staged = run(tmp_path, monkeypatch, prefilter=True)
+
+    assert not staged['residual'].isna().any()
+    np.testing.assert_array_equal(staged['residual'], full['residual'])
+    np.testing.assert_array_equal(staged['anomaly_residual'], full['anomaly_residual'])
+    # Only the Isolation Forest stage is restricted to candidates
+    assert (staged['anomaly_critical'] <= full['anomaly_critical']).all()
+
+    # Same residual statistics seeded into the streaming scorer
+    seeds = [StreamScorer(None, {}).init_from_history(table).stats for table in (full, staged)]
+    for sede, stats in seeds[0].items():
+        for key in ('count', 'mean', 'var'):
+            assert seeds[1][sede][key] == stats[key]
+
+
+def test_prefilter_same_flags_with_cold_and_warm_registry(tmp_path, monkeypatch):
+    # --prefilter first: the detectors are fitted (registry miss), then reused
+    setup_store(tmp_path, monkeypatch)
+    cold = run(tmp_path, monkeypatch, prefilter=True, name="_cold")
+    warm = run(tmp_path, monkeypatch, prefilter=True, name="_warm")
+    full = run(tmp_path, monkeypatch, prefilter=False)
+
+    for col in ('anomaly_iso', 'anomaly_critical'):
+        np.testing.assert_array_equal(cold[col], warm[col])
+    # Rows outside the candidates are never flagged by the forests
+    assert (cold['anomaly_iso'] <= full['anomaly_iso']).all()
+    assert cold['anomaly_iso'].sum() < full['anomaly_iso'].sum()
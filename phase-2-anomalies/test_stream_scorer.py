@@ -0,0 +1,66 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../phase-1-exploration/notebooks"))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+from feature_store import cyclic_features
+from iso_detectors import ISO_FEATURES, fit_detectors
+from stream_scorer import RESIDUAL_FEATURES, StreamScorer
+
+# Streaming scorer: readings already scored are not scored (nor counted) again.
+#   python -m pytest phase-2-anomalies/test_stream_scorer.py
+
+SEDES = ['Tunja', 'Duitama']
+
+
+def make_readings(start, hours, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(start, periods=hours, freq='h')
+    df = pd.DataFrame({
+        'timestamp': np.tile(ts, len(SEDES)),
+        'sede': np.repeat(SEDES, hours),
+        'energia_total_kwh': rng.gamma(2, 30, hours * len(SEDES)),
+        'energia_salones_kwh': rng.gamma(2, 10, hours * len(SEDES)),
+        'energia_auditorios_kwh': rng.gamma(2, 5, hours * len(SEDES)),
+        'temperatura_exterior_c': rng.normal(14, 3, hours * len(SEDES)),
+        'ocupacion_pct': rng.random(hours * len(SEDES)) * 100,
+    })
+    for col, values in cyclic_features(df['timestamp']).items():
+        df[col] = values
+    return df
+
+
+def make_scorer():
+    history = make_readings('2025-01-01', 24 * 30)
+    model = xgb.XGBRegressor(n_estimators=10, max_depth=3, n_jobs=1)
+    model.fit(history[RESIDUAL_FEATURES], history['energia_total_kwh'])
+    history['residual'] = history['energia_total_kwh'] - model.predict(history[RESIDUAL_FEATURES])
+    detectors, _ = fit_detectors(history, ISO_FEATURES, workers=1)
+    return StreamScorer(model, detectors).init_from_history(history)
+
+
+def test_rescoring_skips_readings_already_scored():
+    scorer = make_scorer()
+    readings = make_readings('2025-01-31', 48, seed=1)
+
+    first = scorer.score(readings.iloc[:60])
+    counts = {sede: scorer.stats[sede]['count'] for sede in SEDES}
+    # The whole file again: only the rows after the first batch are new
+    second = scorer.score(readings)
+    assert len(first) + len(second) == len(readings)
+    assert not set(zip(first['sede'], first['timestamp'])) & set(zip(second['sede'], second['timestamp']))
+    assert sum(scorer.stats[sede]['count'] - counts[sede] for sede in SEDES) == len(second)
+    assert len(scorer.score(readings)) == 0
+
+
+def test_history_readings_are_not_rescored():
+    scorer = make_scorer()
+    overlap = make_readings('2025-01-30', 48, seed=2)
+    scored = scorer.score(overlap)
+    assert scored['timestamp'].min() == pd.Timestamp('2025-01-31')
+    assert len(scored) == 24 * len(SEDES)
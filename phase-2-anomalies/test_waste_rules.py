@@ -0,0 +1,104 @@
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../phase-1-exploration/notebooks"))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+from data_store import write_table
+from quantile_sketch import SketchSet
+from waste_rules import WASTE_RULES, build_sketches, evaluate_rules, update_sketches
+
+# Waste rules: the declarative engine reproduces the hard-coded phantom and
+# night rules (flags and waste_summary.csv totals); sketched per-sede
+# thresholds are built in parallel chunks and stay close to the exact ones.
+#   python -m pytest phase-2-anomalies/test_waste_rules.py
+
+spec = importlib.util.spec_from_file_location("analyze_inefficiencies",
+                                              os.path.join(BASE_DIR, "notebooks/02_analyze_inefficiencies.py"))
+analyze = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(analyze)
+
+SEDES = ['Tunja', 'Duitama', 'Sogamoso']
+
+
+def make_readings(hours=24 * 120, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range('2025-01-01', periods=hours, freq='h')
+    n = hours * len(SEDES)
+    return pd.DataFrame({
+        'timestamp': np.tile(ts, len(SEDES)),
+        'sede': np.repeat(SEDES, hours),
+        'hour': np.tile(ts.hour, len(SEDES)),
+        'energia_total_kwh': rng.gamma(2, 30, n).round(2),
+        'energia_salones_kwh': rng.gamma(2, 15, n).round(2),
+        'energia_auditorios_kwh': rng.gamma(2, 10, n).round(2),
+        'ocupacion_pct': rng.random(n) * 20,
+    })
+
+
+def baseline(df):
+    """The rules as 02_analyze_inefficiencies hard-coded them before the engine."""
+    df = df.copy()
+    high_energy_threshold = df.groupby('sede', observed=True)['energia_total_kwh'].transform(lambda x: x.quantile(0.75))
+    df['phantom_waste'] = (df['ocupacion_pct'] < 5) & (df['energia_total_kwh'] > high_energy_threshold)
+    phantom_kwh = df.loc[df['phantom_waste'], 'energia_total_kwh'].sum()
+    cols_academic = ['energia_salones_kwh', 'energia_auditorios_kwh']
+    df['night_waste'] = (df['hour'].isin([23, 0, 1, 2, 3, 4])) & (df[cols_academic].sum(axis=1) > 50)
+    night_kwh = df.loc[df['night_waste'], cols_academic].sum(axis=1).sum()
+    summary = pd.DataFrame({
+        'Category': ['Phantom Consumption (Low Occ, High Energy)', 'Nighttime Waste (Academic Areas)'],
+        'Total_kWh_Wasted': [phantom_kwh, night_kwh],
+        'Cost_Est_COP': [phantom_kwh * 800, night_kwh * 800]
+    })
+    return df, summary
+
+
+def test_rules_reproduce_baseline_flags():
+    df = make_readings()
+    # Missing sector readings and values tied with the p75
+    df.loc[df.index % 97 == 0, 'energia_auditorios_kwh'] = np.nan
+    df.loc[df.index % 50 == 0, 'energia_total_kwh'] = df.groupby('sede')['energia_total_kwh'].transform(
+        lambda x: x.quantile(0.75))
+    expected, expected_summary = baseline(df)
+    flags, summary = evaluate_rules(df, WASTE_RULES)
+    for name in ('phantom_waste', 'night_waste'):
+        np.testing.assert_array_equal(flags[name], expected[name].to_numpy())
+    pd.testing.assert_frame_equal(summary, expected_summary)
+
+
+def test_exact_run_reproduces_waste_summary(tmp_path, monkeypatch):
+    df = make_readings()
+    store = str(tmp_path / "anomalies")
+    write_table(df, store)
+    monkeypatch.setattr(analyze, 'ANOMALIES_STORE', store)
+    monkeypatch.setattr(analyze, 'INEFFICIENCIES_STORE', str(tmp_path / "inefficiencies"))
+    monkeypatch.setattr(analyze, 'RESULTS_DIR', str(tmp_path))
+    analyze.analyze_inefficiencies(exact_quantiles=True)
+
+    # The baseline read the same table (float32 storage) from its CSV hand-off
+    _, expected = baseline(analyze.load_table(store))
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "waste_summary.csv", float_precision='round_trip'), expected)
+
+
+def test_build_sketches_merges_worker_chunks():
+    df = make_readings()
+    parallel = build_sketches(df, WASTE_RULES, chunk_rows=1000, workers=2)
+    single = update_sketches(SketchSet(), df, WASTE_RULES)
+    assert set(parallel.digests) == {('energia_total_kwh', sede) for sede in SEDES}
+    for key, digest in single.digests.items():
+        assert parallel.digests[key].count == digest.count
+        np.testing.assert_allclose(parallel.quantile(key, 0.75), digest.quantile(0.75), rtol=5e-3)
+
+
+def test_sketched_phantom_threshold_close_to_exact():
+    df = make_readings()
+    exact, exact_summary = evaluate_rules(df, WASTE_RULES)
+    sketched, sketched_summary = evaluate_rules(df, WASTE_RULES, sketches=build_sketches(df, workers=1))
+    # Only readings right at the p75 can flip
+    assert (exact['phantom_waste'] != sketched['phantom_waste']).mean() < 2e-3
+    np.testing.assert_array_equal(exact['night_waste'], sketched['night_waste'])
+    np.testing.assert_allclose(sketched_summary['Total_kWh_Wasted'], exact_summary['Total_kWh_Wasted'], rtol=5e-3)
@@ -1,89 +1,277 @@
 import pandas as pd
 import numpy as np
+import argparse
+import json
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PHASE2_RESULTS = os.path.join(BASE_DIR, "../../phase-2-anomalies/results")
+PHASE1_NOTEBOOKS = os.path.join(BASE_DIR, "../../phase-1-exploration/notebooks")
 OUTPUT_DIR = os.path.join(BASE_DIR, "../results")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def categorize_anomaly(row):
+sys.path.append(PHASE1_NOTEBOOKS)
+from data_store import ANOMALIES_CSV, ANOMALIES_STORE, load_table, read_sedes, table_exists
+
+# Only the columns the event aggregation reads
+EVENT_COLUMNS = ['reading_id', 'timestamp', 'sede', 'hour', 'energia_total_kwh',
+                 'ocupacion_pct', 'anomaly_critical']
+# Columns of the critical rows hashed to detect history rewritten behind the watermarks
+HISTORY_COLUMNS = ['timestamp', 'sede', 'energia_total_kwh', 'ocupacion_pct', 'anomaly_critical']
+
+# Event categories, checked in order (thresholds calibrated from Phase 2 insights)
+CATEGORY_PHANTOM = "Consumo Fantasma"            # 1. Low occupancy
+CATEGORY_NIGHT = "Uso Nocturno Inusual"          # 2. Late hours
+CATEGORY_PEAK = "Pico de Demanda Inesperado"     # 3. Daytime peak but anomalous
+EVENT_GAP_HOURS = 3
+
+OUTPUT_PATH = os.path.join(OUTPUT_DIR, "prioritized_recommendations.csv")
+# Watermarks and open event per sede, for --incremental
+STATE_PATH = os.path.join(OUTPUT_DIR, "events_state.json")
+OUTPUT_COLS = ['event_id', 'sede', 'start_time', 'end_time', 'total_kwh', 'avg_occupancy',
+               'category', 'duration_hours']
+
+def categorize_anomalies(hour, occ):
     """
-    Classifies the anomaly based on data context.
+    Classifies the anomalies based on data context (arrays of hours and
+    occupancies, first matching category wins).
     """
-    hour = row['hour']
-    occ = row['ocupacion_pct']
-    # Thresholds (calibrated from Phase 2 insights)
-    
-    # 1. Phantom (Low Occ, Anomaly)
-    if occ < 5:
-        return "Consumo Fantasma"
-    
-    # 2. Nighttime (Late hours)
-    if hour > 22 or hour < 5:
-        return "Uso Nocturno Inusual"
-    
-    # 3. High Load (Daytime peak but anomalous)
-    return "Pico de Demanda Inesperado"
+    return np.select([occ < 5, (hour > 22) | (hour < 5)],
+                     [CATEGORY_PHANTOM, CATEGORY_NIGHT], default=CATEGORY_PEAK)
 
-def aggregate_events(df):
+def aggregate_events(df, open_events=None):
     """
     Groups consecutive hourly anomalies into single 'Events' to avoid spamming.
+    
+    open_events ({sede: open event state}) continues a previous run: event
+    numbers go on from the last one of each sede, and the first new event of
+    a sede that starts <= 3h after its open event extends it ('continues').
     """
     print("Aggregating anomalies into events...")
     
     # Filter only anomalies
-    anoms = df[df['anomaly_critical'] == 1].copy()
+    anoms = df[df['anomaly_critical'] == 1]
     
-    # Apply category
-    anoms['category'] = anoms.apply(categorize_anomaly, axis=1)
+    # Sort by sede, then time (integer codes / nanoseconds, stable like sort_values)
+    sede = pd.Categorical(anoms['sede'])
+    codes = sede.codes
+    ts = anoms['timestamp'].to_numpy().view(np.int64)
+    order = np.lexsort((ts, codes))
+    anoms = anoms.iloc[order].reset_index(drop=True)
+    codes, ts = codes[order], ts[order]
     
-    # Sort
-    anoms = anoms.sort_values(['sede', 'timestamp'])
+    anoms['category'] = categorize_anomalies(anoms['hour'].to_numpy(), anoms['ocupacion_pct'].to_numpy())
     
-    # Simple grouping: If same Sede, Same Category, and Time diff <= 3 hours, group them.
-    anoms['time_diff'] = anoms.groupby('sede')['timestamp'].diff().dt.total_seconds() / 3600
+    # Simple grouping: If same Sede and Time diff <= 3 hours, group them.
+    # New event on the first row of a sede or after a gap > 3h
+    gap = np.diff(ts, prepend=ts[:1]) > EVENT_GAP_HOURS * 3_600_000_000_000
+    new_event = np.diff(codes, prepend=-1) != 0
+    new_event |= gap
+    event_key = np.cumsum(new_event) - 1  # numeric group key
     
-    # New event if time diff > 3h or NaT (first)
-    anoms['new_event'] = (anoms['time_diff'] > 3) | (anoms['time_diff'].isna())
-    anoms['event_id'] = anoms.groupby('sede')['new_event'].cumsum()
-    anoms['unique_event_id'] = anoms['sede'] + "_" + anoms['event_id'].astype(str)
-    
-    # Aggregate
-    events = anoms.groupby('unique_event_id').agg({
+    # Aggregate (occupancy sum/count let a later run extend the event)
+    events = anoms.groupby(event_key).agg({
         'sede': 'first',
         'timestamp': ['min', 'max'],
         'energia_total_kwh': 'sum',
-        'ocupacion_pct': 'mean',
+        'ocupacion_pct': ['mean', 'sum', 'count'],
         'category': 'first',
         'reading_id': 'count' # Duration in hours
-    }).reset_index()
+    }).reset_index(drop=True)
     
     # Flatten columns
-    events.columns = ['event_id', 'sede', 'start_time', 'end_time', 'total_kwh', 'avg_occupancy', 'category', 'duration_hours']
+    events.columns = ['sede', 'start_time', 'end_time', 'total_kwh', 'avg_occupancy',
+                      'occupancy_sum', 'occupancy_count', 'category', 'duration_hours']
+    
+    # Readable id <sede>_<n-th event of the sede>, only built per event
+    first_rows = np.flatnonzero(new_event)
+    event_codes = codes[first_rows]
+    sede_start = np.searchsorted(event_codes, event_codes)
+    event_number = np.arange(len(first_rows)) - sede_start + 1
+    continues = np.zeros(len(first_rows), dtype=bool)
+    if open_events:
+        # Per sede (category code): last event number and end of the open event
+        last_number = np.array([open_events.get(name, {}).get('number', 0) for name in sede.categories])
+        has_open = np.array([name in open_events for name in sede.categories], dtype=bool)
+        open_end = np.array([pd.Timestamp(open_events[name]['end_time']).value if name in open_events
+                             else 0 for name in sede.categories], dtype=np.int64)
+        # Only the first new event of a sede with an open event can extend it
+        extends = (event_number == 1) & has_open[event_codes]
+        candidates = np.flatnonzero(extends)
+        extends[candidates] = (ts[first_rows[candidates]] - open_end[event_codes[candidates]]
+                               <= EVENT_GAP_HOURS * 3_600_000_000_000)
+        # An extended open event keeps its number; the following ones shift down by one
+        shift = np.zeros(len(sede.categories), dtype=np.int64)
+        shift[event_codes[extends]] = 1
+        event_number = event_number + last_number[event_codes] - shift[event_codes]
+        continues = extends
+    events.insert(0, 'event_id', events['sede'].astype(str) + "_" + pd.Series(event_number).astype(str))
+    events['event_number'] = event_number
+    events['continues'] = continues
     
-    # Rank by Impact (Total kWh)
-    events = events.sort_values('total_kwh', ascending=False)
+    # Rank by Impact (Total kWh); ties keep the order of the event ids
+    events = events.sort_values('event_id').sort_values('total_kwh', ascending=False)
     
     return events
 
-def main():
+def open_event_state(events, previous=None):
+    """Last event of every sede in events (extended events add to their previous state)."""
+    state = dict(previous or {})
+    last = events.sort_values('event_number').groupby('sede', observed=True).tail(1)
+    for _, row in last.iterrows():
+        prev = state.get(str(row['sede'])) if row['continues'] else None
+        state[str(row['sede'])] = {
+            'event_id': row['event_id'],
+            'number': int(row['event_number']),
+            'end_time': str(row['end_time']),
+            'occupancy_sum': float(row['occupancy_sum']) + (prev['occupancy_sum'] if prev else 0.0),
+            'occupancy_count': int(row['occupancy_count']) + (prev['occupancy_count'] if prev else 0),
+        }
+    return state
+
+def merge_events(existing, new, open_events):
+    """
+    Folds the events of an incremental run into the previously saved ones.
+    Extended events keep their row (and ai_recommendation); new events are
+    appended. Returns the merged table ranked by impact.
+    """
+    existing = existing.set_index('event_id')
+    extended = new[new['continues']].set_index('event_id')
+    if len(extended):
+        prev = pd.DataFrame({eid: open_events[sede] for eid, sede in extended['sede'].astype(str).items()}).T
+        rows = extended.index
+        existing.loc[rows, 'end_time'] = extended['end_time'].astype(str)
+        existing.loc[rows, 'total_kwh'] = existing.loc[rows, 'total_kwh'] + extended['total_kwh']
+        existing.loc[rows, 'duration_hours'] = existing.loc[rows, 'duration_hours'] + extended['duration_hours']
+        existing.loc[rows, 'avg_occupancy'] = ((prev['occupancy_sum'].astype(float) + extended['occupancy_sum'])
+                                               / (prev['occupancy_count'].astype(float) + extended['occupancy_count']))
+    
+    added = new.loc[~new['continues'], OUTPUT_COLS].copy()
+    added[['start_time', 'end_time']] = added[['start_time', 'end_time']].astype(str)
+    if 'ai_recommendation' in existing.columns:
+        added['ai_recommendation'] = "Pending..."
+    merged = pd.concat([existing.reset_index(), added], ignore_index=True)
+    return merged.sort_values('total_kwh', ascending=False, kind='stable')
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return None
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+def save_state(state):
+    with open(STATE_PATH, "w") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+
+def read_watermarks(df, previous=None):
+    """Newest anomaly-table timestamp processed per sede."""
+    watermarks = dict(previous or {})
+    for sede, newest in df.groupby('sede', observed=True)['timestamp'].max().items():
+        watermarks[str(sede)] = str(newest)
+    return watermarks
+
+def history_digest(df, previous=None):
+    """
+    Per sede: rows and a hash of the critical rows (timestamp, kWh, occupancy).
+    The hash is a sum of row hashes, so the digest of a run extends the
+    previous one and matches the digest of the whole history.
+    """
+    digest = {sede: dict(d) for sede, d in (previous or {}).items()}
+    critical = df['anomaly_critical'].to_numpy() == 1
+    hashes = pd.util.hash_pandas_object(df.loc[critical, HISTORY_COLUMNS[:3]], index=False).to_numpy()
+    critical_sedes = df.loc[critical, 'sede'].astype(str).to_numpy()
+    for sede, rows in df.groupby('sede', observed=True).size().items():
+        d = digest.setdefault(str(sede), {'rows': 0, 'critical_hash': 0})
+        d['rows'] += int(rows)
+        d['critical_hash'] = (d['critical_hash'] + int(hashes[critical_sedes == str(sede)].sum(dtype=np.uint64))) % 2**64
+    return digest
+
+def changed_history(state):
+    """Sedes whose rows up to their watermark differ from what the last run saw."""
+    watermarks = state['watermarks']
+    df = load_table(ANOMALIES_STORE, ANOMALIES_CSV, columns=HISTORY_COLUMNS, sedes=list(watermarks))
+    marks = pd.to_datetime(df['sede'].astype(str).map(watermarks))
+    current = history_digest(df[df['timestamp'] <= marks.to_numpy()])
+    return [sede for sede in watermarks if current.get(sede) != state['history'].get(sede)]
+
+def full_rebuild():
+    df = load_table(ANOMALIES_STORE, ANOMALIES_CSV, columns=EVENT_COLUMNS)
+    events = aggregate_events(df)
+    state = {'watermarks': read_watermarks(df), 'open_events': open_event_state(events),
+             'history': history_digest(df)}
+    return events[OUTPUT_COLS], state
+
+def stored_sedes():
+    """Sedes of the anomalies table (partition names only when the store exists)."""
+    if table_exists(ANOMALIES_STORE):
+        return read_sedes(ANOMALIES_STORE)
+    return load_table(ANOMALIES_STORE, ANOMALIES_CSV, columns=['sede'])['sede'].astype(str).unique().tolist()
+
+def incremental_update(state):
+    """
+    Only reads anomaly rows newer than each sede's watermark; sedes without
+    a watermark (new in the table) are read from the start. If the rows up
+    to a watermark changed (e.g. 01_detect_anomalies refitted its detectors
+    and rewrote older flags), the events are rebuilt from scratch.
+    """
+    if 'history' not in state:
+        print("Events state without history digest, rebuilding from scratch.")
+        return full_rebuild()
+    changed = changed_history(state)
+    if changed:
+        print(f"WARNING: anomalies changed before the watermark for {', '.join(changed)}, "
+              "rebuilding from scratch.")
+        return full_rebuild()
+    
+    watermarks = state['watermarks']
+    parts = []
+    if watermarks:
+        since = min(pd.Timestamp(w) for w in watermarks.values())
+        parts.append(load_table(ANOMALIES_STORE, ANOMALIES_CSV, columns=EVENT_COLUMNS,
+                                sedes=list(watermarks), start=since))
+    new_sedes = [sede for sede in stored_sedes() if sede not in watermarks]
+    if new_sedes or not parts:
+        parts.append(load_table(ANOMALIES_STORE, ANOMALIES_CSV, columns=EVENT_COLUMNS, sedes=new_sedes))
+    df = pd.concat(parts, ignore_index=True)
+    marks = pd.to_datetime(df['sede'].astype(str).map(watermarks)).fillna(pd.Timestamp.min)
+    df = df[df['timestamp'] > marks.to_numpy()]
+    print(f"  {len(df):,} new anomaly-table rows ({int((df['anomaly_critical'] == 1).sum()):,} critical)")
+    
+    events = aggregate_events(df, open_events=state['open_events'])
+    existing = pd.read_csv(OUTPUT_PATH, float_precision='round_trip')
+    merged = merge_events(existing, events, state['open_events'])
+    print(f"  {int(events['continues'].sum())} open events extended, {int((~events['continues']).sum())} new")
+    state = {'watermarks': read_watermarks(df, watermarks),
+             'open_events': open_event_state(events, state['open_events']),
+             'history': history_digest(df, state['history'])}
+    return merged, state
+
+def main(incremental=False):
     try:
-        input_path = os.path.join(PHASE2_RESULTS, "anomalies_detected.csv")
-        df = pd.read_csv(input_path)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        events = aggregate_events(df)
+        state = load_state() if incremental and os.path.exists(OUTPUT_PATH) else None
+        if state is None:
+            if incremental:
+                print("No previous events state found, rebuilding from scratch.")
+            events, state = full_rebuild()
+        else:
+            print("Incremental update of events...")
+            events, state = incremental_update(state)
         
         print("\n--- Top 5 Critical Events Identified ---")
         print(events.head())
         
-        output_path = os.path.join(OUTPUT_DIR, "prioritized_recommendations.csv")
-        events.to_csv(output_path, index=False)
-        print(f"Events saved to {output_path}")
+        # Temp file + rename: the API and the advisor never read a half-written CSV
+        events.to_csv(OUTPUT_PATH + ".tmp", index=False)
+        os.replace(OUTPUT_PATH + ".tmp", OUTPUT_PATH)
+        save_state(state)
+        print(f"Events saved to {OUTPUT_PATH}")
         
     except FileNotFoundError:
         print("Phase 2 anomalies not found.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Aggregate critical anomalies into prioritized events.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Extend the saved events with the new anomalies only (stable event ids).")
+    args = parser.parse_args()
+    main(incremental=args.incremental)
@@ -1,55 +1,37 @@
 import pandas as pd
+import argparse
+import hashlib
+import json
 import os
-from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
+import sys
 from dotenv import load_dotenv
 
+from llm_batch import PROVIDERS, LLMBatchClient
+
 # Setup
 load_dotenv()
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PHASE1_NOTEBOOKS = os.path.join(BASE_DIR, "../../phase-1-exploration/notebooks")
+sys.path.append(PHASE1_NOTEBOOKS)
+from llm_cache import LLMCache
+
 INPUT_PATH = os.path.join(BASE_DIR, "../results/prioritized_recommendations.csv")
 OUTPUT_MD_PATH = os.path.join(BASE_DIR, "../results/advisor_report.md")
 # We will overwrite the input CSV to include the new AI column, or save to a new one. 
 # Overwriting is easier for the API since it already reads this file.
 OUTPUT_CSV_PATH = INPUT_PATH 
+# Fingerprint of the event data each card was written for (incremental mode)
+STATE_PATH = os.path.join(BASE_DIR, "../results/advisor_state.json")
+PENDING = "Pending..."
 
 # Config
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 COST_PER_KWH = 800  # Pesos Colombianos
+REPORT_HEADER = "# 🛡️ Reporte Estratégico de Eficiencia (Executive Summary)\n\n"
+PROMPT_VARIABLES = ["sede", "category", "duration", "kwh", "cost", "start", "end", "occ"]
 
-def generate_recommendations():
-    print("Initializing Advanced LLM Advisor (Expert Mode)...")
-    try:
-        df = pd.read_csv(INPUT_PATH)
-        
-        # Ensure we have a column for the AI text
-        if 'ai_recommendation' not in df.columns:
-            df['ai_recommendation'] = "Pending..."
-            
-        # We process the top 5 events for the demo
-        top_indices = df.head(5).index
-        
-        # 1. Try OpenAI (Paid & Stable)
-        openai_key = os.getenv("OPENAI_API_KEY")
-        if openai_key:
-            try:
-                from langchain_openai import ChatOpenAI
-                llm = ChatOpenAI(temperature=0.3, model_name="gpt-4o-mini", openai_api_key=openai_key)
-                print("Using OpenAI (gpt-4o-mini)")
-            except:
-                print("OpenAI key found but library missing. Installing fallback...")
-                llm = None
-        else:
-            llm = None
-
-        # 2. Fallback to Groq
-        if not llm:
-            api_key = os.getenv("GROQ_API_KEY")
-            llm = ChatGroq(temperature=0.4, groq_api_key=api_key, model_name="llama-3.3-70b-versatile")
-            print("Using Groq (llama-3.3-70b)")
-        
-        # PROMPT ENGINEERING V2: Role-Playing + Business Impact
-        template = """
+# PROMPT ENGINEERING V2: Role-Playing + Business Impact
+TEMPLATE = """
         ROLE: You are a Senior Energy Strategy Consultant hired by the University Board.
         YOUR GOAL: Explain energy waste to the Board of Directors (who are NOT engineers). They care about Money, Reputation, and Sustainability.
         
@@ -88,15 +70,138 @@ def generate_recommendations():
         LANGUAGE: Spanish (Colombia).
         NO PREAMBLE. JUST THE MARKDOWN CARD.
         """
+
+def prompt_inputs(row):
+    """Template variables of one event row."""
+    cost = row['total_kwh'] * COST_PER_KWH
+    return {
+        "sede": row['sede'],
+        "category": row['category'],
+        "duration": row['duration_hours'],
+        "kwh": f"{row['total_kwh']:.0f}",
+        "cost": f"{cost:,.0f}",
+        "start": row['start_time'],
+        "end": row['end_time'],
+        "occ": f"{row['avg_occupancy']:.1f}"
+    }
+
+def report_section(row, text):
+    return f"## Evento {row['event_id']}\n" + text + "\n\n---\n\n"
+
+def event_fingerprint(row):
+    """Hash of everything the card of an event is generated from."""
+    payload = json.dumps(prompt_inputs(row), sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+def has_card(row):
+    text = row['ai_recommendation']
+    return isinstance(text, str) and text != PENDING
+
+def load_fingerprints():
+    if not os.path.exists(STATE_PATH):
+        return {}
+    with open(STATE_PATH) as f:
+        return json.load(f)['fingerprints']
+
+def save_fingerprints(df, fingerprints):
+    # Only events still in the CSV
+    fingerprints = {eid: fingerprints[eid] for eid in df['event_id'] if eid in fingerprints}
+    with open(STATE_PATH + ".tmp", "w") as f:
+        json.dump({'fingerprints': fingerprints}, f, indent=2)
+    os.replace(STATE_PATH + ".tmp", STATE_PATH)
+
+def pending_events(df, indices, fingerprints):
+    """
+    Indices whose card is missing or was written for other event data (new
+    events, or open events that grew). Cards written before fingerprints
+    were kept are taken as current.
+    """
+    pending = []
+    for idx in indices:
+        row = df.loc[idx]
+        fingerprint = event_fingerprint(row)
+        if has_card(row) and row['event_id'] not in fingerprints:
+            fingerprints[row['event_id']] = fingerprint
+        if not has_card(row) or fingerprints[row['event_id']] != fingerprint:
+            pending.append(idx)
+    return pending
+
+def full_report(df, fingerprints):
+    """Report with the card of every enriched event, in priority order."""
+    report_content = REPORT_HEADER
+    for _, row in df.iterrows():
+        if has_card(row) and row['event_id'] in fingerprints:
+            report_content += report_section(row, row['ai_recommendation'])
+    return report_content
+
+def save_outputs(df, report_content):
+    # Written to a temp file and renamed: the API never reads a half-written file
+    # Save CSV (so API can serve it)
+    df.to_csv(OUTPUT_CSV_PATH + ".tmp", index=False)
+    os.replace(OUTPUT_CSV_PATH + ".tmp", OUTPUT_CSV_PATH)
+    print(f"Updated CSV with AI recommendations at {OUTPUT_CSV_PATH}")
+
+    # Save MD (for documentation)
+    with open(OUTPUT_MD_PATH + ".tmp", "w") as f:
+        f.write(report_content)
+    os.replace(OUTPUT_MD_PATH + ".tmp", OUTPUT_MD_PATH)
+    print(f"Strategic Report saved to {OUTPUT_MD_PATH}")
+
+def read_events():
+    df = pd.read_csv(INPUT_PATH, float_precision='round_trip')
+    # Ensure we have a column for the AI text
+    if 'ai_recommendation' not in df.columns:
+        df['ai_recommendation'] = PENDING
+    return df
+
+def generate_recommendations(use_cache=True, incremental=False):
+    print("Initializing Advanced LLM Advisor (Expert Mode)...")
+    try:
+        df = read_events()
+        fingerprints = load_fingerprints()
+            
+        # We process the top 5 events for the demo
+        top_indices = df.head(5).index
+        if incremental:
+            top_indices = pending_events(df, top_indices, fingerprints)
+            if not top_indices:
+                print("All cards are up to date, nothing to send to the LLM.")
+                return
+        
+        from langchain_groq import ChatGroq
+        from langchain_core.prompts import PromptTemplate
+        
+        # 1. Try OpenAI (Paid & Stable)
+        openai_key = os.getenv("OPENAI_API_KEY")
+        if openai_key:
+            try:
+                from langchain_openai import ChatOpenAI
+                model, temperature = "gpt-4o-mini", 0.3
+                llm = ChatOpenAI(temperature=temperature, model_name=model, openai_api_key=openai_key)
+                print("Using OpenAI (gpt-4o-mini)")
+            except:
+                print("OpenAI key found but library missing. Installing fallback...")
+                llm = None
+        else:
+            llm = None
+
+        # 2. Fallback to Groq
+        if not llm:
+            api_key = os.getenv("GROQ_API_KEY")
+            model, temperature = "llama-3.3-70b-versatile", 0.4
+            llm = ChatGroq(temperature=temperature, groq_api_key=api_key, model_name=model)
+            print("Using Groq (llama-3.3-70b)")
         
         prompt = PromptTemplate(
-            template=template,
-            input_variables=["sede", "category", "duration", "kwh", "cost", "start", "end", "occ"]
+            template=TEMPLATE,
+            input_variables=PROMPT_VARIABLES
         )
         
         chain = prompt | llm
+        # Same prompt, model and temperature -> same card: reuse it
+        cache = LLMCache() if use_cache else None
         
-        report_content = "# 🛡️ Reporte Estratégico de Eficiencia (Executive Summary)\n\n"
+        report_content = REPORT_HEADER
         
         print(f"Generating strategic reports for {len(top_indices)} events...")
         
@@ -104,38 +209,99 @@ def generate_recommendations():
             row = df.loc[idx]
             print(f"  Analysing Event {row['event_id']}...")
             
-            # Calculate cost
-            cost = row['total_kwh'] * COST_PER_KWH
-            
-            response = chain.invoke({
-                "sede": row['sede'],
-                "category": row['category'],
-                "duration": row['duration_hours'],
-                "kwh": f"{row['total_kwh']:.0f}",
-                "cost": f"{cost:,.0f}",
-                "start": row['start_time'],
-                "end": row['end_time'],
-                "occ": f"{row['avg_occupancy']:.1f}"
-            })
+            inputs = prompt_inputs(row)
+            rendered = TEMPLATE.format(**inputs)
+            text = cache.get('advisor', model, temperature, rendered) if cache else None
+            if text is None:
+                text = chain.invoke(inputs).content
+                if cache:
+                    cache.put('advisor', model, temperature, rendered, text)
+            else:
+                print("    (cached)")
             
             # Save to DataFrame column
-            df.at[idx, 'ai_recommendation'] = response.content
+            df.at[idx, 'ai_recommendation'] = text
+            fingerprints[row['event_id']] = event_fingerprint(row)
             
             # Append to MD report
-            report_content += f"## Evento {row['event_id']}\n"
-            report_content += response.content + "\n\n---\n\n"
-            
-        # Save CSV (so API can serve it)
-        df.to_csv(OUTPUT_CSV_PATH, index=False)
-        print(f"Updated CSV with AI recommendations at {OUTPUT_CSV_PATH}")
+            report_content += report_section(row, text)
+        
+        if incremental:
+            report_content = full_report(df, fingerprints)
+        save_outputs(df, report_content)
+        save_fingerprints(df, fingerprints)
+        
+    except Exception as e:
+        print(f"Error: {e}")
 
-        # Save MD (for documentation)
-        with open(OUTPUT_MD_PATH, "w") as f:
-            f.write(report_content)
-        print(f"Strategic Report saved to {OUTPUT_MD_PATH}")
+def generate_recommendations_batch(top=None, concurrency=8, provider=None, base_url=None, rpm=None, tpm=None,
+                                   use_cache=True, incremental=False):
+    """
+    Cards for every event (or the top-N by kWh) sent concurrently, within
+    the provider's request/token budgets and backing off on 429s.
+    Incremental: only events without a card for their current data.
+    """
+    print("Initializing LLM Advisor (batch mode)...")
+    try:
+        df = read_events()
+        fingerprints = load_fingerprints()
+        
+        # Events are already ranked by total kWh
+        selected = df.index if top is None else df.head(top).index
+        if incremental:
+            selected = pending_events(df, selected, fingerprints)
+            print(f"{len(selected)} new or changed events")
+            if not selected:
+                print("All cards are up to date, nothing to send to the LLM.")
+                return
+        prompts = [TEMPLATE.format(**prompt_inputs(df.loc[idx])) for idx in selected]
+        
+        client = LLMBatchClient(provider, base_url=base_url, concurrency=concurrency, rpm=rpm, tpm=tpm,
+                                cache=LLMCache() if use_cache else None)
+        print(f"Using {client.provider} ({client.model}) at {client.base_url}: {len(prompts)} events, "
+              f"up to {concurrency} concurrent requests, {client.rpm} req/min, {client.tpm} tokens/min")
+        results = client.generate(prompts)
+        
+        report_content = REPORT_HEADER
+        for idx, result in zip(selected, results):
+            row = df.loc[idx]
+            if isinstance(result, Exception):
+                print(f"  Event {row['event_id']} failed: {result}")
+                continue
+            df.at[idx, 'ai_recommendation'] = result
+            fingerprints[row['event_id']] = event_fingerprint(row)
+            report_content += report_section(row, result)
+        
+        stats = client.stats
+        print(f"{stats['completed']} cards in {stats['seconds']:.1f}s ({stats['per_minute']:.0f} events/min), "
+              f"{stats['failed']} failed, {stats['cache_hits']} from cache, {stats['rate_limited']} rate-limited responses, "
+              f"{stats['tokens']:,} tokens")
+        if incremental:
+            report_content = full_report(df, fingerprints)
+        save_outputs(df, report_content)
+        save_fingerprints(df, fingerprints)
         
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    generate_recommendations()
+    parser = argparse.ArgumentParser(description="LLM recommendation cards for the prioritized events.")
+    parser.add_argument("--batch", action="store_true",
+                        help="Async mode: every event (or --top N) with bounded concurrency.")
+    parser.add_argument("--top", type=int, default=None, help="Only the N events with the most kWh (batch mode).")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default=None,
+                        help="Default: openai if OPENAI_API_KEY is set, else groq.")
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint (e.g. a local stub server).")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute budget (default per provider).")
+    parser.add_argument("--tpm", type=int, default=None, help="Tokens per minute budget (default per provider).")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the LLM (skip the response cache).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only events that are new or changed since their card was written.")
+    args = parser.parse_args()
+    if args.batch:
+        generate_recommendations_batch(top=args.top, concurrency=args.concurrency, provider=args.provider,
+                                       base_url=args.base_url, rpm=args.rpm, tpm=args.tpm,
+                                       use_cache=not args.no_cache, incremental=args.incremental)
+    else:
+        generate_recommendations(use_cache=not args.no_cache, incremental=args.incremental)
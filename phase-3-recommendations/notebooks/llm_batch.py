@@ -0,0 +1,217 @@
+import asyncio
+import os
+import random
+import time
+
+import httpx
+
+# Concurrent LLM calls with rate-limit handling.
+# OpenAI and Groq both expose the OpenAI chat-completions API, so one async
+# HTTP client serves both (and any local stub speaking the same API).
+# Three limits apply to every request:
+#   - requests per minute and tokens per minute budgets (token buckets),
+#   - an adaptive concurrency limit: halved on every 429, grown back by one
+#     after as many successes as the current limit (AIMD),
+#   - a shared pause honouring Retry-After, so all workers back off together.
+# With an llm_cache.LLMCache, prompts answered before are served from it and
+# never reach the network.
+
+PROVIDERS = {
+    'openai': {'base_url': 'https://api.openai.com/v1', 'model': 'gpt-4o-mini',
+               'temperature': 0.3, 'api_key_env': 'OPENAI_API_KEY', 'rpm': 500, 'tpm': 200_000},
+    'groq': {'base_url': 'https://api.groq.com/openai/v1', 'model': 'llama-3.3-70b-versatile',
+             'temperature': 0.4, 'api_key_env': 'GROQ_API_KEY', 'rpm': 30, 'tpm': 12_000},
+}
+MAX_TOKENS = 700
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+def default_provider():
+    """Same preference as the advisor: OpenAI when its key is set, else Groq."""
+    return 'openai' if os.getenv("OPENAI_API_KEY") else 'groq'
+
+
+def estimate_tokens(prompt, max_tokens=MAX_TOKENS):
+    """Budget reserved before a call (~4 characters per token plus the answer)."""
+    return len(prompt) // 4 + max_tokens
+
+
+class TokenBucket:
+    """Budget of `per_minute` units, refilled continuously."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1.0):
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            self._refill()
+            while self.level < amount:
+                await asyncio.sleep((amount - self.level) / self.rate)
+                self._refill()
+            self.level -= amount
+
+    def refund(self, amount):
+        """Returns (or, if negative, charges) the difference to the estimate."""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit with multiplicative decrease on 429 and additive increase."""
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.paused_until = 0.0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    async def throttled(self, retry_after):
+        async with self.condition:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    async def succeeded(self):
+        async with self.condition:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.max_concurrency:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify_all()
+
+
+def _retry_after(response):
+    value = response.headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _backoff(attempt):
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+class LLMBatchClient:
+    """
+    Sends many chat prompts concurrently within the provider's budgets.
+    base_url/api_key default to the provider's (a local stub can be passed).
+    """
+
+    def __init__(self, provider=None, base_url=None, api_key=None, model=None, temperature=None,
+                 concurrency=8, rpm=None, tpm=None, max_tokens=MAX_TOKENS, max_retries=MAX_RETRIES,
+                 timeout=120.0, cache=None, cache_namespace='advisor'):
+        provider = provider or default_provider()
+        config = PROVIDERS[provider]
+        self.provider = provider
+        self.base_url = (base_url or config['base_url']).rstrip('/')
+        self.api_key = api_key if api_key is not None else os.getenv(config['api_key_env'], "")
+        self.model = model or config['model']
+        self.temperature = config['temperature'] if temperature is None else temperature
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.rpm = rpm or config['rpm']
+        self.tpm = tpm or config['tpm']
+        self.cache = cache
+        self.cache_namespace = cache_namespace
+        self.stats = {}
+
+    async def _complete(self, client, prompt):
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, self.cache_namespace, self.model,
+                                             self.temperature, prompt)
+            if cached is not None:
+                self.stats['cache_hits'] += 1
+                return cached
+        answer = await self._request(client, prompt)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, self.cache_namespace, self.model,
+                                    self.temperature, prompt, answer)
+        return answer
+
+    async def _request(self, client, prompt):
+        estimate = estimate_tokens(prompt, self.max_tokens)
+        payload = {'model': self.model, 'temperature': self.temperature, 'max_tokens': self.max_tokens,
+                   'messages': [{'role': 'user', 'content': prompt}]}
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimate)
+            async with self.limiter:
+                try:
+                    response = await client.post(f"{self.base_url}/chat/completions", json=payload)
+                except httpx.TransportError:
+                    response = None
+            self.stats['requests'] += 1
+
+            if response is None or response.status_code >= 400:
+                # Nothing was generated: the reserved tokens go back to the budget
+                self.tokens.refund(estimate)
+            if response is not None and response.status_code == 429:
+                self.stats['rate_limited'] += 1
+                await self.limiter.throttled(_retry_after(response) or _backoff(attempt))
+                continue
+            if response is None or response.status_code >= 500:
+                self.stats['retries'] += 1
+                await asyncio.sleep(_backoff(attempt))
+                continue
+            response.raise_for_status()
+
+            data = response.json()
+            used = data.get('usage', {}).get('total_tokens')
+            if used is not None:
+                self.tokens.refund(estimate - used)
+                self.stats['tokens'] += used
+            await self.limiter.succeeded()
+            return data['choices'][0]['message']['content']
+        raise RuntimeError(f"LLM call failed after {self.max_retries + 1} attempts")
+
+    async def run(self, prompts):
+        """Answers (or exceptions) in the order of prompts."""
+        self.requests = TokenBucket(self.rpm)
+        self.tokens = TokenBucket(self.tpm)
+        self.limiter = AdaptiveLimiter(self.concurrency)
+        self.stats = {'requests': 0, 'rate_limited': 0, 'retries': 0, 'tokens': 0, 'cache_hits': 0}
+        # No key (local stub): no header, "Bearer " alone is an invalid header value
+        headers = {'Authorization': f"Bearer {self.api_key}"} if self.api_key else {}
+        limits = httpx.Limits(max_connections=self.concurrency)
+        start = time.perf_counter()
+        async with httpx.AsyncClient(headers=headers, timeout=self.timeout, limits=limits) as client:
+            results = await asyncio.gather(*(self._complete(client, p) for p in prompts), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        done = sum(not isinstance(r, Exception) for r in results)
+        self.stats.update({'completed': done, 'failed': len(results) - done, 'seconds': elapsed,
+                           'per_minute': done / elapsed * 60 if elapsed else 0.0})
+        return results
+
+    def generate(self, prompts):
+        return asyncio.run(self.run(list(prompts)))
@@ -0,0 +1,49 @@
+import asyncio
+import os
+import sys
+
+import httpx
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "notebooks"))
+import llm_batch
+from llm_batch import AdaptiveLimiter, LLMBatchClient, TokenBucket, estimate_tokens
+
+# Token budget of the batch client: retried requests must not keep their reservation.
+#   python -m pytest phase-3-recommendations/test_llm_batch.py
+
+USED = 300
+
+
+class FakeClient:
+    """Answers `failures` responses with `status` first, then a completion using USED tokens."""
+
+    def __init__(self, status, failures):
+        self.statuses = [status] * failures + [200]
+
+    async def post(self, url, json):
+        status = self.statuses.pop(0)
+        body = {'choices': [{'message': {'content': "ok"}}], 'usage': {'total_tokens': USED}}
+        return httpx.Response(status, json=body if status == 200 else {}, headers={'retry-after': '0'},
+                              request=httpx.Request('POST', url))
+
+
+async def request(client, llm):
+    llm.requests = TokenBucket(llm.rpm)
+    llm.tokens = TokenBucket(llm.tpm)
+    llm.limiter = AdaptiveLimiter(llm.concurrency)
+    llm.stats = {'requests': 0, 'rate_limited': 0, 'retries': 0, 'tokens': 0, 'cache_hits': 0}
+    answer = await llm._request(client, "prompt " * 100)
+    return answer, llm.tokens.capacity - llm.tokens.level
+
+
+def test_retries_give_reserved_tokens_back(monkeypatch):
+    monkeypatch.setattr(llm_batch, 'BACKOFF_BASE', 0.001)
+    assert estimate_tokens("prompt " * 100) > USED
+    for status in (429, 503):
+        # 1000 tokens/s of refill: a few ms of retries refill only a few tokens
+        llm = LLMBatchClient(provider='groq', api_key="", tpm=60_000, max_retries=3)
+        answer, spent = asyncio.run(request(FakeClient(status, failures=2), llm))
+        assert answer == "ok"
+        # Only the tokens of the completed call stay charged
+        assert USED - 50 < spent <= USED
@@ -0,0 +1,171 @@
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../phase-1-exploration/notebooks"))
+from data_store import write_table
+
+# Incremental event aggregation must give the same events as a full rebuild,
+# also for sedes without an open event or without a previous watermark. A
+# full run over the store writes the same events file as the original
+# per-row groupby over the CSV.
+#   python -m pytest phase-3-recommendations/test_recommendation_logic.py
+
+spec = importlib.util.spec_from_file_location("recommendation_logic",
+                                              os.path.join(BASE_DIR, "notebooks/01_recommendation_logic.py"))
+logic = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(logic)
+
+
+def make_anomalies(sede, start, end, critical_hours):
+    """Hourly rows whose values only depend on the timestamp (same rows when the table grows)."""
+    ts = pd.date_range(start, end, freq='h', inclusive='left')
+    step = (ts - pd.Timestamp('2025-01-01')) // pd.Timedelta(hours=1)
+    return pd.DataFrame({
+        'reading_id': [f"{sede}_{i}" for i in step],
+        'timestamp': ts,
+        'sede': sede,
+        'hour': ts.hour,
+        'energia_total_kwh': 50.0 + (step * 7919 % 101),
+        'ocupacion_pct': (step * 37 % 100).astype(float),
+        'anomaly_critical': ts.isin(pd.DatetimeIndex(critical_hours)).astype(int),
+    })
+
+
+def test_aggregate_events_sede_without_open_event():
+    df = pd.concat([make_anomalies('Tunja', '2025-01-01', '2025-01-02', ['2025-01-01 05:00']),
+                    make_anomalies('Duitama', '2025-01-01', '2025-01-02', ['2025-01-01 03:00'])])
+    open_events = {'Tunja': {'event_id': 'Tunja_4', 'number': 4, 'end_time': '2025-01-01 03:00:00',
+                             'occupancy_sum': 10.0, 'occupancy_count': 1}}
+    events = logic.aggregate_events(df, open_events=open_events).set_index('sede')
+    assert events.loc['Tunja', 'event_id'] == 'Tunja_4' and events.loc['Tunja', 'continues']
+    assert events.loc['Duitama', 'event_id'] == 'Duitama_1' and not events.loc['Duitama', 'continues']
+
+
+def use_tmp_paths(tmp_path, monkeypatch):
+    store = str(tmp_path / "anomalies")
+    monkeypatch.setattr(logic, 'ANOMALIES_STORE', store)
+    monkeypatch.setattr(logic, 'ANOMALIES_CSV', str(tmp_path / "missing.csv"))
+    monkeypatch.setattr(logic, 'OUTPUT_PATH', str(tmp_path / "events.csv"))
+    monkeypatch.setattr(logic, 'STATE_PATH', str(tmp_path / "state.json"))
+    return store
+
+
+def read_events():
+    return pd.read_csv(logic.OUTPUT_PATH).sort_values('event_id').reset_index(drop=True)
+
+
+def test_incremental_matches_full_rebuild(tmp_path, monkeypatch, capsys):
+    store = use_tmp_paths(tmp_path, monkeypatch)
+    tunja = ['2025-01-02 10:00', '2025-01-02 11:00', '2025-01-04 23:00', '2025-01-05 01:00', '2025-01-07 08:00']
+    # First run: Tunja with an event open at the cut, Duitama without critical rows yet
+    write_table(pd.concat([make_anomalies('Tunja', '2025-01-01', '2025-01-05', tunja),
+                           make_anomalies('Duitama', '2025-01-01', '2025-01-05', [])]), store)
+    logic.main()
+    # Second run: more history for both, and Sogamoso arrives with its earlier history
+    write_table(pd.concat([make_anomalies('Tunja', '2025-01-01', '2025-01-10', tunja),
+                           make_anomalies('Duitama', '2025-01-01', '2025-01-10', ['2025-01-06 02:00']),
+                           make_anomalies('Sogamoso', '2025-01-01', '2025-01-10', ['2025-01-01 04:00'])]), store)
+    capsys.readouterr()
+    logic.main(incremental=True)
+    assert "Incremental update" in capsys.readouterr().out
+    incremental = read_events()
+
+    logic.main()
+    full = read_events()
+    assert incremental['event_id'].tolist() == ['Duitama_1', 'Sogamoso_1', 'Tunja_1', 'Tunja_2', 'Tunja_3']
+    pd.testing.assert_frame_equal(incremental, full, check_exact=False)
+
+
+def test_flags_rewritten_behind_watermark_rebuild(tmp_path, monkeypatch, capsys):
+    store = use_tmp_paths(tmp_path, monkeypatch)
+    write_table(make_anomalies('Tunja', '2025-01-01', '2025-01-05', ['2025-01-02 10:00']), store)
+    logic.main()
+    # Detectors refitted: an older hour is now critical, and new rows arrived
+    write_table(make_anomalies('Tunja', '2025-01-01', '2025-01-08', ['2025-01-01 03:00', '2025-01-02 10:00',
+                                                                     '2025-01-07 05:00']), store)
+    capsys.readouterr()
+    logic.main(incremental=True)
+    assert "changed before the watermark for Tunja" in capsys.readouterr().out
+    incremental = read_events()
+
+    logic.main()
+    pd.testing.assert_frame_equal(incremental, read_events(), check_exact=False)
+    assert incremental['event_id'].tolist() == ['Tunja_1', 'Tunja_2', 'Tunja_3']
+
+
+def baseline_events(df):
+    """Original aggregation: per-row categories and a groupby on '<sede>_<n>' ids."""
+    def categorize_anomaly(row):
+        if row['ocupacion_pct'] < 5:
+            return "Consumo Fantasma"
+        if row['hour'] > 22 or row['hour'] < 5:
+            return "Uso Nocturno Inusual"
+        return "Pico de Demanda Inesperado"
+
+    anoms = df[df['anomaly_critical'] == 1].copy()
+    anoms['category'] = anoms.apply(categorize_anomaly, axis=1)
+    anoms = anoms.sort_values(['sede', 'timestamp'])
+    anoms['time_diff'] = anoms.groupby('sede')['timestamp'].diff().dt.total_seconds() / 3600
+    anoms['new_event'] = (anoms['time_diff'] > 3) | (anoms['time_diff'].isna())
+    anoms['event_id'] = anoms.groupby('sede')['new_event'].cumsum()
+    anoms['unique_event_id'] = anoms['sede'] + "_" + anoms['event_id'].astype(str)
+    events = anoms.groupby('unique_event_id').agg({
+        'sede': 'first',
+        'timestamp': ['min', 'max'],
+        'energia_total_kwh': 'sum',
+        'ocupacion_pct': 'mean',
+        'category': 'first',
+        'reading_id': 'count'
+    }).reset_index()
+    events.columns = ['event_id', 'sede', 'start_time', 'end_time', 'total_kwh', 'avg_occupancy', 'category', 'duration_hours']
+    return events.sort_values('total_kwh', ascending=False)
+
+
+def make_readings(days=40, seed=0):
+    """Meter readings with 2 decimals, ~10% critical hours, gaps of exactly 3h and 4h, and tied totals."""
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range('2025-01-01', periods=days * 24, freq='h')
+    parts = []
+    for sede in ['Tunja', 'Duitama', 'Sogamoso', 'Chiquinquira']:
+        part = make_anomalies(sede, ts[0], ts[-1] + pd.Timedelta(hours=1), [])
+        part['energia_total_kwh'] = np.round(rng.random(len(part)) * 300 + 0.01, 2)
+        part['ocupacion_pct'] = np.round(rng.random(len(part)) * 40, 1)
+        part['anomaly_critical'] = (rng.random(len(part)) < 0.1).astype(int)
+        parts.append(part)
+    df = pd.concat(parts, ignore_index=True)
+    hours = (df['timestamp'] - df['timestamp'].min()) // pd.Timedelta(hours=1)
+    # Exactly 3h apart (same event) and 4h apart (two events), isolated from the rest
+    window = hours.between(900, 940)
+    df.loc[window, 'anomaly_critical'] = hours[window].isin([905, 908, 920, 924]).astype(int)
+    # Two isolated single-hour events per sede with the same total
+    df.loc[hours.isin([930, 936]), 'energia_total_kwh'] = 123.45
+    df.loc[hours.isin([930, 936]), 'anomaly_critical'] = 1
+    return df
+
+
+def test_full_run_matches_baseline_groupby(tmp_path, monkeypatch):
+    store = use_tmp_paths(tmp_path, monkeypatch)
+    df = make_readings()
+    # The original pipeline read the CSV hand-off; the store keeps energy in float32
+    csv = str(tmp_path / "anomalies_detected.csv")
+    df.to_csv(csv, index=False)
+    legacy = pd.read_csv(csv)
+    legacy['timestamp'] = pd.to_datetime(legacy['timestamp'])
+    expected = baseline_events(legacy)
+    assert set(expected['category']) == {"Consumo Fantasma", "Uso Nocturno Inusual", "Pico de Demanda Inesperado"}
+    assert expected['total_kwh'].duplicated().any()
+    expected.to_csv(str(tmp_path / "baseline.csv"), index=False)
+
+    write_table(df, store)
+    logic.main()
+    with open(logic.OUTPUT_PATH) as f, open(str(tmp_path / "baseline.csv")) as g:
+        assert f.read() == g.read()
+
+    stored = logic.load_table(store, columns=logic.EVENT_COLUMNS)
+    events = logic.aggregate_events(stored)[logic.OUTPUT_COLS].reset_index(drop=True)
+    pd.testing.assert_frame_equal(events.astype({'sede': str}), expected.reset_index(drop=True), check_exact=True)
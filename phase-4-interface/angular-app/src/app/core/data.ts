@@ -49,14 +49,18 @@ export class DataService {
     return this.http.get<ConsumoSector[]>(`${this.apiUrl}/consumo-sector/${sede}`);
   }
 
-  // Get anomalies for a specific sede
-  getAnomalias(sede: string): Observable<ApiResponse<Anomalia[]>> {
-    return this.http.get<ApiResponse<Anomalia[]>>(`${this.apiUrl}/anomalias/${sede}`);
+  // Get the latest anomalies for a specific sede (one page, newest first)
+  getAnomalias(sede: string, limit = 10, cursor?: string): Observable<ApiResponse<Anomalia[]>> {
+    const params: Record<string, string | number> = { limit };
+    if (cursor) params['cursor'] = cursor;
+    return this.http.get<ApiResponse<Anomalia[]>>(`${this.apiUrl}/anomalias/${sede}`, { params });
   }
 
-  // Get recommendations for a specific sede
-  getRecomendaciones(sede: string): Observable<ApiResponse<Recomendacion[]>> {
-    return this.http.get<ApiResponse<Recomendacion[]>>(`${this.apiUrl}/recomendaciones/${sede}`);
+  // Get the top recommendations for a specific sede (most kWh first)
+  getRecomendaciones(sede: string, limit = 4, cursor?: string): Observable<ApiResponse<Recomendacion[]>> {
+    const params: Record<string, string | number> = { limit };
+    if (cursor) params['cursor'] = cursor;
+    return this.http.get<ApiResponse<Recomendacion[]>>(`${this.apiUrl}/recomendaciones/${sede}`, { params });
   }
 
   // Get forecast from ML model
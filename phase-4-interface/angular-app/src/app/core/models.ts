@@ -36,6 +36,7 @@ export interface Recomendacion {
 export interface ApiResponse<T> {
   message: string;
   data: T;
+  next_cursor?: string | null;
 }
 
 export interface ChatRequest {
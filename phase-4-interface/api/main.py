@@ -1,8 +1,12 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import pandas as pd
+import numpy as np
 import os
+import sys
 import logging
 from dotenv import load_dotenv
 
@@ -20,9 +24,37 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "../../phase-1-exploration/data")
 PHASE2_RES = os.path.join(BASE_DIR, "../../phase-2-anomalies/results")
 PHASE3_RES = os.path.join(BASE_DIR, "../../phase-3-recommendations/results")
+PHASE1_NOTEBOOKS = os.path.join(BASE_DIR, "../../phase-1-exploration/notebooks")
+
+sys.path.append(PHASE1_NOTEBOOKS)
+sys.path.append(BASE_DIR)
+from llm_cache import LLMCache, normalize_question
+from responses import frame_response
+from snapshot import SnapshotManager
+
+# --- Data Loading ---
+# Chat answers are cached per (sede, normalized question) for the loaded
+# anomaly data; answers computed on older data are dropped when it changes
+llm_cache = LLMCache()
+
+def on_swap(snapshot):
+    logger.info(f"Serving snapshot {snapshot.version}")
+    llm_cache.prune('chat', snapshot.anomalies_version)
+
+# Frames, per-sede indexes and materialized aggregates of the current files,
+# reloaded in the background when the pipeline writes new results. Each
+# request reads `snapshots.current` once and finishes on that snapshot.
+snapshots = SnapshotManager(on_swap=on_swap)
+on_swap(snapshots.current)
 
 # --- App Setup ---
-app = FastAPI(title="GhostEnergy AI API")
+@asynccontextmanager
+async def lifespan(app):
+    snapshots.start()
+    yield
+    snapshots.stop()
+
+app = FastAPI(title="GhostEnergy AI API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,31 +64,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- Data Loading ---
-def load_all_data():
-    logger.info("Loading data...")
-    try:
-        df_clean = pd.read_csv(os.path.join(DATA_DIR, "consumos_uptc_clean.csv"))
-        df_clean['timestamp'] = pd.to_datetime(df_clean['timestamp'])
-    except Exception as e:
-        logger.error(f"Error loading clean data: {e}")
-        df_clean = pd.DataFrame(columns=['timestamp', 'sede', 'energia_total_kwh'])
-
-    try:
-        df_anom = pd.read_csv(os.path.join(PHASE2_RES, "anomalies_detected.csv"))
-        df_anom['timestamp'] = pd.to_datetime(df_anom['timestamp'])
-    except:
-        df_anom = df_clean.copy()
-
-    try:
-        df_recs = pd.read_csv(os.path.join(PHASE3_RES, "prioritized_recommendations.csv"))
-    except:
-        df_recs = pd.DataFrame()
-
-    return df_clean, df_anom, df_recs
-
-df_clean, df_anom, df_recs = load_all_data()
-
 # --- Models ---
 class ChatRequest(BaseModel):
     sede: str
@@ -73,7 +80,8 @@ def get_agent_response(sede: str, question: str):
         return f"¡Hola! Soy GhostEnergy AI. Estoy analizando los datos de la sede {sede}. ¿En qué te puedo ayudar hoy?"
 
     # Context Data
-    agent_df = df_anom[df_anom['sede'] == sede].tail(500).reset_index(drop=True)
+    snapshot = snapshots.current
+    agent_df = snapshot.agent_frame(sede)
     
     if agent_df.empty:
         return "No tengo datos cargados para esta sede."
@@ -83,9 +91,10 @@ def get_agent_response(sede: str, question: str):
     if openai_key:
         try:
             from langchain_openai import ChatOpenAI
+            model_name, temperature = "gpt-4o-mini", 0
             llm = ChatOpenAI(
-                temperature=0,
-                model_name="gpt-4o-mini",
+                temperature=temperature,
+                model_name=model_name,
                 openai_api_key=openai_key
             )
             logger.info("Using OpenAI (gpt-4o-mini)")
@@ -99,14 +108,21 @@ def get_agent_response(sede: str, question: str):
             return "⚠️ Error: No se encontraron API Keys (ni OPENAI_API_KEY ni GROQ_API_KEY)."
         
         from langchain_groq import ChatGroq
+        model_name, temperature = "llama-3.3-70b-versatile", 0.1
         llm = ChatGroq(
-            temperature=0.1, 
+            temperature=temperature, 
             groq_api_key=api_key, 
-            model_name="llama-3.3-70b-versatile",
+            model_name=model_name,
             max_retries=2
         )
         logger.info("Using Groq (llama-3.3-70b)")
 
+    cache_prompt = f"{sede}|{normalize_question(question)}"
+    cached = llm_cache.get('chat', model_name, temperature, cache_prompt, snapshot.anomalies_version)
+    if cached is not None:
+        logger.info("Chat answer served from cache")
+        return cached
+
     try:
         from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
         
@@ -154,6 +170,8 @@ def get_agent_response(sede: str, question: str):
         for attempt in range(max_retries):
             try:
                 response = agent.invoke({"input": question})
+                llm_cache.put('chat', model_name, temperature, cache_prompt, response['output'],
+                              snapshot.anomalies_version)
                 return response['output']
             except Exception as e:
                 err_msg = str(e).lower()
@@ -186,78 +204,104 @@ def get_agent_response(sede: str, question: str):
 def root():
     return {"message": "GhostEnergy API Online", "version": "1.0"}
 
+@app.get("/api/llm-cache")
+def get_llm_cache():
+    """Entries, hits, misses and hit rate of the LLM cache per namespace."""
+    return {"snapshot": snapshots.current.anomalies_version, "namespaces": llm_cache.stats()}
+
+@app.get("/api/snapshot")
+def get_snapshot():
+    """Version, load time and size of the data being served."""
+    return snapshots.status()
+
 @app.get("/api/sedes")
 def get_sedes():
-    sedes = df_clean['sede'].unique().tolist() if not df_clean.empty else []
+    sedes = snapshots.current.clean.sedes
     return {"sedes": sedes}
 
+# Precomputed when the snapshot is loaded: a lookup of the serialized response
 @app.get("/api/kpis/{sede}")
 def get_kpis(sede: str):
-    df_view = df_clean[df_clean['sede'] == sede]
-    anom_view = df_anom[df_anom['sede'] == sede]
-    
-    if df_view.empty:
-        return {"total_kwh": 0, "anomalías_criticas": 0, "eficiencia": 0, "meta_eficiencia": 95}
-
-    curr_month = df_view['timestamp'].dt.to_period('M').max()
-    monthly_data = df_view[df_view['timestamp'].dt.to_period('M') == curr_month]
-    
-    total_kwh = monthly_data['energia_total_kwh'].sum()
-    anom_count = anom_view[anom_view['anomaly_critical'] == 1].shape[0] if 'anomaly_critical' in anom_view.columns else 0
-    
-    return {
-        "total_kwh": total_kwh,
-        "anomalías_criticas": anom_count,
-        "eficiencia": 92, # Static for MVP
-        "meta_eficiencia": 95
-    }
+    return snapshots.current.response('kpis', sede)
 
 @app.get("/api/consumo-diario/{sede}")
 def get_daily(sede: str):
-    df_view = df_clean[df_clean['sede'] == sede]
-    if df_view.empty: return []
-    
-    daily = df_view.groupby(pd.Grouper(key='timestamp', freq='D'))['energia_total_kwh'].sum().reset_index()
-    daily['timestamp'] = daily['timestamp'].dt.strftime('%Y-%m-%d')
-    return daily.to_dict(orient="records")
+    return snapshots.current.response('daily', sede)
 
 @app.get("/api/consumo-sector/{sede}")
 def get_sector(sede: str):
-    df_view = df_clean[df_clean['sede'] == sede]
-    if df_view.empty: return []
-    
-    sector_cols = [c for c in df_view.columns if 'energia_' in c and 'total' not in c]
-    melted = df_view.melt(id_vars=['timestamp'], value_vars=sector_cols, var_name='sector', value_name='kWh')
-    melted['sector'] = melted['sector'].str.replace('energia_', '').str.replace('_kwh', '')
-    
-    # Aggregate by sector (Sum)
-    grouped = melted.groupby('sector')['kWh'].sum().reset_index()
-    return grouped.to_dict(orient="records")
+    return snapshots.current.response('sector', sede)
+
+# --- Paging helpers ---
+ANOMALY_FIELDS = ['timestamp', 'energia_total_kwh', 'ocupacion_pct', 'anomaly_critical', 'sede']
+
+def select_fields(fields, default, available):
+    """Columns of a `fields=a,b,c` projection (default when not given)."""
+    if not fields:
+        return [c for c in default if c in available]
+    cols = [c.strip() for c in fields.split(',') if c.strip()]
+    unknown = [c for c in cols if c not in available]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return cols
+
+def parse_time(value, name):
+    try:
+        return pd.Timestamp(value) if value else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value}")
 
 @app.get("/api/anomalias/{sede}")
-def get_anomalias(sede: str):
-    df_view = df_anom[df_anom['sede'] == sede].copy()
-    if df_view.empty: return {"data": []}
-    
-    # Sort & Format
-    df_view['timestamp'] = pd.to_datetime(df_view['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
-    df_view = df_view.sort_values('timestamp', ascending=False)
+def get_anomalias(sede: str, start: Optional[str] = None, end: Optional[str] = None,
+                  only_critical: bool = False, limit: Optional[int] = Query(None, ge=1),
+                  cursor: Optional[str] = None, fields: Optional[str] = None,
+                  format: Literal['records', 'columns', 'ndjson'] = 'records'):
+    """
+    Readings of the sede, newest first. Optional time window, critical rows
+    only, `limit` rows per page (pass back `next_cursor` for the next one)
+    and `fields` projection. Without parameters: every reading.
+    format: records (default), columns ({columns, data} by column) or ndjson.
+    """
+    snapshot = snapshots.current
+    index = snapshot.critical if only_critical else snapshot.anom
+    try:
+        df_view, next_cursor = index.page(sede, parse_time(start, 'start'), parse_time(end, 'end'),
+                                          limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    cols = select_fields(fields, ANOMALY_FIELDS, index.frame.columns)
     
-    # Select cols
-    cols = ['timestamp', 'energia_total_kwh', 'ocupacion_pct', 'anomaly_critical', 'sede']
-    out = df_view[[c for c in cols if c in df_view.columns]].to_dict(orient="records")
-    return {"data": out}
+    # Serialized column by column; only the returned rows are formatted
+    return frame_response(df_view[cols], format, {"next_cursor": next_cursor})
 
 @app.get("/api/recomendaciones/{sede}")
-def get_recs(sede: str):
-    if df_recs.empty: return {"data": []}
+def get_recs(sede: str, start: Optional[str] = None, end: Optional[str] = None,
+             limit: Optional[int] = Query(None, ge=1), cursor: Optional[str] = None,
+             fields: Optional[str] = None, format: Literal['records', 'columns', 'ndjson'] = 'records'):
+    """
+    Prioritized events of the sede (most kWh first). Optional window on the
+    event start time, `limit` events per page and `fields` projection.
+    """
+    df_view = snapshots.current.recs_for(sede)
+    if df_view.empty: return frame_response(df_view, format, {"next_cursor": None})
+    cols = select_fields(fields, df_view.columns, df_view.columns)
     
-    if 'sede' in df_recs.columns:
-        df_view = df_recs[df_recs['sede'] == sede]
-    else:
-        df_view = df_recs
-        
-    return {"data": df_view.to_dict(orient="records")}
+    start, end = parse_time(start, 'start'), parse_time(end, 'end')
+    if start is not None or end is not None:
+        event_start = pd.to_datetime(df_view['start_time'])
+        keep = np.ones(len(df_view), dtype=bool)
+        if start is not None: keep &= (event_start >= start).to_numpy()
+        if end is not None: keep &= (event_start <= end).to_numpy()
+        df_view = df_view[keep]
+    
+    # Events are few and ranked by kWh: the cursor is the rank to continue from
+    try:
+        offset = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    stop = len(df_view) if limit is None else offset + limit
+    next_cursor = str(stop) if stop < len(df_view) else None
+    return frame_response(df_view.iloc[offset:stop][cols], format, {"next_cursor": next_cursor})
 
 # --- Chat Endpoint (The Fix) ---
 @app.post("/api/chat")
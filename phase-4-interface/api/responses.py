@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Response layer for frame-shaped payloads.
+# Values are taken column by column from the NumPy arrays (timestamps
+# formatted in one vectorized call, floats as float64 arrays that orjson
+# writes directly) instead of going through DataFrame.to_dict and FastAPI's
+# encoder, which build and walk one Python dict per row. Records and NDJSON
+# rows are concatenated from per-column arrays of JSON values, so no row is
+# ever a Python dict either. Formats:
+#   records  {"data": [{col: value, ...}, ...], ...}   (default, as before)
+#   columns  {"columns": [...], "data": [[values of col 0], ...], ...}
+#   ndjson   one JSON object per line, streamed in chunks of rows
+# Without orjson the same payloads go through the default encoder.
+
+FORMATS = ('records', 'columns', 'ndjson')
+NDJSON_CHUNK_ROWS = 5000
+
+
+def timestamp_chars(values):
+    """
+    'YYYY-mm-dd HH:MM:SS' of datetime64 values as an (n, 19) uint8 array.
+    Days and times of day are formatted once per distinct value and the
+    characters gathered by row (NaT rows hold filler, callers mask them).
+    """
+    values = np.where(np.isnat(values), np.datetime64(0, 'ns'), values).astype('datetime64[ns]')
+    days = values.astype('datetime64[D]')
+    day_values, day_rows = np.unique(days, return_inverse=True)
+    seconds = (values - days) // np.timedelta64(1, 's')
+    second_values, second_rows = np.unique(seconds, return_inverse=True)
+    day_text = np.datetime_as_string(day_values).astype('S10')
+    time_text = np.array([f" {s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in second_values.tolist()],
+                         dtype='S9')
+    chars = np.empty((len(values), 19), dtype=np.uint8)
+    chars[:, :10] = day_text.view(np.uint8).reshape(-1, 10)[day_rows.ravel()]
+    chars[:, 10:] = time_text.view(np.uint8).reshape(-1, 9)[second_rows.ravel()]
+    return chars
+
+
+def format_timestamps(values):
+    """'YYYY-mm-dd HH:MM:SS' strings of datetime64 values (vectorized); NaT gives None."""
+    text = timestamp_chars(values).view('S19').ravel().astype(str).astype(object)
+    text[np.isnat(values)] = None
+    return text
+
+
+def dumps(payload):
+    """JSON bytes of payload (numpy arrays allowed when orjson is available)."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def json_response(payload):
+    return Response(content=dumps(payload), media_type="application/json")
+
+
+def column_values(series):
+    """JSON-ready values of one column: a numpy array for numbers, else a list."""
+    values = series.to_numpy()
+    if np.issubdtype(values.dtype, np.datetime64):
+        return format_timestamps(values).tolist()
+    if np.issubdtype(values.dtype, np.floating):
+        # float32 storage is served as float64, like to_dict does
+        values = values.astype(np.float64)
+    elif not (np.issubdtype(values.dtype, np.integer) or values.dtype == np.bool_):
+        return series.astype(object).where(series.notna(), None).tolist()
+    return values if orjson is not None else values.tolist()
+
+
+def records(df):
+    """Row dicts of df (path without orjson)."""
+    columns = [column_values(df[col]) for col in df.columns]
+    # Plain Python scalars per column, then rows zipped at C speed
+    columns = [c.tolist() if isinstance(c, np.ndarray) else c for c in columns]
+    return [dict(zip(df.columns, row)) for row in zip(*columns)]
+
+
+def json_values(series):
+    """JSON text of every value of one column, as a bytes array (orjson only)."""
+    values = series.to_numpy()
+    if np.issubdtype(values.dtype, np.datetime64):
+        quoted = np.full((len(values), 21), ord('"'), dtype=np.uint8)
+        quoted[:, 1:-1] = timestamp_chars(values)
+        return np.where(np.isnat(values), b'null', quoted.view('S21').ravel())
+    if np.issubdtype(values.dtype, np.integer) or np.issubdtype(values.dtype, np.floating) \
+            or values.dtype == np.bool_:
+        if not len(values):
+            return np.array([], dtype=bytes)
+        if np.issubdtype(values.dtype, np.floating):
+            values = values.astype(np.float64)
+        # One encode of the whole array; numbers never contain a comma
+        return np.array(orjson.dumps(values, option=orjson.OPT_SERIALIZE_NUMPY)[1:-1].split(b','))
+    # Labels and text: each distinct value is encoded once, missing ones are null
+    codes, uniques = pd.factorize(series)
+    encoded = [orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY) for value in uniques] + [b'null']
+    return np.array(encoded)[codes]
+
+
+def json_rows(df):
+    """JSON object text of every row of df, built column by column (no dict per row)."""
+    rows = np.full(len(df), b'{', dtype='S1')
+    for i, col in enumerate(df.columns):
+        key = (b',' if i else b'') + orjson.dumps(str(col)) + b':'
+        rows = np.char.add(np.char.add(rows, key), json_values(df[col]))
+    return np.char.add(rows, b'}').tolist()
+
+
+def _ndjson_chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        if orjson is not None:
+            yield b"".join(row + b"\n" for row in json_rows(chunk))
+        else:
+            yield b"".join(dumps(row) + b"\n" for row in records(chunk))
+
+
+def frame_response(df, fmt='records', extra=None, chunk_rows=NDJSON_CHUNK_ROWS):
+    """
+    Response with the rows of df in format `fmt`. `extra` keys (e.g.
+    next_cursor) go next to the data, or into X-* headers for NDJSON.
+    """
+    extra = extra or {}
+    if fmt == 'ndjson':
+        headers = {f"X-{key.replace('_', '-').title()}": str(value)
+                   for key, value in extra.items() if value is not None}
+        return StreamingResponse(_ndjson_chunks(df, chunk_rows), media_type="application/x-ndjson",
+                                 headers=headers)
+    if fmt == 'columns':
+        payload = {"columns": list(df.columns), "data": [column_values(df[col]) for col in df.columns]}
+    elif orjson is not None:
+        # Rows joined as bytes; the extra keys follow in the same object
+        body = b'{"data":[' + b','.join(json_rows(df)) + b']'
+        body += b',' + dumps(extra)[1:] if extra else b'}'
+        return Response(content=body, media_type="application/json")
+    else:
+        payload = {"data": records(df)}
+    payload.update(extra)
+    return json_response(payload)
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# Per-sede index over a loaded table.
+# Rows are reordered once into contiguous blocks, one per sede, sorted by
+# timestamp inside each block. A request then costs a dict lookup plus two
+# binary searches and returns a slice of the reordered frame (no copy, no
+# boolean mask over the whole history), so its latency depends on the rows
+# it returns, not on the size of the table.
+# Pages go newest first. A cursor is the timestamp of the last row returned
+# plus how many rows at that timestamp were already returned, so pages stay
+# consistent with ties and with rows appended by a newer snapshot.
+
+
+def _as_time(value):
+    return pd.Timestamp(value).to_datetime64()
+
+
+def encode_cursor(time, skip):
+    return f"{int(time.astype('datetime64[ns]').astype(np.int64))}_{skip}"
+
+
+def decode_cursor(cursor):
+    """(timestamp, skip) of a cursor; ValueError if malformed."""
+    time, skip = cursor.split('_')
+    return np.datetime64(int(time), 'ns'), int(skip)
+
+
+class SedeIndex:
+    """Timestamp-sorted, contiguous per-sede blocks of a frame."""
+
+    def __init__(self, df, time_col='timestamp'):
+        codes, names = pd.factorize(df['sede'], sort=True)
+        times = df[time_col].to_numpy()
+        order = np.lexsort((times, codes))
+        self.frame = df.iloc[order].reset_index(drop=True)
+        self.times = self.frame[time_col].to_numpy()
+        bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+        self.blocks = {str(name): (int(bounds[i]), int(bounds[i + 1])) for i, name in enumerate(names)}
+        # Order of first appearance, as df['sede'].unique()
+        first = np.unique(codes[codes >= 0], return_index=True)[1]
+        self.sedes = [str(names[codes[i]]) for i in np.sort(first)]
+
+    def __len__(self):
+        return len(self.frame)
+
+    def bounds(self, sede, start=None, end=None):
+        """Row range [lo, hi) of sede with start <= timestamp <= end."""
+        lo, hi = self.blocks.get(sede, (0, 0))
+        block = self.times[lo:hi]
+        first = lo + np.searchsorted(block, _as_time(start), 'left') if start is not None else lo
+        last = lo + np.searchsorted(block, _as_time(end), 'right') if end is not None else hi
+        return int(first), int(max(first, last))
+
+    def get(self, sede, start=None, end=None):
+        """Zero-copy slice of the rows of sede (optionally within [start, end])."""
+        lo, hi = self.bounds(sede, start, end)
+        return self.frame.iloc[lo:hi]
+
+    def page(self, sede, start=None, end=None, limit=None, cursor=None):
+        """
+        Rows of sede within [start, end], newest first: up to `limit` rows
+        older than `cursor`. Returns (rows, cursor of the next page or None).
+        """
+        lo, hi = self.bounds(sede, start, end)
+        window = self.times[lo:hi]
+        stop = hi
+        if cursor is not None:
+            time, skip = decode_cursor(cursor)
+            stop = max(lo, min(hi, lo + int(np.searchsorted(window, time, 'right')) - skip))
+        first = lo if limit is None else max(lo, stop - limit)
+        next_cursor = None
+        if first > lo:
+            last = self.times[first]
+            returned = lo + int(np.searchsorted(window, last, 'right')) - first
+            next_cursor = encode_cursor(last, returned)
+        return self.frame.iloc[first:stop][::-1], next_cursor
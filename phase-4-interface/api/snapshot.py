@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+from fastapi.responses import Response
+
+from data_store import ANOMALIES_CSV, ANOMALIES_STORE, CLEAN_CSV, CLEAN_STORE, load_table
+from llm_cache import snapshot_version
+from responses import dumps
+from sede_index import SedeIndex
+
+# One loaded version of the pipeline outputs served by the API: the frames,
+# their per-sede indexes and the materialized aggregates of the KPI, daily
+# and sector endpoints. Aggregates are computed for every sede when the
+# snapshot is built and kept as serialized JSON, so those endpoints only
+# look up bytes. They belong to the snapshot: new data means a new snapshot
+# (new version), never a stale aggregate.
+#
+# SnapshotManager polls the versions of the output files and, when they
+# change (and then stay unchanged for one poll, so a file being written is
+# not read), builds the next snapshot in a background thread and swaps the
+# reference. Requests take `manager.current` once and finish on it, old or
+# new; loading never blocks serving.
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RECS_PATH = os.path.join(BASE_DIR, "../../phase-3-recommendations/results/prioritized_recommendations.csv")
+# Files the snapshot is loaded from (its version changes when any of them does)
+SNAPSHOT_PATHS = [CLEAN_STORE, CLEAN_CSV, ANOMALIES_STORE, ANOMALIES_CSV, RECS_PATH]
+POLL_SECONDS = 10
+# Latest readings of the sede the chat agent works on
+AGENT_ROWS = 500
+
+# Columns served by the endpoints (the rest of each table is never read)
+CLEAN_COLUMNS = ['timestamp', 'sede', 'energia_total_kwh', 'energia_comedor_kwh',
+                 'energia_salones_kwh', 'energia_laboratorios_kwh', 'energia_auditorios_kwh',
+                 'energia_oficinas_kwh']
+ANOM_COLUMNS = CLEAN_COLUMNS + ['ocupacion_pct', 'temperatura_exterior_c', 'hour', 'dayofweek',
+                                'predicted_consumption', 'residual', 'anomaly_residual',
+                                'anomaly_iso', 'anomaly_critical']
+
+
+def load_all_data():
+    logger.info("Loading data...")
+    try:
+        df_clean = load_table(CLEAN_STORE, CLEAN_CSV, columns=CLEAN_COLUMNS)
+    except Exception as e:
+        logger.error(f"Error loading clean data: {e}")
+        df_clean = pd.DataFrame(columns=['timestamp', 'sede', 'energia_total_kwh'])
+
+    try:
+        df_anom = load_table(ANOMALIES_STORE, ANOMALIES_CSV, columns=ANOM_COLUMNS)
+    except:
+        df_anom = df_clean.copy()
+
+    try:
+        df_recs = pd.read_csv(RECS_PATH)
+    except:
+        df_recs = pd.DataFrame()
+
+    return df_clean, df_anom, df_recs
+
+
+# --- Aggregates (one sede) ---
+def kpis_payload(snapshot, sede):
+    df_view = snapshot.clean.get(sede)
+    anom_view = snapshot.anom.get(sede)
+
+    if df_view.empty:
+        return {"total_kwh": 0, "anomalías_criticas": 0, "eficiencia": 0, "meta_eficiencia": 95}
+
+    # Rows are time-sorted: the current month is the one of the last reading
+    curr_month = df_view['timestamp'].iloc[-1].to_period('M')
+    monthly_data = snapshot.clean.get(sede, start=curr_month.start_time)
+
+    total_kwh = monthly_data['energia_total_kwh'].sum()
+    anom_count = anom_view[anom_view['anomaly_critical'] == 1].shape[0] if 'anomaly_critical' in anom_view.columns else 0
+
+    return {
+        "total_kwh": float(total_kwh),
+        "anomalías_criticas": anom_count,
+        "eficiencia": 92, # Static for MVP
+        "meta_eficiencia": 95
+    }
+
+
+def daily_payload(snapshot, sede):
+    df_view = snapshot.clean.get(sede)
+    if df_view.empty: return []
+
+    daily = df_view.groupby(pd.Grouper(key='timestamp', freq='D'))['energia_total_kwh'].sum().reset_index()
+    daily['timestamp'] = daily['timestamp'].dt.strftime('%Y-%m-%d')
+    return daily.to_dict(orient="records")
+
+
+def sector_payload(snapshot, sede):
+    df_view = snapshot.clean.get(sede)
+    if df_view.empty: return []
+
+    sector_cols = [c for c in df_view.columns if 'energia_' in c and 'total' not in c]
+    melted = df_view.melt(id_vars=['timestamp'], value_vars=sector_cols, var_name='sector', value_name='kWh')
+    melted['sector'] = melted['sector'].str.replace('energia_', '').str.replace('_kwh', '')
+
+    # Aggregate by sector (Sum)
+    grouped = melted.groupby('sector')['kWh'].sum().reset_index()
+    return grouped.to_dict(orient="records")
+
+
+AGGREGATES = {'kpis': kpis_payload, 'daily': daily_payload, 'sector': sector_payload}
+
+
+class Snapshot:
+    """Frames, per-sede indexes and serialized aggregates of one data version."""
+
+    def __init__(self, df_clean, df_anom, df_recs, version=None, anomalies_version=None):
+        self.version = version
+        self.anomalies_version = anomalies_version
+        self.clean = SedeIndex(df_clean)
+        self.anom = SedeIndex(df_anom)
+        # Critical rows only, for the only_critical pages
+        self.critical = SedeIndex(df_anom[df_anom['anomaly_critical'] == 1]
+                                  if 'anomaly_critical' in df_anom.columns else df_anom.iloc[:0])
+        self.recs = df_recs
+        # Events of each sede, in priority order
+        self.recs_by_sede = ({str(sede): events for sede, events in df_recs.groupby('sede', sort=False)}
+                             if 'sede' in df_recs.columns else {})
+        self.loaded_at = time.time()
+        self.load_seconds = None
+        self.materialized = {(kind, sede): dumps(build(self, sede))
+                             for kind, build in AGGREGATES.items() for sede in self.clean.sedes}
+
+    def recs_for(self, sede):
+        if 'sede' not in self.recs.columns:
+            return self.recs
+        return self.recs_by_sede.get(sede, self.recs.iloc[:0])
+
+    def agent_frame(self, sede, rows=AGENT_ROWS):
+        """
+        Last `rows` anomaly readings of sede with every column of the table
+        (the indexes only hold the served ones). Only the sede's partitions
+        from the first of those readings on are read.
+        """
+        view = self.anom.get(sede).tail(rows)
+        if view.empty:
+            return view.reset_index(drop=True)
+        try:
+            df = load_table(ANOMALIES_STORE, ANOMALIES_CSV, sedes=sede, start=view['timestamp'].iloc[0])
+        except FileNotFoundError:
+            df = view
+        return df.tail(rows).reset_index(drop=True)
+
+    def response(self, kind, sede):
+        """Materialized aggregate `kind` of sede (unknown sedes get the empty payload)."""
+        body = self.materialized.get((kind, sede))
+        if body is None:
+            body = dumps(AGGREGATES[kind](self, sede))
+        return Response(content=body, media_type="application/json")
+
+
+def load_snapshot():
+    """Loads the current files into a new Snapshot."""
+    start = time.perf_counter()
+    # Versioned before reading: a file written during the load changes the
+    # version again and is picked up by the next check
+    version = snapshot_version(*SNAPSHOT_PATHS)
+    snapshot = Snapshot(*load_all_data(), version=version,
+                        anomalies_version=snapshot_version(ANOMALIES_STORE, ANOMALIES_CSV))
+    snapshot.load_seconds = time.perf_counter() - start
+    logger.info(f"Snapshot {version} loaded in {snapshot.load_seconds:.1f}s")
+    return snapshot
+
+
+class SnapshotManager:
+    """Current snapshot, reloaded in the background when the files change."""
+
+    def __init__(self, poll_seconds=POLL_SECONDS, on_swap=None):
+        self.poll_seconds = poll_seconds
+        self.on_swap = on_swap
+        self.current = load_snapshot()
+        self.reloads = 0
+        self.last_error = None
+        self._seen = self.current.version
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Reloads if the files changed and have been stable since the last check."""
+        version = snapshot_version(*SNAPSHOT_PATHS)
+        stable = version == self._seen
+        self._seen = version
+        if stable and version != self.current.version:
+            self.reload()
+
+    def reload(self):
+        try:
+            snapshot = load_snapshot()
+        except Exception as e:
+            # Keep serving the previous snapshot
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.error(f"Snapshot reload failed: {self.last_error}")
+            return
+        self.current = snapshot
+        self.reloads += 1
+        self.last_error = None
+        if self.on_swap is not None:
+            self.on_swap(snapshot)
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Snapshot check failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="snapshot-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def status(self):
+        snapshot = self.current
+        return {
+            "version": snapshot.version,
+            "loaded_at": datetime.fromtimestamp(snapshot.loaded_at).isoformat(timespec='seconds'),
+            "load_seconds": snapshot.load_seconds,
+            "rows": {"consumo": len(snapshot.clean), "anomalias": len(snapshot.anom), "recomendaciones": len(snapshot.recs)},
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "poll_seconds": self.poll_seconds,
+        }
@@ -23,17 +23,27 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "../../phase-1-exploration/data")
 PHASE2_RES = os.path.join(BASE_DIR, "../../phase-2-anomalies/results")
 PHASE3_RES = os.path.join(BASE_DIR, "../../phase-3-recommendations/results")
+PHASE1_NOTEBOOKS = os.path.join(BASE_DIR, "../../phase-1-exploration/notebooks")
+
+sys.path.append(PHASE1_NOTEBOOKS)
+from data_store import ANOMALIES_CSV, ANOMALIES_STORE, CLEAN_CSV, CLEAN_STORE, load_table
+from llm_cache import LLMCache, normalize_question, snapshot_version
+
+CHAT_MODEL, CHAT_TEMPERATURE = "llama-3.1-8b-instant", 0.2
+
+@st.cache_resource
+def get_llm_cache():
+    # Shared with the API chat and the advisor (same SQLite file)
+    return LLMCache()
 
 @st.cache_data
 def load_all_data():
     # 1. Main Consumption
-    df_clean = pd.read_csv(os.path.join(DATA_DIR, "consumos_uptc_clean.csv"))
-    df_clean['timestamp'] = pd.to_datetime(df_clean['timestamp'])
+    df_clean = load_table(CLEAN_STORE, CLEAN_CSV)
     
     # 2. Anomalies
     try:
-        df_anom = pd.read_csv(os.path.join(PHASE2_RES, "anomalies_detected.csv"))
-        df_anom['timestamp'] = pd.to_datetime(df_anom['timestamp'])
+        df_anom = load_table(ANOMALIES_STORE, ANOMALIES_CSV)
     except:
         df_anom = df_clean.copy() # Fallback
         
@@ -103,6 +113,34 @@ def offline_assistant_answer(user_question: str, sede: str, anom_df, recs_df) ->
     parts.append("\nPuedes preguntar: *'¿Qué acciones puedo tomar?'* o *'¿Qué anomalías hay?'*")
     return "\n".join(parts)
 
+def answer_with_agent(user_question, sede, anom_view, recs_df, llm_cache, cache_prompt, snapshot):
+    """Respuesta del agente Groq (guardada en caché); si falla, modo offline."""
+    try:
+        llm = ChatGroq(model=CHAT_MODEL, temperature=CHAT_TEMPERATURE)
+
+        # (aquí el agente, lo optimizamos en la Solución 2)
+        agent = create_pandas_dataframe_agent(
+            llm,
+            anom_view.tail(200),  # ya reducimos un poco
+            verbose=False,
+            allow_dangerous_code=False
+        ) 
+
+        response = agent.invoke(user_question)
+        output = response.get("output") if isinstance(response, dict) else str(response)
+        llm_cache.put('chat', CHAT_MODEL, CHAT_TEMPERATURE, cache_prompt, output, snapshot)
+        st.chat_message("assistant").write(output)
+
+    except Exception as e:
+        st.warning("Groq falló o se agotó la cuota. Activando modo offline.")
+        # opcional: imprimir error en consola
+        print("LLM error:", repr(e))
+        # print(traceback.format_exc())
+
+        ans = offline_assistant_answer(user_question, sede, anom_view, recs_df)
+        st.chat_message("assistant").write(ans)
+
+
 def main():
     st.title("👻 GhostEnergy AI: Control Center")
     st.markdown("### Optimización Energética UPTC (Hackathon IAMinds)")
@@ -196,29 +234,16 @@ def main():
                 ans = offline_assistant_answer(user_question, sede_sel, anom_view, df_recs)
                 st.chat_message("assistant").write(ans)
             else:
-                try:
-                    llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0.2)
-
-                    # (aquí el agente, lo optimizamos en la Solución 2)
-                    agent = create_pandas_dataframe_agent(
-                        llm,
-                        anom_view.tail(200),  # ya reducimos un poco
-                        verbose=False,
-                        allow_dangerous_code=False
-                    ) 
-
-                    response = agent.invoke(user_question)
-                    output = response.get("output") if isinstance(response, dict) else str(response)
-                    st.chat_message("assistant").write(output)
-
-                except Exception as e:
-                    st.warning("Groq falló o se agotó la cuota. Activando modo offline.")
-                    # opcional: imprimir error en consola
-                    print("LLM error:", repr(e))
-                    # print(traceback.format_exc())
-
-                    ans = offline_assistant_answer(user_question, sede_sel, anom_view, df_recs)
-                    st.chat_message("assistant").write(ans)
+                # Misma sede + misma pregunta sobre los mismos datos -> respuesta en caché
+                llm_cache = get_llm_cache()
+                snapshot = snapshot_version(ANOMALIES_STORE, ANOMALIES_CSV)
+                cache_prompt = f"{sede_sel}|{normalize_question(user_question)}"
+                cached = llm_cache.get('chat', CHAT_MODEL, CHAT_TEMPERATURE, cache_prompt, snapshot)
+                if cached is not None:
+                    st.chat_message("assistant").write(cached)
+                    st.caption("Respuesta desde caché")
+                else:
+                    answer_with_agent(user_question, sede_sel, anom_view, df_recs, llm_cache, cache_prompt, snapshot)
 
 
 if __name__ == "__main__":
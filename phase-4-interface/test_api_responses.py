@@ -0,0 +1,176 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "api"))
+import main
+import responses
+from responses import frame_response
+from snapshot import Snapshot
+
+# Anomaly pages with no rows (unknown sede, empty window, no critical rows)
+# are served as empty payloads in every format, not as a 500. Records and
+# NDJSON bodies are built from the columns and carry the same values as the
+# row dicts they replace. Following next_cursor walks every row once, in
+# order, also when events tie on kWh.
+#   python -m pytest phase-4-interface/test_api_responses.py
+
+FORMATS = ('records', 'columns', 'ndjson')
+
+
+def make_snapshot():
+    ts = pd.date_range('2025-01-01', periods=48, freq='h')
+    anom = pd.DataFrame({
+        'timestamp': ts,
+        'sede': 'Tunja',
+        'energia_total_kwh': np.linspace(10, 60, len(ts)),
+        'ocupacion_pct': np.linspace(0, 100, len(ts)),
+        'anomaly_critical': 0,
+    })
+    return Snapshot(anom.iloc[:0], anom, pd.DataFrame())
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main.snapshots, 'current', make_snapshot())
+    return TestClient(main.app)
+
+
+def rows(response, fmt):
+    assert response.status_code == 200
+    if fmt == 'ndjson':
+        return [json.loads(line) for line in response.text.splitlines()]
+    body = response.json()
+    return body['data'][0] if fmt == 'columns' else body['data']
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_empty_anomaly_pages(client, fmt):
+    for query in ("/api/anomalias/Nope",
+                  "/api/anomalias/Tunja?start=2026-01-01",
+                  "/api/anomalias/Tunja?only_critical=true&limit=10"):
+        response = client.get(f"{query}{'&' if '?' in query else '?'}format={fmt}")
+        assert rows(response, fmt) == []
+        if fmt != 'ndjson':
+            assert response.json()['next_cursor'] is None
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_non_empty_page_unchanged(client, fmt):
+    response = client.get(f"/api/anomalias/Tunja?limit=2&format={fmt}")
+    timestamps = rows(response, fmt)
+    if fmt != 'columns':
+        timestamps = [row['timestamp'] for row in timestamps]
+    assert timestamps == ['2025-01-02 23:00:00', '2025-01-02 22:00:00']
+
+
+def mixed_frame(n=200):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'timestamp': pd.date_range('2025-01-01 00:00:30', periods=n, freq='37min'),
+        'sede': pd.Categorical(rng.choice(['Tunja', 'Duitama, "Centro"'], n)),
+        'energia_total_kwh': (rng.random(n) * 300).astype(np.float32),
+        'residual': np.where(rng.random(n) < 0.2, np.nan, rng.normal(0, 10, n)),
+        'anomaly_critical': rng.integers(0, 2, n),
+        'anomaly_residual': rng.random(n) < 0.5,
+        'ai_recommendation': np.where(rng.random(n) < 0.1, None, '### Pico\n"Apagar" ñ, luces'),
+    })
+    df.loc[3, 'timestamp'] = pd.NaT
+    return df
+
+
+def expected_rows(df):
+    return json.loads(responses.dumps(responses.records(df)))
+
+
+def test_records_built_from_columns(monkeypatch):
+    df = mixed_frame()
+    expected = expected_rows(df)
+    # No row dicts on the orjson path
+    monkeypatch.setattr(responses, 'records', None)
+    body = json.loads(frame_response(df, 'records', {'next_cursor': 'abc'}).body)
+    assert body == {'data': expected, 'next_cursor': 'abc'}
+    assert json.loads(frame_response(df, 'records').body) == {'data': expected}
+    assert frame_response(df.iloc[:0], 'records', {'next_cursor': None}).body == b'{"data":[],"next_cursor":null}'
+
+
+def test_ndjson_built_from_columns(monkeypatch):
+    df = mixed_frame()
+    expected = expected_rows(df)
+    monkeypatch.setattr(responses, 'records', None)
+    lines = b"".join(responses._ndjson_chunks(df, chunk_rows=64)).decode().splitlines()
+    assert [json.loads(line) for line in lines] == expected
+    assert expected[3]['timestamp'] is None
+
+
+def make_recs():
+    """Events of two sedes in priority order, with runs of tied totals."""
+    rng = np.random.default_rng(0)
+    parts = []
+    for sede, n in [('Tunja', 23), ('Duitama', 7)]:
+        start = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.permutation(n) * 5, unit='h')
+        parts.append(pd.DataFrame({
+            'event_id': [f"{sede}_{i + 1}" for i in range(n)],
+            'sede': sede,
+            'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+            'total_kwh': rng.choice([120.5, 80.0, 80.0, 42.25], n),
+            'category': 'Consumo Fantasma',
+        }))
+    recs = pd.concat(parts, ignore_index=True)
+    return recs.sort_values('total_kwh', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def walk(client, url, fmt, limit):
+    """Rows of every page, following next_cursor until there is none."""
+    out, cursor = [], None
+    while True:
+        page_url = f"{url}{'&' if '?' in url else '?'}limit={limit}&format={fmt}"
+        response = client.get(page_url + (f"&cursor={cursor}" if cursor else ""))
+        page = rows(response, fmt)
+        if fmt == 'columns':
+            columns = response.json()['columns']
+            page = [dict(zip(columns, values)) for values in zip(*response.json()['data'])]
+        cursor = (response.headers.get('x-next-cursor') if fmt == 'ndjson'
+                  else response.json()['next_cursor'])
+        assert len(page) == limit or cursor is None
+        out.extend(page)
+        if cursor is None:
+            return out
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_recommendation_pages_cover_every_event(monkeypatch, fmt):
+    recs = make_recs()
+    assert recs.groupby('sede')['total_kwh'].apply(lambda kwh: kwh.duplicated().sum()).min() > 0
+    snapshot = make_snapshot()
+    monkeypatch.setattr(main.snapshots, 'current', Snapshot(snapshot.clean.frame, snapshot.anom.frame, recs))
+    client = TestClient(main.app)
+
+    for sede in ['Tunja', 'Duitama']:
+        expected = recs.loc[recs['sede'] == sede, 'event_id'].tolist()
+        unpaged = [row['event_id'] for row in client.get(f"/api/recomendaciones/{sede}").json()['data']]
+        assert unpaged == expected
+        for limit in [1, 2, 5, len(expected), 50]:
+            paged = [row['event_id'] for row in walk(client, f"/api/recomendaciones/{sede}", fmt, limit)]
+            assert paged == expected
+        # Window on the start time, same walk
+        window = recs[(recs['sede'] == sede) & (recs['start_time'] >= '2025-01-02')]
+        paged = walk(client, f"/api/recomendaciones/{sede}?start=2025-01-02", fmt, 3)
+        assert [row['event_id'] for row in paged] == window['event_id'].tolist()
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_anomaly_pages_cover_every_reading(client, fmt):
+    expected = [row['timestamp'] for row in client.get("/api/anomalias/Tunja").json()['data']]
+    for limit in [1, 7, 48]:
+        paged = [row['timestamp'] for row in walk(client, "/api/anomalias/Tunja", fmt, limit)]
+        assert paged == expected
+    window = walk(client, "/api/anomalias/Tunja?start=2025-01-01 12:00&end=2025-01-02 03:00", fmt, 5)
+    assert [row['timestamp'] for row in window] == [t for t in expected
+                                                    if '2025-01-01 12:00:00' <= t <= '2025-01-02 03:00:00']
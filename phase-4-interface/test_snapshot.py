@@ -0,0 +1,254 @@
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, "../phase-1-exploration/notebooks"))
+sys.path.append(os.path.join(BASE_DIR, "api"))
+import main
+import snapshot as snapshot_module
+from data_store import write_table
+from snapshot import ANOM_COLUMNS, Snapshot, SnapshotManager, load_snapshot
+
+# API snapshots: the chat agent's frame keeps every column of the anomalies
+# table, and the materialized KPI, daily and sector responses carry the same
+# values the endpoints computed per request from the CSV files. The manager
+# swaps in a new snapshot once changed files are stable, keeps serving the
+# old one while loading or after a failed load, and a request started on a
+# snapshot finishes on it.
+#   python -m pytest phase-4-interface/test_snapshot.py
+
+SEDES = ['Tunja', 'Duitama']
+
+
+def make_anomalies(hours=24 * 30, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range('2025-01-01', periods=hours, freq='h')
+    n = hours * len(SEDES)
+    df = pd.DataFrame({
+        'timestamp': np.tile(ts, len(SEDES)),
+        'sede': np.repeat(SEDES, hours),
+        'energia_total_kwh': np.round(rng.random(n) * 300, 1),
+        'energia_salones_kwh': np.round(rng.random(n) * 50, 1),
+        'ocupacion_pct': rng.random(n) * 100,
+        'co2_kg': rng.random(n) * 40,
+        'agua_litros': rng.random(n) * 1000,
+        'periodo_academico': np.where(ts.month.to_numpy() < 2, 'Vacaciones', 'Semestre')[np.tile(np.arange(hours), 2)],
+        'es_festivo': np.tile(ts.dayofweek.to_numpy() == 6, len(SEDES)),
+        'anomaly_critical': (rng.random(n) < 0.05).astype(int),
+    })
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+
+def test_agent_frame_has_every_column(tmp_path, monkeypatch):
+    df = make_anomalies()
+    store = str(tmp_path / "anomalies")
+    write_table(df, store)
+    monkeypatch.setattr(snapshot_module, 'ANOMALIES_STORE', store)
+    monkeypatch.setattr(snapshot_module, 'ANOMALIES_CSV', str(tmp_path / "missing.csv"))
+
+    served = df[[c for c in ANOM_COLUMNS if c in df.columns]]
+    snap = Snapshot(df[['timestamp', 'sede', 'energia_total_kwh']], served, pd.DataFrame())
+    agent_df = snap.agent_frame('Tunja', rows=100)
+
+    expected = df[df['sede'] == 'Tunja'].tail(100).reset_index(drop=True)
+    assert sorted(agent_df.columns) == sorted(expected.columns)
+    np.testing.assert_array_equal(agent_df['timestamp'], expected['timestamp'])
+    np.testing.assert_array_equal(agent_df['co2_kg'], expected['co2_kg'])
+    assert snap.agent_frame('Nope').empty
+
+
+# --- Original per-request endpoints, over the CSV frames ---
+def old_kpis(df_clean, df_anom, sede):
+    df_view = df_clean[df_clean['sede'] == sede]
+    anom_view = df_anom[df_anom['sede'] == sede]
+    if df_view.empty:
+        return {"total_kwh": 0, "anomalías_criticas": 0, "eficiencia": 0, "meta_eficiencia": 95}
+    curr_month = df_view['timestamp'].dt.to_period('M').max()
+    monthly_data = df_view[df_view['timestamp'].dt.to_period('M') == curr_month]
+    total_kwh = monthly_data['energia_total_kwh'].sum()
+    anom_count = anom_view[anom_view['anomaly_critical'] == 1].shape[0] if 'anomaly_critical' in anom_view.columns else 0
+    return {"total_kwh": total_kwh, "anomalías_criticas": anom_count, "eficiencia": 92, "meta_eficiencia": 95}
+
+
+def old_daily(df_clean, df_anom, sede):
+    df_view = df_clean[df_clean['sede'] == sede]
+    if df_view.empty: return []
+    daily = df_view.groupby(pd.Grouper(key='timestamp', freq='D'))['energia_total_kwh'].sum().reset_index()
+    daily['timestamp'] = daily['timestamp'].dt.strftime('%Y-%m-%d')
+    return daily.to_dict(orient="records")
+
+
+def old_sector(df_clean, df_anom, sede):
+    df_view = df_clean[df_clean['sede'] == sede]
+    if df_view.empty: return []
+    sector_cols = [c for c in df_view.columns if 'energia_' in c and 'total' not in c]
+    melted = df_view.melt(id_vars=['timestamp'], value_vars=sector_cols, var_name='sector', value_name='kWh')
+    melted['sector'] = melted['sector'].str.replace('energia_', '').str.replace('_kwh', '')
+    grouped = melted.groupby('sector')['kWh'].sum().reset_index()
+    return grouped.to_dict(orient="records")
+
+
+ENDPOINTS = {'kpis': old_kpis, 'consumo-diario': old_daily, 'consumo-sector': old_sector}
+
+
+def make_clean(hours=24 * 75, seed=1):
+    """Hourly readings with 2 decimals over three months, a few missing sector readings."""
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range('2025-01-01', periods=hours, freq='h')
+    sedes = SEDES + ['Sogamoso']
+    df = pd.DataFrame({'timestamp': np.tile(ts, len(sedes)), 'sede': np.repeat(sedes, hours)})
+    for col in snapshot_module.CLEAN_COLUMNS[2:]:
+        df[col] = np.round(rng.random(len(df)) * 80, 2)
+    df.loc[rng.random(len(df)) < 0.01, 'energia_comedor_kwh'] = np.nan
+    df['ocupacion_pct'] = rng.random(len(df)) * 100
+    return df
+
+
+def use_store_paths(tmp_path, monkeypatch):
+    paths = {'CLEAN_STORE': str(tmp_path / "clean"), 'ANOMALIES_STORE': str(tmp_path / "anomalies"),
+             'CLEAN_CSV': str(tmp_path / "missing_clean.csv"), 'ANOMALIES_CSV': str(tmp_path / "missing.csv"),
+             'RECS_PATH': str(tmp_path / "recs.csv")}
+    for name, path in paths.items():
+        monkeypatch.setattr(snapshot_module, name, path)
+    monkeypatch.setattr(snapshot_module, 'SNAPSHOT_PATHS', list(paths.values()))
+    return paths
+
+
+def test_materialized_aggregates_match_old_endpoints(tmp_path, monkeypatch):
+    clean = make_clean()
+    anomalies = make_anomalies(hours=24 * 75)
+    clean_csv, anomalies_csv = str(tmp_path / "clean.csv"), str(tmp_path / "anomalies.csv")
+    clean.to_csv(clean_csv, index=False)
+    anomalies.to_csv(anomalies_csv, index=False)
+    # The old endpoints read the CSV files; the snapshot reads the stores
+    old_clean, old_anom = pd.read_csv(clean_csv), pd.read_csv(anomalies_csv)
+    old_clean['timestamp'] = pd.to_datetime(old_clean['timestamp'])
+    old_anom['timestamp'] = pd.to_datetime(old_anom['timestamp'])
+
+    paths = use_store_paths(tmp_path, monkeypatch)
+    write_table(clean, paths['CLEAN_STORE'])
+    write_table(anomalies, paths['ANOMALIES_STORE'])
+    monkeypatch.setattr(main.snapshots, 'current', load_snapshot())
+    client = TestClient(main.app)
+
+    # Sogamoso has no anomalies, Nope is unknown
+    for sede in ['Tunja', 'Duitama', 'Sogamoso', 'Nope']:
+        for endpoint, old in ENDPOINTS.items():
+            expected = json.loads(json.dumps(old(old_clean, old_anom, sede), ensure_ascii=False))
+            response = client.get(f"/api/{endpoint}/{sede}")
+            assert response.status_code == 200
+            assert response.json() == expected, (endpoint, sede)
+
+
+def make_manager(tmp_path, monkeypatch):
+    """Manager over a store of one month, served by the app."""
+    paths = use_store_paths(tmp_path, monkeypatch)
+    write_table(make_clean(hours=24 * 30), paths['CLEAN_STORE'])
+    write_table(make_anomalies(), paths['ANOMALIES_STORE'])
+    swaps = []
+    manager = SnapshotManager(poll_seconds=60, on_swap=swaps.append)
+    monkeypatch.setattr(main, 'snapshots', manager)
+    return manager, paths, swaps
+
+
+def add_day(paths):
+    """New data: the clean table grows by one day."""
+    write_table(make_clean(hours=24 * 31), paths['CLEAN_STORE'])
+
+
+def test_reload_when_files_change_and_settle(tmp_path, monkeypatch):
+    manager, paths, swaps = make_manager(tmp_path, monkeypatch)
+    first = manager.current
+    manager.check()
+    assert manager.current is first and manager.reloads == 0
+
+    add_day(paths)
+    # Changed since the last poll: maybe still being written, wait one more
+    manager.check()
+    assert manager.current is first
+    manager.check()
+    assert manager.current is not first and manager.current.version != first.version
+    assert manager.reloads == 1 and swaps == [manager.current]
+    assert len(manager.current.clean) == len(first.clean) + 24 * 3
+    manager.check()
+    assert manager.reloads == 1
+    assert manager.status()['version'] == manager.current.version
+
+
+def test_failed_reload_keeps_serving(tmp_path, monkeypatch):
+    manager, paths, swaps = make_manager(tmp_path, monkeypatch)
+    client = TestClient(main.app)
+    before = client.get("/api/kpis/Tunja").json()
+    first = manager.current
+
+    def broken():
+        raise OSError("store being rewritten")
+
+    monkeypatch.setattr(snapshot_module, 'load_snapshot', broken)
+    add_day(paths)
+    manager.check()
+    manager.check()
+    assert manager.current is first and swaps == []
+    assert manager.status()['last_error'] == "OSError: store being rewritten"
+    assert client.get("/api/kpis/Tunja").json() == before
+
+    # Retried on the next poll once loading works again
+    monkeypatch.setattr(snapshot_module, 'load_snapshot', load_snapshot)
+    manager.check()
+    assert manager.current is not first and manager.status()['last_error'] is None
+
+
+def test_requests_served_while_loading(tmp_path, monkeypatch):
+    manager, paths, swaps = make_manager(tmp_path, monkeypatch)
+    client = TestClient(main.app)
+    before = client.get("/api/consumo-diario/Tunja").json()
+    first = manager.current
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_load():
+        loading.set()
+        release.wait(10)
+        return load_snapshot()
+
+    monkeypatch.setattr(snapshot_module, 'load_snapshot', slow_load)
+    add_day(paths)
+    reload = threading.Thread(target=manager.reload)
+    reload.start()
+    assert loading.wait(10)
+    # Loading never blocks serving: the old snapshot answers meanwhile
+    assert manager.current is first
+    assert client.get("/api/consumo-diario/Tunja").json() == before
+    release.set()
+    reload.join(10)
+    after = client.get("/api/consumo-diario/Tunja").json()
+    assert manager.current is not first and len(after) == len(before) + 1
+
+
+def test_in_flight_request_finishes_on_its_snapshot(tmp_path, monkeypatch):
+    manager, paths, swaps = make_manager(tmp_path, monkeypatch)
+    client = TestClient(main.app)
+    first = manager.current
+    expected = client.get("/api/anomalias/Tunja?limit=5").json()
+    add_day(paths)
+    write_table(make_anomalies(hours=24 * 31, seed=1), paths['ANOMALIES_STORE'])
+
+    page = first.anom.page
+
+    def page_then_swap(*args, **kwargs):
+        # The snapshot is swapped while the request is being served
+        result = page(*args, **kwargs)
+        manager.reload()
+        return result
+
+    monkeypatch.setattr(first.anom, 'page', page_then_swap)
+    assert client.get("/api/anomalias/Tunja?limit=5").json() == expected
+    assert manager.current is not first
+    # The next request sees the new snapshot only
+    assert client.get("/api/anomalias/Tunja?limit=5").json() != expected
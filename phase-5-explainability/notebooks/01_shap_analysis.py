@@ -1,38 +1,50 @@
 import pandas as pd
 import shap
-import xgboost as xgb
 import matplotlib.pyplot as plt
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "../../phase-1-exploration/data")
+PHASE1_NOTEBOOKS = os.path.join(BASE_DIR, "../../phase-1-exploration/notebooks")
 RESULTS_DIR = os.path.join(BASE_DIR, "../results")
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
+sys.path.append(PHASE1_NOTEBOOKS)
+from data_store import CLEAN_CSV, CLEAN_STORE, load_table
+from feature_store import get_features
+from training_backend import frame_batches, quantile_dmatrix, train_regressor
+from model_registry import data_fingerprint, load_model, save_model
+
 def run_shap_analysis():
     print("Loading data for SHAP analysis...")
     try:
-        df = pd.read_csv(os.path.join(DATA_DIR, "consumos_uptc_clean.csv"))
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # We need to retrain/load the model identical to Phase 1
-        # For this script, we'll train a global model on a subset to generate the explanation quickly
-        # as saving/loading pickles across phases without strict structure can be brittle.
-        
         TARGET = 'energia_total_kwh'
         FEATURES = ['hour_sin', 'hour_cos', 'day_sin', 'day_cos', 'month_sin', 'month_cos', 
                 'temperatura_exterior_c', 'ocupacion_pct']
+        df = load_table(CLEAN_STORE, CLEAN_CSV, columns=FEATURES + [TARGET])
+        X = get_features(df, FEATURES)
         
-        print(f"Training proxy model on {len(df)} rows...")
-        model = xgb.XGBRegressor(n_estimators=100, max_depth=4)
-        model.fit(df[FEATURES], df[TARGET])
+        # Explain the model Phase 2 flags anomalies with (same features, same data).
+        # Fall back to a small proxy model, registered so the next run loads it.
+        data_hash = data_fingerprint(df, FEATURES + [TARGET])
+        entry = (load_model('residual_baseline', data_hash=data_hash, features=FEATURES)
+                 or load_model('shap_proxy', data_hash=data_hash, features=FEATURES))
+        if entry is not None:
+            model, meta = entry
+            print(f"Loaded registered model {meta['name']} ({data_hash})")
+        else:
+            print(f"Training proxy model on {len(df)} rows...")
+            dtrain = quantile_dmatrix(frame_batches(df, FEATURES, TARGET), FEATURES)
+            model, stats = train_regressor({'max_depth': 4}, dtrain, n_estimators=100)
+            save_model('shap_proxy', model, FEATURES, data_hash, metrics={'training': stats})
         
         # SHAP Explainer
         print("Calculating SHAP values...")
         explainer = shap.Explainer(model)
         
         # Explain a subset (e.g., 500 random samples) for performance
-        subset = df[FEATURES].sample(n=500, random_state=42)
+        subset = X.sample(n=500, random_state=42)
         shap_values = explainer(subset)
         
         # 1. Summary Plot (Beeswarm)